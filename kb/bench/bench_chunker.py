@@ -0,0 +1,129 @@
+# kb/bench/bench_chunker.py
+"""
+Chunker karşılaştırması: eski cümle başına tokenizer.encode yolu ile
+sayfa başına tek fast-tokenizer çağrısı (chunker.chunk_sentences).
+Tokenizer çağrı sayısı ve süre raporlanır.
+
+Kullanım:
+  python kb/bench/bench_chunker.py --pdf kb/data/docs/LC.FIP.KL.005.pdf
+  python kb/bench/bench_chunker.py --pages 200      # sentetik metin
+"""
+import os
+import re
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+
+from transformers import AutoTokenizer
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "ingest"))
+from chunker import chunk_sentences  # noqa: E402
+
+MODEL_NAME = os.getenv("HF_EMBED_MODEL", "intfloat/multilingual-e5-large")
+TARGET_TOKENS = int(os.getenv("TARGET_TOKENS", "400"))
+MAX_TOKENS = int(os.getenv("MAX_TOKENS", "512"))
+OVERLAP_TOKENS = int(os.getenv("OVERLAP_TOKENS", "50"))
+
+
+class CountingTokenizer:
+    """Tokenizer çağrılarını sayan ince sarmalayıcı."""
+
+    def __init__(self, tok):
+        self._tok = tok
+        self.calls = 0
+        self.is_fast = tok.is_fast
+
+    def __call__(self, *a, **kw):
+        self.calls += 1
+        return self._tok(*a, **kw)
+
+    def encode(self, *a, **kw):
+        self.calls += 1
+        return self._tok.encode(*a, **kw)
+
+    def decode(self, *a, **kw):
+        return self._tok.decode(*a, **kw)
+
+
+def legacy_chunk_text(text, tokenizer, target, max_tok, overlap):
+    """ingest_hf_improved.chunk_text'in önceki hali (noise filtresi hariç)."""
+    sentences = [s.strip() for s in re.split(r'(?<=[.!?])\s+', text) if s.strip()]
+    chunks, current, current_len = [], [], 0
+    for sent in sentences:
+        tokens = tokenizer.encode(sent, add_special_tokens=False)
+        sent_len = len(tokens)
+        if sent_len > max_tok:
+            if current:
+                chunks.append(' '.join(current))
+                current, current_len = [], 0
+            for i in range(0, len(tokens), target):
+                chunks.append(tokenizer.decode(tokens[i:i+target]))
+            continue
+        if current_len + sent_len <= target:
+            current.append(sent)
+            current_len += sent_len
+        else:
+            if current:
+                chunks.append(' '.join(current))
+            if overlap > 0 and current:
+                overlap_sents, overlap_len = [], 0
+                for s in reversed(current):
+                    s_len = len(tokenizer.encode(s, add_special_tokens=False))
+                    if overlap_len + s_len > overlap:
+                        break
+                    overlap_sents.insert(0, s)
+                    overlap_len += s_len
+                current, current_len = overlap_sents, overlap_len
+            else:
+                current, current_len = [], 0
+            current.append(sent)
+            current_len += sent_len
+    if current:
+        chunks.append(' '.join(current))
+    return chunks
+
+
+def synthetic_pages(n_pages: int, seed: int = 0):
+    rng = random.Random(seed)
+    words = ("fiyat revize ekranında onay talebi mağaza ürün kategori sezon indirim "
+             "kampanya psikolojik yurt dışı devir raporu seçilir kaydedilir kontrol edilir").split()
+    pages = []
+    for _ in range(n_pages):
+        sents = [" ".join(rng.choices(words, k=rng.randint(4, 30))).capitalize() + "."
+                 for _ in range(rng.randint(20, 60))]
+        pages.append(" ".join(sents))
+    return pages
+
+
+def pdf_pages(path: str):
+    from pypdf import PdfReader
+    return [re.sub(r'\s+', ' ', p.extract_text() or "").strip() for p in PdfReader(path).pages]
+
+
+def run(name, fn, pages, tok):
+    tok.calls = 0
+    t0 = time.perf_counter()
+    n = sum(len(fn(p, tok, TARGET_TOKENS, MAX_TOKENS, OVERLAP_TOKENS)) for p in pages)
+    elapsed = time.perf_counter() - t0
+    print(f"  {name:<10} chunks={n:<6} tokenizer_calls={tok.calls:<7} {elapsed:7.2f}s")
+    return elapsed
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pdf", help="ölçülecek PDF (verilmezse sentetik metin)")
+    ap.add_argument("--pages", type=int, default=200)
+    args = ap.parse_args()
+
+    pages = pdf_pages(args.pdf) if args.pdf else synthetic_pages(args.pages)
+    pages = [p for p in pages if p]
+    tok = CountingTokenizer(AutoTokenizer.from_pretrained(MODEL_NAME, use_fast=True))
+    print(f"pages={len(pages)}, target={TARGET_TOKENS}, max={MAX_TOKENS}, overlap={OVERLAP_TOKENS}")
+    t_old = run("önce", legacy_chunk_text, pages, tok)
+    t_new = run("sonra", chunk_sentences, pages, tok)
+    print(f"  hızlanma: {t_old / t_new:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# kb/bench/bench_copy.py
+"""
+Embedding yazım hızı: execute_values + metin vektör literali (eski yol)
+ile binary COPY (pg_copy) karşılaştırması.
+
+Kullanım: python kb/bench/bench_copy.py --rows 20000 --dim 1024
+"""
+import os
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+import psycopg2
+from psycopg2.extras import execute_values
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "ingest"))
+from pg_copy import copy_embeddings  # noqa: E402
+
+DB = dict(
+    host=os.getenv("DB_HOST", "localhost"),
+    port=int(os.getenv("DB_PORT", "5432")),
+    dbname=os.getenv("DB_NAME", "kb"),
+    user=os.getenv("DB_USER", "troy"),
+    password=os.getenv("DB_PASSWORD", "troy1234"),
+)
+
+
+def vec_str(v):
+    return '[' + ','.join(f'{x:.6f}' for x in v) + ']'
+
+def write_text(cur, ids, vecs):
+    values = [(sid, vec_str(vec), "bench") for sid, vec in zip(ids, vecs.tolist())]
+    execute_values(cur, """
+    INSERT INTO _bench_embeddings (section_id, embedding, model_name)
+    VALUES %s
+    """, values, template="(%s, %s::vector, %s)")
+
+def write_copy(cur, ids, vecs):
+    copy_embeddings(cur, ids, vecs, "bench", table="_bench_embeddings")
+
+def run(conn, name, fn, ids, vecs, batch):
+    with conn.cursor() as cur:
+        cur.execute("TRUNCATE _bench_embeddings")
+        t0 = time.perf_counter()
+        for i in range(0, len(ids), batch):
+            fn(cur, ids[i:i+batch], vecs[i:i+batch])
+        conn.commit()
+        elapsed = time.perf_counter() - t0
+        cur.execute("SELECT COUNT(*) FROM _bench_embeddings")
+        n = cur.fetchone()[0]
+    print(f"  {name:<14} rows={n:<7} {elapsed:7.2f}s  {n / elapsed:9.0f} rows/s")
+    return elapsed
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=20000)
+    ap.add_argument("--dim", type=int, default=1024)
+    ap.add_argument("--batch", type=int, default=2000)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    vecs = rng.standard_normal((args.rows, args.dim)).astype(np.float32)
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    ids = list(range(1, args.rows + 1))
+
+    conn = psycopg2.connect(**DB)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("CREATE EXTENSION IF NOT EXISTS vector;")
+            cur.execute(f"""
+            CREATE TEMP TABLE _bench_embeddings (
+              section_id BIGINT,
+              embedding vector({args.dim}) NOT NULL,
+              model_name VARCHAR(100) NOT NULL
+            )""")
+        print(f"rows={args.rows}, dim={args.dim}, batch={args.batch}")
+        t_text = run(conn, "execute_values", write_text, ids, vecs, args.batch)
+        t_copy = run(conn, "binary COPY", write_copy, ids, vecs, args.batch)
+        print(f"  hızlanma: {t_text / t_copy:.1f}x")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# kb/bench/bench_embed_procs.py
+"""
+Çok süreçli encode ölçekleme ölçümü (--embed-procs).
+
+Karışık uzunlukta sentetik Türkçe chunk'lar 1/2/4/8 süreçle encode edilir;
+her süreç cpu/N torch thread'i kullanır (1 = tek süreç, tüm thread'ler).
+Süreç açılışı (model yükleme) ölçüme dahil değildir; chunk/s, hızlanma,
+verim ve vektörlerin tek süreçli sonuçla uyumu raporlanır.
+
+Kullanım:
+  python kb/bench/bench_embed_procs.py
+  python kb/bench/bench_embed_procs.py --model intfloat/multilingual-e5-small --chunks 4000 --procs 1 2 4
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "ingest"))
+from encoder import BucketEncoder, EncoderPool, _WORDS  # noqa: E402
+
+
+def synthetic_chunks(n: int, seed: int = 0):
+    rng = random.Random(seed)
+    return [" ".join(rng.choices(_WORDS, k=rng.choice((20, 60, 120, 250, 400)))) for _ in range(n)]
+
+
+def run_single(model_name, texts, max_seq_length):
+    import torch
+    from sentence_transformers import SentenceTransformer
+    torch.set_num_threads(os.cpu_count() or 1)
+    model = SentenceTransformer(model_name, device="cpu")
+    model.max_seq_length = max_seq_length
+    enc = BucketEncoder(model)
+    enc.encode(texts[:16])                                  # ısınma
+    t0 = time.perf_counter()
+    vecs = enc.encode(texts, normalize_embeddings=True)
+    return vecs, time.perf_counter() - t0, torch.get_num_threads()
+
+
+def run_pool(model_name, texts, procs, max_seq_length):
+    with EncoderPool(model_name, procs, max_seq_length=max_seq_length) as pool:
+        pool.encode(texts[:procs * 16])                     # her süreç modeli yüklesin + ısınsın
+        t0 = time.perf_counter()
+        vecs = pool.encode(texts, normalize_embeddings=True)
+        return vecs, time.perf_counter() - t0, pool.threads
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model", default=os.getenv("HF_EMBED_MODEL", "intfloat/multilingual-e5-large"))
+    ap.add_argument("--chunks", type=int, default=2000)
+    ap.add_argument("--procs", type=int, nargs="+", default=[1, 2, 4, 8])
+    ap.add_argument("--max-seq-length", type=int, default=512)
+    ap.add_argument("--json", help="sonuçları bu dosyaya yaz")
+    args = ap.parse_args()
+
+    texts = synthetic_chunks(args.chunks)
+    print(f"ℹ️  {len(texts)} chunk, model={args.model}, cpu={os.cpu_count()}")
+
+    results, ref, base = [], None, None
+    for procs in args.procs:
+        if procs == 1:
+            vecs, secs, threads = run_single(args.model, texts, args.max_seq_length)
+        else:
+            vecs, secs, threads = run_pool(args.model, texts, procs, args.max_seq_length)
+        if ref is None:
+            ref, base = vecs, secs
+        max_diff = float(np.abs(vecs - ref).max())
+        row = dict(procs=procs, threads=threads, seconds=round(secs, 3),
+                   chunks_per_sec=round(len(texts) / secs, 1), speedup=round(base / secs, 2),
+                   efficiency=round(base / secs / procs, 2), max_abs_diff=max_diff)
+        results.append(row)
+        print(f"  procs={procs:<2} thread={threads:<3} {secs:7.2f}s {row['chunks_per_sec']:8.1f} chunk/s "
+              f"x{row['speedup']:<5} verim={row['efficiency']:.2f} fark={max_diff:.1e}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(dict(model=args.model, chunks=len(texts), cpu=os.cpu_count(), results=results),
+                      f, ensure_ascii=False, indent=2)
+        print(f"✅ {args.json}")
+
+if __name__ == "__main__":
+    main()
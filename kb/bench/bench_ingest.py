@@ -0,0 +1,603 @@
+# kb/bench/bench_ingest.py
+"""
+Ingest verimi ölçümü: sentetik kılavuz PDF'leri her ingest giriş noktasından
+geçirilir; aşama başına süre, sayfa/sn, chunk/sn, embed süresi, DB yazma
+süresi ve tepe RSS raporlanır.
+
+Korpus: clean_pdf_data desenlerine uyan Türkçe kılavuz sayfaları (header/
+footer bloğu, ilk sayfada İÇİNDEKİLER, "2.3 Başlık" bölümleri, "•" maddeler,
+Görsel referansları, "5/26" sayfa numaraları, imza satırları, satır sonu
+tireleri). PDF'ler bağımlılıksız yazılır (Helvetica + cp1254 farkları) ve
+pypdf ile geri okunarak doğrulanır.
+
+Giriş noktaları (her biri ayrı alt süreçte, boş pdf_text cache'i ile):
+  ingest_hf            20251001_init.sql şeması
+  ingest_hf_improved   kendi ensure_schema'sı (+ dedup tabloları)
+  process_pdfs_hf      kendi ensure_extensions_and_schema'sı
+  clean_pdf_data       JSONL + load_embeddings -> rag_documents
+                       (001_create_rag_tables.sql)
+Her giriş noktası için <DB_NAME>_<giriş> adlı geçici veritabanı açılır
+(DB_* ortam değişkenleri; CREATE DATABASE yetkisi gerekir), iş bitince
+silinir (--keep ile bırakılır).
+
+Aşamalar giriş noktasının kendi fonksiyonları sarılarak ölçülür: extract,
+clean, chunk, model, embed, dedup, db, index; kalan süre "other". Süreler iç
+içe çağrılarda en içteki aşamaya yazılır. db_calls_s ayrıca tüm sunucu
+çağrılarının (execute/COPY/commit) toplamıdır. sayfa/sn ve chunk/sn model
+yükleme hariç duvar saatiyle hesaplanır. RSS ana süreçtir; --embed-procs > 1
+iken encoder süreçleri dahil değildir.
+
+Kullanım:
+  python kb/bench/bench_ingest.py --pages 12 48 192
+  python kb/bench/bench_ingest.py --entries ingest_hf process_pdfs_hf --docs 3 --embed-procs 2 \\
+      --json /tmp/ingest.json
+  python kb/bench/bench_ingest.py --corpus-only --corpus /tmp/kilavuz
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import subprocess
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+INGEST_DIR = BENCH_DIR.parent / "ingest"
+SCHEMA_DIR = BENCH_DIR.parent / "schema"
+ROOT = BENCH_DIR.parent.parent
+sys.path.insert(0, str(INGEST_DIR))
+
+DB_ENV = dict(
+    host=os.getenv("DB_HOST", "localhost"),
+    port=os.getenv("DB_PORT", "5432"),
+    dbname=os.getenv("DB_NAME", "kb_bench"),
+    user=os.getenv("DB_USER", "troy"),
+    password=os.getenv("DB_PASSWORD", "troy1234"),
+)
+ADMIN_DB = os.getenv("DB_ADMIN_DB", "postgres")
+RSS_INTERVAL = 0.01
+
+
+# =========================
+# Sentetik kılavuz metni
+# =========================
+TOPICS = ["FİYAT REVİZE", "STOK TRANSFER", "SİPARİŞ ONAY", "KAMPANYA TANIMLAMA", "MAĞAZA SAYIM"]
+TITLES = ["Giriş", "Ekran Açılışı", "Kayıt Oluşturma", "Onay Süreci", "Değişiklik Talebi",
+          "Raporlama", "Yetkilendirme", "Hata Mesajları", "Toplu Yükleme", "Arşivleme",
+          "Şablon Seçimi", "Ürün Güncelleme", "İndirim Kuralları", "Sezon Kapanışı"]
+WORDS = ("fiyat revize ekranında onay talebi oluşturulur mağaza ürün kategori sezon indirim "
+         "kampanya seçilir kaydedilir kontrol edilir rapor alınır stok transfer sipariş kullanıcı "
+         "değişiklik işlemi tamamlandıktan sonra ilgili alanlar doldurulur butonuna tıklanır "
+         "liste görüntülenir şube bölge yöneticisi onaylar ışığında güncel değerler aşağıdaki "
+         "adımlar izlenerek sisteme girilir hatalı kayıtlar düzeltilir açıklama satırı").split()
+SIGNOFF = ["Hazırlayan: Ayşe Yılmaz", "Kontrol Eden: Şükrü Kaya", "Onaylayan: Gülşen Öztürk"]
+LINE_CHARS = 92
+PAGE_LINES = 58
+
+
+def sentence(rng, k):
+    return " ".join(rng.choices(WORDS, k=k)).capitalize() + "."
+
+
+def wrap(rng, text, hyphen_rate=0.15):
+    """Satırlara böl; arada bir kelimeyi tireyle kır (pypdf çıktısındaki gibi)."""
+    lines, cur = [], ""
+    for w in text.split():
+        if cur and len(cur) + len(w) + 1 > LINE_CHARS:
+            if len(w) > 7 and rng.random() < hyphen_rate:
+                cut = rng.randint(3, len(w) - 3)
+                lines.append(f"{cur} {w[:cut]}-")
+                cur = w[cut:]
+                continue
+            lines.append(cur)
+            cur = w
+        else:
+            cur = f"{cur} {w}" if cur else w
+    if cur:
+        lines.append(cur)
+    return lines
+
+
+def body_blocks(rng):
+    """Bitmeyen bölüm akışı: başlık, paragraflar, maddeler, görsel referansı."""
+    major = 0
+    while True:
+        major += 1
+        for minor in range(1, rng.randint(3, 6)):
+            yield [f"{major}.{minor} {rng.choice(TITLES)}"]
+            for _ in range(rng.randint(1, 3)):
+                yield wrap(rng, " ".join(sentence(rng, rng.randint(8, 18)) for _ in range(rng.randint(2, 5))))
+            for _ in range(rng.randint(0, 5)):
+                yield wrap(rng, f"• {sentence(rng, rng.randint(5, 12))}")
+            if rng.random() < 0.4:
+                yield [f"Görsel {rng.randint(1, 40)}"]
+
+
+def document_pages(rng, topic, code, n_pages):
+    header = [f"{topic} KULLANICI KILAVUZU", f"{code}  REVİZE NO: {rng.randint(1, 9):02d}", "DAHİLİ", ""]
+    blocks = body_blocks(rng)
+    pending = []
+    pages = []
+    for num in range(1, n_pages + 1):
+        lines = list(header)
+        if num == 1:
+            lines += ["İÇİNDEKİLER"]
+            lines += [f"{i}. {rng.choice(TITLES)} ..... {i + 1}" for i in range(1, 7)]
+            lines += [""]
+        room = PAGE_LINES - len(lines) - 2 - (len(SIGNOFF) if num == n_pages else 0)
+        while len(lines) < len(header) + room:
+            if not pending:
+                pending = next(blocks)
+            take = min(len(pending), len(header) + room - len(lines))
+            lines += pending[:take]
+            pending = pending[take:]
+        if num == n_pages:
+            lines += SIGNOFF
+        lines += ["", f"{num}/{n_pages}"]
+        pages.append(lines)
+    return pages
+
+
+# =========================
+# PDF yazıcı (Type1 Helvetica, cp1254)
+# =========================
+# WinAnsi'de olmayan Türkçe harfler cp1254 kod noktalarına glyph adıyla eşlenir
+TURKISH_DIFFERENCES = b"[208 /Gbreve 221 /Idotaccent /Scedilla 240 /gbreve 253 /dotlessi /scedilla]"
+
+
+def pdf_string(line):
+    raw = line.encode("cp1254", errors="replace")
+    return b"(" + raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+def write_pdf(path, pages):
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    catalog = add(None)
+    pages_id = add(None)
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding "
+               b"<< /Type /Encoding /BaseEncoding /WinAnsiEncoding /Differences " + TURKISH_DIFFERENCES + b" >> >>")
+    kids = []
+    for lines in pages:
+        ops = [b"BT /F1 10 Tf 12 TL 48 800 Td"]
+        ops += [pdf_string(line) + b" Tj T*" for line in lines]
+        ops.append(b"ET")
+        stream = b"\n".join(ops)
+        content = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        kids.append(add(b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] "
+                        b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_id, font, content)))
+    objects[catalog - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id
+    objects[pages_id - 1] = (b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % k for k in kids) +
+                             b"] /Count %d >>" % len(kids))
+
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for i, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % off for off in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref)
+    Path(path).write_bytes(bytes(out))
+
+
+def build_corpus(out_dir, page_counts, docs, seed):
+    """Her sayfa sayısı için docs adet PDF; (dosya adı, sayfa sayısı) listesi."""
+    rng = random.Random(seed)
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    made = []
+    for n_pages in page_counts:
+        for i in range(docs):
+            topic = rng.choice(TOPICS)
+            code = f"LC.FİP.KK.{rng.randint(1, 999):03d}"
+            name = f"{topic.replace(' ', '_')}_{n_pages}s_{i + 1}.pdf"
+            write_pdf(out_dir / name, document_pages(rng, topic, code, n_pages))
+            made.append((name, n_pages))
+    return made
+
+
+def verify_corpus(corpus_dir, made):
+    """pypdf ile geri oku: sayfa sayısı, Türkçe harfler, clean_pdf_data bölüm başlıkları."""
+    from pypdf import PdfReader
+    from clean_pdf_data import CHUNK_START_PATTERN, clean_pages
+
+    name, n_pages = made[0]
+    reader = PdfReader(str(Path(corpus_dir) / name))
+    pages = [p.extract_text() or "" for p in reader.pages]
+    assert len(pages) == n_pages, f"{name}: {len(pages)} sayfa okundu, {n_pages} bekleniyordu"
+    assert "KULLANICI KILAVUZU" in pages[0] and "İÇİNDEKİLER" in pages[0], f"{name}: header/TOC okunamadı"
+    assert any(c in "".join(pages) for c in "ğışİŞĞ"), f"{name}: Türkçe harfler kayboldu"
+    text, _ = clean_pages(pages)
+    assert "KULLANICI KILAVUZU" not in text and "İÇİNDEKİLER" not in text, f"{name}: header/TOC temizlenmedi"
+    assert CHUNK_START_PATTERN.search(text), f"{name}: bölüm başlığı bulunamadı"
+
+
+# =========================
+# Aşama ölçümü (alt süreç)
+# =========================
+class Stages:
+    """Ana thread'de aşama yığını; süre en içteki aşamaya yazılır, RSS örneklenir."""
+
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.peak_rss = defaultdict(int)
+        self.counts = defaultdict(int)
+        self.db_seconds = 0.0
+        self.stack = ["other"]
+        self._t = time.perf_counter()
+        self._main = threading.main_thread()
+        self._stop = threading.Event()
+        self._page = os.sysconf("SC_PAGE_SIZE")
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+
+    def _rss(self):
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * self._page
+        except OSError:
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def _sample(self):
+        while not self._stop.is_set():
+            rss, name = self._rss(), self.stack[-1]
+            if rss > self.peak_rss[name]:
+                self.peak_rss[name] = rss
+            self._stop.wait(RSS_INTERVAL)
+
+    def _flush(self):
+        now = time.perf_counter()
+        self.seconds[self.stack[-1]] += now - self._t
+        self._t = now
+
+    @contextmanager
+    def stage(self, name):
+        if threading.current_thread() is not self._main:
+            yield
+            return
+        self._flush()
+        self.stack.append(name)
+        self.calls[name] += 1
+        try:
+            yield
+        finally:
+            self._flush()
+            self.stack.pop()
+
+    def wrap(self, module, attr, name, count=None):
+        fn = getattr(module, attr)
+
+        @wraps(fn)
+        def timed(*args, **kw):
+            with self.stage(name):
+                result = fn(*args, **kw)
+            if count:
+                self.counts[count] += len(result)
+            return result
+
+        setattr(module, attr, timed)
+
+    def wrap_encoders(self, module):
+        """encoder_for / EncoderPool sonuçları TimedEncoder ile sarılır."""
+        if hasattr(module, "encoder_for"):
+            make = module.encoder_for
+            module.encoder_for = lambda model: TimedEncoder(self, make(model))
+        if hasattr(module, "EncoderPool"):
+            pool_cls = module.EncoderPool
+
+            def pool(*args, **kw):
+                with self.stage("model"):
+                    return TimedEncoder(self, pool_cls(*args, **kw))
+
+            module.EncoderPool = pool
+
+    def close(self):
+        self._flush()
+        self._stop.set()
+        self._sampler.join()
+
+
+class TimedEncoder:
+    """encode ve imap result() süreleri "embed" aşamasına; metin sayısı chunk sayacına."""
+
+    def __init__(self, stages, encoder):
+        self._stages = stages
+        self._encoder = encoder
+
+    def __getattr__(self, attr):
+        return getattr(self._encoder, attr)
+
+    def encode(self, texts, *args, **kw):
+        texts = list(texts)
+        self._stages.counts["chunks"] += len(texts)
+        with self._stages.stage("embed"):
+            return self._encoder.encode(texts, *args, **kw)
+
+    def imap(self, batches, texts_of, *args, **kw):
+        def counted(batch):
+            texts = texts_of(batch)
+            self._stages.counts["chunks"] += len(texts)
+            return texts
+
+        for batch, result in self._encoder.imap(batches, counted, *args, **kw):
+            def timed(result=result):
+                with self._stages.stage("embed"):
+                    return result()
+            yield batch, timed
+
+
+def time_db_calls(stages):
+    """psycopg2.connect: execute/COPY/commit süreleri stages.db_seconds'a eklenir."""
+    import psycopg2
+    import psycopg2.extensions as ext
+
+    def timed(method):
+        @wraps(method)
+        def call(self, *args, **kw):
+            t0 = time.perf_counter()
+            try:
+                return method(self, *args, **kw)
+            finally:
+                stages.db_seconds += time.perf_counter() - t0
+        return call
+
+    class TimedCursor(ext.cursor):
+        execute = timed(ext.cursor.execute)
+        executemany = timed(ext.cursor.executemany)
+        copy_expert = timed(ext.cursor.copy_expert)
+
+    class TimedConnection(ext.connection):
+        commit = timed(ext.connection.commit)
+        rollback = timed(ext.connection.rollback)
+
+        def __init__(self, *args, **kw):
+            super().__init__(*args, **kw)
+            self.cursor_factory = TimedCursor
+
+    connect = psycopg2.connect
+    psycopg2.connect = lambda *args, **kw: connect(*args, connection_factory=TimedConnection, **kw)
+
+
+def wrap_index(stages):
+    import index_manager
+    stages.wrap(index_manager, "drop_vector_indexes", "index")
+    stages.wrap(index_manager, "ensure_vector_index", "index")
+    stages.wrap(index_manager, "restore_vector_indexes", "index")
+
+
+def run_ingest_hf(stages, args):
+    import ingest_hf as m
+    stages.wrap(m, "read_pdf_pages", "extract", count="pages")
+    stages.wrap(m, "token_chunks", "chunk")
+    stages.wrap(m, "SentenceTransformer", "model")
+    for attr in ("connect", "ensure_schema", "upsert_document", "insert_sections_and_embeddings"):
+        stages.wrap(m, attr, "db")
+    stages.wrap_encoders(m)
+    sys.argv = ["ingest_hf.py", "--dir", args.corpus, "--embed-procs", str(args.embed_procs)]
+    m.main()
+
+
+def run_ingest_hf_improved(stages, args):
+    import ingest_hf_improved as m
+    stages.wrap(m, "read_pdf", "extract", count="pages")
+    stages.wrap(m, "chunk_text", "chunk")
+    stages.wrap(m, "SentenceTransformer", "model")
+    for attr in ("simhash", "find_local_duplicates", "find_corpus_duplicates"):
+        stages.wrap(m, attr, "dedup")
+    for attr in ("db_connect", "ensure_schema", "upsert_document", "insert_sections",
+                 "insert_embeddings", "link_sources"):
+        stages.wrap(m, attr, "db")
+    stages.wrap_encoders(m)
+    sys.argv = ["ingest_hf_improved.py", "--dir", args.corpus, "--embed-procs", str(args.embed_procs)]
+    m.main()
+
+
+def run_process_pdfs_hf(stages, args):
+    import process_pdfs_hf as m
+    stages.wrap(m, "read_pdf_texts", "extract", count="pages")
+    stages.wrap(m, "chunkify", "chunk")
+    stages.wrap(m, "get_model", "model")
+    for attr in ("db_connect", "ensure_extensions_and_schema", "ensure_document", "insert_sections",
+                 "insert_embeddings_batch"):
+        stages.wrap(m, attr, "db")
+    stages.wrap_encoders(m)
+    sys.argv = ["process_pdfs_hf.py", "--dir", args.corpus, "--embed-procs", str(args.embed_procs)]
+    m.main()
+
+
+def run_clean_pdf_data(stages, args):
+    import clean_pdf_data as c
+    import load_embeddings as le
+    stages.wrap(c, "paged_extract", "extract", count="pages")
+    stages.wrap(c, "clean_pages", "clean")
+    stages.wrap(c, "sectionize_with_titles", "chunk")
+    stages.wrap(c, "sliding_window_chunks", "chunk")
+    stages.wrap(le, "get_model", "model")
+    stages.wrap(le, "copy_upsert", "db")
+    stages.wrap_encoders(le)
+    le.DB_CONFIG.update(host=DB_ENV["host"], port=DB_ENV["port"], database=os.environ["DB_NAME"],
+                        user=DB_ENV["user"], password=DB_ENV["password"])
+
+    jsonl = os.path.join(os.path.dirname(os.environ["PDF_TEXT_CACHE"]), "chunks.jsonl")
+    c.PDF_DIR, c.OUTPUT_FILE = args.corpus, jsonl
+    c.main()
+    le.load_embeddings(jsonl, batch_size=args.batch_size, embed_procs=args.embed_procs)
+
+
+# giriş noktası -> (hazırlık SQL dosyaları, alt süreç çalıştırıcısı)
+ENTRIES = {
+    "ingest_hf": (["20251001_init.sql"], run_ingest_hf),
+    "ingest_hf_improved": ([], run_ingest_hf_improved),
+    "process_pdfs_hf": ([], run_process_pdfs_hf),
+    "clean_pdf_data": (["001_create_rag_tables.sql"], run_clean_pdf_data),
+}
+
+
+def child(args):
+    stages = Stages()
+    time_db_calls(stages)
+    wrap_index(stages)
+    t0 = time.perf_counter()
+    ENTRIES[args.child][1](stages, args)
+    wall = time.perf_counter() - t0
+    stages.close()
+
+    import resource
+    busy = max(wall - stages.seconds.get("model", 0.0), 1e-9)
+    pages, chunks = stages.counts["pages"], stages.counts["chunks"]
+    result = dict(
+        entry=args.child,
+        pages=pages,
+        chunks=chunks,
+        wall_s=round(wall, 3),
+        pages_per_s=round(pages / busy, 2),
+        chunks_per_s=round(chunks / busy, 2),
+        embed_s=round(stages.seconds.get("embed", 0.0), 3),
+        db_s=round(stages.seconds.get("db", 0.0), 3),
+        db_calls_s=round(stages.db_seconds, 3),
+        peak_rss_mb=round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        stages={name: dict(seconds=round(stages.seconds[name], 3), calls=stages.calls[name],
+                           peak_rss_mb=round(stages.peak_rss[name] / 2**20, 1))
+                for name in sorted(stages.seconds, key=stages.seconds.get, reverse=True)},
+    )
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+# =========================
+# Veritabanı hazırlığı (ana süreç)
+# =========================
+def admin_connect():
+    import psycopg2
+    conn = psycopg2.connect(**dict(DB_ENV, dbname=ADMIN_DB))
+    conn.autocommit = True
+    return conn
+
+
+def create_database(name, sql_files):
+    import psycopg2
+    conn = admin_connect()
+    with conn.cursor() as cur:
+        cur.execute(f'DROP DATABASE IF EXISTS "{name}"')
+        cur.execute(f'CREATE DATABASE "{name}"')
+    conn.close()
+    conn = psycopg2.connect(**dict(DB_ENV, dbname=name))
+    with conn, conn.cursor() as cur:
+        cur.execute("CREATE EXTENSION IF NOT EXISTS vector")
+        for sql_file in sql_files:
+            cur.execute((SCHEMA_DIR / sql_file).read_text(encoding="utf-8"))
+    conn.close()
+
+
+def drop_database(name):
+    conn = admin_connect()
+    with conn.cursor() as cur:
+        cur.execute(f'DROP DATABASE IF EXISTS "{name}"')
+    conn.close()
+
+
+def run_entry(entry, args, workdir):
+    db_name = f"{DB_ENV['dbname']}_{entry}"
+    create_database(db_name, ENTRIES[entry][0])
+    out = workdir / f"{entry}.json"
+    env = dict(os.environ, DB_HOST=DB_ENV["host"], DB_PORT=DB_ENV["port"], DB_NAME=db_name,
+               DB_USER=DB_ENV["user"], DB_PASSWORD=DB_ENV["password"],
+               PDF_TEXT_CACHE=str(workdir / entry / "pdf_text_cache.sqlite"))
+    (workdir / entry).mkdir()
+    cmd = [sys.executable, __file__, "--child", entry, "--corpus", args.corpus, "--out", str(out),
+           "--embed-procs", str(args.embed_procs), "--batch-size", str(args.batch_size)]
+    try:
+        proc = subprocess.run(cmd, env=env, cwd=INGEST_DIR,
+                              stdout=None if args.verbose else subprocess.DEVNULL)
+        if proc.returncode or not out.exists():
+            print(f"❌ {entry}: çıkış kodu {proc.returncode}")
+            return None
+        with open(out, encoding="utf-8") as f:
+            return json.load(f)
+    finally:
+        if not args.keep:
+            drop_database(db_name)
+
+
+def print_result(r):
+    print(f"\n✅ {r['entry']}: {r['pages']} sayfa, {r['chunks']} chunk, {r['wall_s']:.1f}s  "
+          f"{r['pages_per_s']:.1f} sayfa/sn  {r['chunks_per_s']:.1f} chunk/sn  "
+          f"embed {r['embed_s']:.1f}s  db {r['db_s']:.1f}s (çağrılar {r['db_calls_s']:.1f}s)  "
+          f"tepe RSS {r['peak_rss_mb']:.0f}MB")
+    for name, s in r["stages"].items():
+        print(f"   {name:<8} {s['seconds']:8.2f}s  {s['calls']:>6} çağrı  RSS {s['peak_rss_mb']:7.1f}MB")
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--entries", nargs="+", default=list(ENTRIES), choices=list(ENTRIES))
+    ap.add_argument("--pages", type=int, nargs="+", default=[12, 48, 192], help="belge sayfa sayıları")
+    ap.add_argument("--docs", type=int, default=2, help="her sayfa sayısı için belge adedi")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--corpus", help="PDF klasörü (varsayılan: geçici klasör)")
+    ap.add_argument("--corpus-only", action="store_true", help="yalnızca korpusu üret ve doğrula")
+    ap.add_argument("--embed-procs", type=int, default=1)
+    ap.add_argument("--batch-size", type=int, default=256, help="load_embeddings batch boyutu")
+    ap.add_argument("--json", default="bench_ingest.json", help="sonuç dosyası")
+    ap.add_argument("--keep", action="store_true", help="geçici veritabanlarını silme")
+    ap.add_argument("--verbose", action="store_true", help="giriş noktalarının çıktısını göster")
+    ap.add_argument("--child", choices=list(ENTRIES), help=argparse.SUPPRESS)
+    ap.add_argument("--out", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        return child(args)
+
+    with tempfile.TemporaryDirectory(prefix="bench_ingest_") as tmp:
+        workdir = Path(tmp)
+        args.corpus = os.path.abspath(args.corpus or workdir / "corpus")
+        made = build_corpus(args.corpus, args.pages, args.docs, args.seed)
+        verify_corpus(args.corpus, made)
+        total = sum(n for _, n in made)
+        print(f"ℹ️  korpus: {len(made)} PDF, {total} sayfa -> {args.corpus}")
+        if args.corpus_only:
+            return
+
+        results = []
+        for entry in args.entries:
+            print(f"ℹ️  {entry} çalışıyor (veritabanı {DB_ENV['dbname']}_{entry})")
+            r = run_entry(entry, args, workdir)
+            if r:
+                print_result(r)
+                results.append(r)
+
+    report = dict(
+        meta=dict(date=datetime.now().isoformat(timespec="seconds"), commit=git_commit(),
+                  pages=args.pages, docs=args.docs, total_pages=total, seed=args.seed,
+                  embed_procs=args.embed_procs, db_host=DB_ENV["host"]),
+        entries=results,
+    )
+    with open(args.json, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# kb/bench/bench_normalize.py
+"""
+Metin temizleyici ölçümü: eski çoklu re.sub fonksiyonları ile normalize.py.
+
+Normal sayfaların yanında eski desenleri karesel süreye iten bozuk sayfalar
+büyüyen boyutlarda denenir:
+  spaced    "a b c d ..." harf aralıklı uzun diziler (plain_text lookahead'i)
+  header    kapanışı olmayan çok sayıda TALİMAT (DOTALL .*?)
+  blanks    boşluklu boş satır dizileri (^\\s* ... \\s*$)
+  toc       İÇİNDEKİLER + "\\n \\n \\n..." (strip_toc .*?)
+Her boyutta çıktıların eşitliği de kontrol edilir.
+
+Kullanım:
+  python kb/bench/bench_normalize.py
+  python kb/bench/bench_normalize.py --sizes 1000 4000 16000 --json /tmp/normalize.json
+"""
+import sys
+import json
+import time
+import random
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from check_normalize import PROFILES, golden_pages, load_texts  # noqa: E402
+
+
+def adversarial(kind: str, n: int) -> str:
+    if kind == "spaced":
+        return " ".join("abcçdefgğh"[i % 10] for i in range(n)) + " !"
+    if kind == "header":
+        return "TALİMAT ayrıntı\n" * (n // 16)
+    if kind == "blanks":
+        return "metin" + " \n" * (n // 2) + "x"
+    if kind == "toc":
+        return "İÇİNDEKİLER" + "\n " * (n // 2) + "x"
+    raise ValueError(kind)
+
+
+def timed(fn, texts, min_secs=0.2):
+    """fn'i metinler üzerinde en az min_secs boyunca çalıştır; tur başına süre."""
+    rounds, t0 = 0, time.perf_counter()
+    while True:
+        for t in texts:
+            fn(t)
+        rounds += 1
+        elapsed = time.perf_counter() - t0
+        if elapsed >= min_secs or elapsed > 5:
+            return elapsed / rounds
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1000, 2000, 4000, 8000])
+    ap.add_argument("--pages", type=int, default=500, help="normal sayfa sayısı")
+    ap.add_argument("--profiles", nargs="+", default=list(PROFILES), choices=list(PROFILES))
+    ap.add_argument("--json", help="sonuçları bu dosyaya yaz")
+    args = ap.parse_args()
+
+    results = []
+
+    def report(case, size, name, texts):
+        old, new = PROFILES[name]
+        assert [old(t) for t in texts] == [new(t) for t in texts], f"{name}/{case}: çıktı farklı"
+        t_old, t_new = timed(old, texts), timed(new, texts)
+        results.append(dict(case=case, size=size, profile=name, legacy_ms=round(t_old * 1000, 3),
+                            new_ms=round(t_new * 1000, 3), speedup=round(t_old / t_new, 1)))
+        print(f"  {case:<8} {size:>7} {name:<11} eski {t_old * 1000:9.2f}ms  yeni {t_new * 1000:9.2f}ms  "
+              f"x{t_old / t_new:.1f}")
+
+    pages = golden_pages(random.Random(0), load_texts(), args.pages)
+    chars = sum(map(len, pages))
+    print(f"ℹ️  normal: {len(pages)} sayfa, {chars} karakter")
+    for name in args.profiles:
+        report("normal", chars, name, pages)
+
+    print("ℹ️  bozuk sayfalar")
+    for kind in ("spaced", "header", "blanks", "toc"):
+        for size in args.sizes:
+            text = adversarial(kind, size)
+            for name in args.profiles:
+                report(kind, size, name, [text])
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"✅ {args.json}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# kb/bench/bench_pdf_extract.py
+"""
+PDF metin çıkarım modlarının karşılaştırması (cache kapalı):
+plain, layout_fallback (process_pdfs_hf'in eski davranışı) ve adaptive.
+Doküman başına süre, adaptive'in seçtiği mod, süre aşımları ve en yavaş
+sayfalar raporlanır.
+
+Kullanım:
+  python kb/bench/bench_pdf_extract.py --dir kb/data/docs
+  python kb/bench/bench_pdf_extract.py --dir kb/data/docs --page-timeout 5 --modes plain adaptive
+"""
+import sys
+import time
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "ingest"))
+import pdf_text  # noqa: E402
+
+
+def run_mode(pdfs, mode, page_timeout):
+    pdf_text.STATS = pdf_text.ExtractStats()
+    per_doc = []
+    t0 = time.perf_counter()
+    for pdf in pdfs:
+        before = dict(pdf_text.STATS.modes)
+        t = time.perf_counter()
+        pages = pdf_text.extract_pages(str(pdf), mode, use_cache=False, page_timeout=page_timeout)
+        chosen = next((m for m, n in pdf_text.STATS.modes.items() if n != before.get(m, 0)), mode)
+        per_doc.append((pdf.name, len(pages), time.perf_counter() - t, chosen))
+    return per_doc, time.perf_counter() - t0, pdf_text.STATS
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dir", required=True)
+    ap.add_argument("--modes", nargs="+", default=["plain", "layout_fallback", "adaptive"],
+                    choices=["plain", "layout", "layout_fallback", "adaptive"])
+    ap.add_argument("--page-timeout", type=float, default=10.0)
+    args = ap.parse_args()
+
+    pdfs = sorted(Path(args.dir).glob("*.pdf"))
+    if not pdfs:
+        raise SystemExit(f"PDF yok: {args.dir}")
+
+    totals = {}
+    for mode in args.modes:
+        per_doc, wall, stats = run_mode(pdfs, mode, args.page_timeout)
+        pages = sum(n for _, n, _, _ in per_doc)
+        totals[mode] = wall
+        print(f"\n== {mode}: {len(pdfs)} dosya, {pages} sayfa, {wall:.2f}s "
+              f"({pages / wall if wall else 0:.1f} sayfa/s), süre aşımı={stats.timeouts}")
+        for name, n, secs, chosen in per_doc:
+            extra = f" -> {chosen}" if mode == "adaptive" else ""
+            print(f"  {name:<40} {n:>4} sayfa {secs:7.2f}s{extra}")
+        for secs, name, page in stats.slowest:
+            print(f"  yavaş: {name} s.{page}: {secs * 1000:.0f}ms")
+
+    if "layout_fallback" in totals and "adaptive" in totals and totals["adaptive"]:
+        print(f"\nadaptive / layout_fallback hızlanma: {totals['layout_fallback'] / totals['adaptive']:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+# kb/bench/bench_prompt_cache.py
+"""
+Prompt yerleşiminin Ollama önek önbelleğine etkisi: prompt_eval_count /
+prompt_eval_duration, eski tek user mesajı ile system + user düzeni.
+
+Ollama slot'taki önceki prompt ile ortak öneki yeniden değerlendirmez;
+prompt_eval_count yalnızca değerlendirilen token'ları sayar. Eski düzende
+bağlam rol cümlesinden hemen sonra başladığı için ortak önek birkaç token'dı;
+yeni düzende SYSTEM_PROMPT'un tamamı önbellekten gelir.
+
+Sorular temiz_rag_chunks.jsonl bölüm başlıklarından, bağlamlar aynı dosyanın
+chunk'larından örneklenir; iki düzen aynı soru sırasını görür. Her düzenden
+önce bir ısınma isteği gönderilir (model yükleme ölçüme girmez).
+
+Kullanım:
+  python kb/bench/bench_prompt_cache.py                      # süreç içi fake_ollama
+  python kb/bench/bench_prompt_cache.py --host http://localhost:11434 --requests 50
+  python kb/bench/bench_prompt_cache.py --json sonuc.json
+"""
+import sys
+import json
+import random
+import argparse
+import statistics
+from pathlib import Path
+from collections import defaultdict
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "ingest"))
+import llm_backend  # noqa: E402
+from prompts import build_messages, format_context  # noqa: E402
+import fake_ollama  # noqa: E402
+
+CHUNKS_FILE = Path(__file__).resolve().parent.parent.parent / "temiz_rag_chunks.jsonl"
+
+
+def legacy_messages(user_question, contexts):
+    """Değişiklik öncesi chat_unified.chat prompt'u (karşılaştırma için)"""
+    prompt = f"""Sen Troy ekranının iç süreçleri hakkında yardımcı bir asistansın.
+
+Aşağıdaki bilgileri kullanarak kullanıcının sorusunu cevapla:
+
+{format_context(contexts)}
+
+Kurallar:
+- SADECE verilen bilgileri kullan
+- Bilmediğin şeyleri uydurma
+- Cevabında hangi kaynağı kullandığını belirt (Kaynak 1, Kaynak 2, vb.)
+- Eğer "Eğitim İçeriği" kaynağından adım adım bilgi varsa, bunları sıralı şekilde yaz
+- Türkçe ve net bir dille cevapla
+- Eğer bilgi yoksa, bunu açıkça söyle
+
+Kullanıcının sorusu: {user_question}
+
+Cevap:"""
+    return [{'role': 'user', 'content': prompt}]
+
+
+LAYOUTS = {"legacy": legacy_messages, "system": build_messages}
+
+
+def load_chunks():
+    by_file = defaultdict(list)
+    with open(CHUNKS_FILE, encoding="utf-8") as f:
+        for line in f:
+            c = json.loads(line)
+            if c.get("section_title") and c.get("content"):
+                by_file[c["file_name"]].append(c)
+    return by_file
+
+
+def sample_requests(n, top_k=5, seed=0):
+    """(soru, bağlamlar) listesi; bağlamlar retrieve_unified_context biçiminde"""
+    rng = random.Random(seed)
+    by_file = load_chunks()
+    files = sorted(by_file)
+    out = []
+    for _ in range(n):
+        chunks = by_file[rng.choice(files)]
+        picked = rng.sample(chunks, min(top_k, len(chunks)))
+        question = f"{picked[0]['section_title']} nedir?"
+        contexts = [
+            {
+                "type": "document",
+                "title": c["section_title"],
+                "content": c["content"],
+                "page": c["page_start"],
+                "similarity": round(rng.uniform(0.66, 0.9), 3),
+                "file": c["file_name"],
+                "chunk_id": c["chunk_id"],
+            }
+            for c in picked
+        ]
+        out.append((question, contexts))
+    return out
+
+
+def pct(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run_layout(pool, name, requests, num_predict):
+    build = LAYOUTS[name]
+    options = {'temperature': 0.3, 'num_predict': num_predict}
+    # Isınma: model yükleme ve önceki düzenden kalan slot içeriği ölçüme girmesin
+    pool.chat(build(*requests[-1]), options=options)
+    rows = []
+    for question, contexts in requests:
+        r = pool.chat(build(question, contexts), options=options)
+        rows.append(dict(
+            prompt_eval_count=r.get("prompt_eval_count", 0),
+            prompt_eval_ms=r.get("prompt_eval_duration", 0) / 1e6,
+            load_ms=r.get("load_duration", 0) / 1e6,
+            total_ms=r.get("total_duration", 0) / 1e6,
+            prompt_chars=sum(len(m["content"]) for m in build(question, contexts)),
+        ))
+    summary = {"requests": len(rows)}
+    for key in ("prompt_eval_count", "prompt_eval_ms", "total_ms", "prompt_chars"):
+        vals = [row[key] for row in rows]
+        summary[key] = dict(mean=round(statistics.mean(vals), 1), p50=round(pct(vals, 0.5), 1),
+                            p95=round(pct(vals, 0.95), 1))
+    summary["loads"] = sum(1 for row in rows if row["load_ms"] > 50)
+    return summary
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Prompt düzeninin Ollama önek önbelleğine etkisi")
+    ap.add_argument("--host", help="gerçek Ollama adresi; verilmezse süreç içi fake_ollama")
+    ap.add_argument("--model", default=llm_backend.MODEL)
+    ap.add_argument("--requests", type=int, default=30)
+    ap.add_argument("--top-k", type=int, default=5)
+    ap.add_argument("--num-predict", type=int, default=16, help="kısa cevap: ölçülen prompt eval")
+    ap.add_argument("--fake-port", type=int, default=11436)
+    ap.add_argument("--json", help="sonuçları dosyaya yaz")
+    fake_ollama.add_arguments(ap)
+    args = ap.parse_args()
+
+    host = args.host
+    if not host:
+        fake_ollama.serve(fake_ollama.from_args(args), port=args.fake_port)
+        host = f"http://127.0.0.1:{args.fake_port}"
+    pool = llm_backend.LLMPool([llm_backend.OllamaBackend(host)], model=args.model, retries=0)
+
+    requests = sample_requests(args.requests, args.top_k, args.seed)
+    print(f"🔎 {host} · {args.model} · {len(requests)} istek · keep_alive={pool.keep_alive}")
+
+    results = {}
+    for name in LAYOUTS:
+        results[name] = run_layout(pool, name, requests, args.num_predict)
+
+    print(f"\n{'düzen':<8} {'eval tok ort':>12} {'p50':>6} {'p95':>6} {'eval ms ort':>12} {'p95':>8} {'prompt kr':>10}")
+    for name, s in results.items():
+        c, m = s["prompt_eval_count"], s["prompt_eval_ms"]
+        print(f"{name:<8} {c['mean']:>12} {c['p50']:>6} {c['p95']:>6} {m['mean']:>12} {m['p95']:>8} "
+              f"{s['prompt_chars']['mean']:>10}")
+    old, new = results["legacy"], results["system"]
+    if old["prompt_eval_count"]["mean"]:
+        saved = 1 - new["prompt_eval_count"]["mean"] / old["prompt_eval_count"]["mean"]
+        print(f"\n✅ değerlendirilen prompt token'ı: %{saved * 100:.1f} azaldı")
+    if old["prompt_eval_ms"]["mean"]:
+        saved = 1 - new["prompt_eval_ms"]["mean"] / old["prompt_eval_ms"]["mean"]
+        print(f"✅ prompt eval süresi: %{saved * 100:.1f} azaldı")
+    if old["loads"] or new["loads"]:
+        print(f"⚠️  ölçüm sırasında model yüklemesi: legacy={old['loads']} system={new['loads']} (keep_alive?)")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(dict(host=host, model=args.model, results=results),
+                                              ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"💾 {args.json}")
+
+
+if __name__ == "__main__":
+    main()
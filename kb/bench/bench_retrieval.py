@@ -0,0 +1,346 @@
+# kb/bench/bench_retrieval.py
+"""
+Retrieval ölçümü: her arama yolu için gecikme (p50/p95/p99) ve tam cosine
+aramaya göre recall@k.
+
+temiz_rag_chunks.jsonl geçici bir şemaya (bench_retrieval.rag_documents,
+001_create_rag_tables.sql ile aynı kolonlar + tsv) yüklenir; canlı tablolara
+dokunulmaz. Sorgular bölüm başlıklarından ("<başlık> nedir?") ve içerik
+cümlelerinden üretilir ya da --queries ile elle yazılmış bir JSONL
+({"query": ..., "chunk_id": ...}) verilir. --scale N her chunk'ın gürültülü
+N-1 kopyasını ekleyerek korpusu büyütür.
+
+Yollar:
+  chat_unified  chat_unified.RAG_DOCUMENTS_SQL (0.65 eşikli, canlıdaki sorgu)
+  knn           aynı sıralama eşiksiz: ORDER BY embedding <=> q LIMIT k
+  keyword       tsv @@ plainto_tsquery + ts_rank (tam metin)
+  hybrid        knn ve keyword adayları, reciprocal rank fusion
+  memory        süreç içi float32 numpy matrisi, tam tarama
+Doğruluk referansı: float64 tam cosine (numpy). Ayrıca sorgunun üretildiği
+chunk'ın ilk k'da olup olmadığı (source_hit) raporlanır.
+
+Kullanım:
+  python kb/bench/bench_retrieval.py --json /tmp/retrieval_hnsw.json
+  python kb/bench/bench_retrieval.py --index ivfflat --probes 4 --scale 50 \\
+      --json /tmp/retrieval_ivf.json --baseline /tmp/retrieval_hnsw.json
+"""
+import re
+import sys
+import json
+import time
+import argparse
+import subprocess
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import psycopg2
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "ingest"))
+from chat_unified import RAG_DOCUMENTS_SQL, model  # noqa: E402
+from encoder import encoder_for, _model_name  # noqa: E402
+from index_manager import DB, build_vector_index  # noqa: E402
+from load_embeddings import RAG_COLUMNS, RAG_TYPES  # noqa: E402
+from pg_copy import copy_rows  # noqa: E402
+
+ROOT = Path(__file__).resolve().parent.parent.parent
+SCHEMA = "bench_retrieval"
+TABLE = f"{SCHEMA}.rag_documents"
+RRF_K = 60
+
+_NUMBERING = re.compile(r"^\s*\d+(?:\.\d+)*[.)]?\s*")
+_SENTENCE = re.compile(r"(?<=[.!?:])\s+|\n+")
+_BULLET = re.compile(r"^[•o\-\s]+")
+
+
+# =========================
+# Korpus + sorgular
+# =========================
+def load_chunks(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def make_queries(chunks):
+    """Bölüm başlığından ve içeriğin ilk anlamlı cümlesinden birer soru."""
+    queries, seen = [], set()
+
+    def add(text, chunk_id, kind):
+        key = text.lower()
+        if key not in seen:
+            seen.add(key)
+            queries.append(dict(query=text, chunk_id=chunk_id, kind=kind))
+
+    for c in chunks:
+        title = _NUMBERING.sub("", c.get("section_title") or "").strip()
+        if title:
+            add(f"{title} nedir?", c["chunk_id"], "title")
+        for sentence in _SENTENCE.split(c["content"]):
+            words = _BULLET.sub("", sentence).split()
+            if len(words) >= 5:
+                add(" ".join(words[:12]).rstrip(".:,").lower() + " nasıl yapılır?", c["chunk_id"], "content")
+                break
+    return queries
+
+
+def corpus(chunks, vecs, scale, noise, seed=0):
+    """(satırlar, id listesi, normalize matris); scale > 1 ise gürültülü kopyalar eklenir."""
+    rng = np.random.default_rng(seed)
+    vecs = vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+    rows, ids, mats = [], [], []
+    for r in range(scale):
+        m = vecs if r == 0 else vecs + noise * rng.standard_normal(vecs.shape)
+        m = (m / np.linalg.norm(m, axis=1, keepdims=True)).astype(np.float32)
+        for c, v in zip(chunks, m):
+            cid = c["chunk_id"] if r == 0 else f"{c['chunk_id']}#{r}"
+            ids.append(cid)
+            rows.append((cid, c["file_name"], c.get("section_title"), c["content"], c.get("page_start"),
+                         c.get("page_end"), c.get("chunk_index"), c.get("approx_tokens"), v))
+        mats.append(m)
+    return rows, ids, np.vstack(mats)
+
+
+# =========================
+# Geçici şema
+# =========================
+def setup_schema(cur, rows, dim, index, **index_kw):
+    cur.execute("CREATE EXTENSION IF NOT EXISTS vector")
+    cur.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    cur.execute(f"""
+        CREATE TABLE {TABLE} (
+            chunk_id VARCHAR(50) PRIMARY KEY,
+            file_name TEXT NOT NULL,
+            section_title TEXT,
+            content TEXT NOT NULL,
+            page_start INTEGER,
+            page_end INTEGER,
+            chunk_index VARCHAR(20),
+            approx_tokens INTEGER,
+            embedding vector({dim}),
+            tsv tsvector
+        )""")
+    copy_rows(cur, TABLE, RAG_COLUMNS, RAG_TYPES, rows)
+    # 20251001_fix_sections_tsv.sql ile aynı tsv tanımı
+    cur.execute(f"""
+        UPDATE {TABLE}
+        SET tsv = to_tsvector('turkish', coalesce(section_title,'') || ' ' || lower(unaccent(content)))""")
+    cur.execute(f"CREATE INDEX ON {TABLE} USING gin (tsv)")
+    cur.execute(f"ANALYZE {TABLE}")
+    if index == "none":
+        return None
+    return build_vector_index(cur, TABLE, method=index, **index_kw)
+
+
+# =========================
+# Arama yolları: (cur, vektör, metin, k) -> chunk_id listesi
+# =========================
+KNN_SQL = "SELECT chunk_id FROM rag_documents ORDER BY embedding <=> %s::vector LIMIT %s"
+
+KEYWORD_SQL = """
+    SELECT chunk_id
+    FROM rag_documents, plainto_tsquery('turkish', lower(unaccent(%s))) q
+    WHERE tsv @@ q
+    ORDER BY ts_rank(tsv, q) DESC
+    LIMIT %s
+"""
+
+HYBRID_SQL = f"""
+    WITH vec AS (
+        SELECT chunk_id, row_number() OVER (ORDER BY embedding <=> %(v)s::vector) AS rank
+        FROM rag_documents
+        ORDER BY embedding <=> %(v)s::vector
+        LIMIT %(depth)s
+    ), kw AS (
+        SELECT chunk_id, row_number() OVER (ORDER BY ts_rank(tsv, q) DESC) AS rank
+        FROM rag_documents, plainto_tsquery('turkish', lower(unaccent(%(q)s))) q
+        WHERE tsv @@ q
+        ORDER BY ts_rank(tsv, q) DESC
+        LIMIT %(depth)s
+    )
+    SELECT chunk_id
+    FROM (SELECT * FROM vec UNION ALL SELECT * FROM kw) c
+    GROUP BY chunk_id
+    ORDER BY SUM(1.0 / ({RRF_K} + rank)) DESC
+    LIMIT %(k)s
+"""
+
+
+def path_chat_unified(cur, vec, text, k):
+    cur.execute(RAG_DOCUMENTS_SQL, (vec, vec, vec, k))
+    return [r[6] for r in cur.fetchall()]
+
+
+def path_knn(cur, vec, text, k):
+    cur.execute(KNN_SQL, (vec, k))
+    return [r[0] for r in cur.fetchall()]
+
+
+def path_keyword(cur, vec, text, k):
+    cur.execute(KEYWORD_SQL, (text, k))
+    return [r[0] for r in cur.fetchall()]
+
+
+def path_hybrid(cur, vec, text, k):
+    cur.execute(HYBRID_SQL, dict(v=vec, q=text, k=k, depth=max(4 * k, 20)))
+    return [r[0] for r in cur.fetchall()]
+
+
+def memory_path(ids, matrix):
+    def path_memory(cur, vec, text, k):
+        scores = matrix @ np.asarray(vec, dtype=np.float32)
+        top = np.argpartition(-scores, min(k, len(scores) - 1))[:k]
+        return [ids[i] for i in top[np.argsort(-scores[top])]]
+    return path_memory
+
+
+def exact_top_k(matrix64, qvecs, k):
+    scores = qvecs @ matrix64.T
+    return np.argsort(-scores, axis=1, kind="stable")[:, :k]
+
+
+# =========================
+# Ölçüm
+# =========================
+def summarize(latencies, recalls, hits, returned):
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if latencies else (0.0, 0.0, 0.0)
+    out = dict(p50_ms=round(float(p50), 3), p95_ms=round(float(p95), 3), p99_ms=round(float(p99), 3),
+               mean_ms=round(float(np.mean(latencies)), 3) if latencies else 0.0, samples=len(latencies))
+    if recalls:
+        out.update(recall=round(float(np.mean(recalls)), 4), source_hit=round(float(np.mean(hits)), 4),
+                   avg_returned=round(float(np.mean(returned)), 2))
+    return out
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline_path):
+    with open(baseline_path, encoding="utf-8") as f:
+        base = json.load(f)
+    print(f"\nΔ {baseline_path} ({base['meta'].get('commit')}, index={base['meta'].get('index')})")
+    for name, cur in report["paths"].items():
+        old = base["paths"].get(name)
+        if not old:
+            continue
+        line = f"  {name:<13} p95 {old['p95_ms']:8.2f} -> {cur['p95_ms']:8.2f}ms"
+        if "recall" in cur and "recall" in old:
+            line += f"  recall {old['recall']:.3f} -> {cur['recall']:.3f}"
+        print(line)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--chunks", default=str(ROOT / "temiz_rag_chunks.jsonl"))
+    ap.add_argument("--queries", help="JSONL: {query, chunk_id}; verilmezse başlık/içerikten üretilir")
+    ap.add_argument("-k", type=int, default=5)
+    ap.add_argument("--repeat", type=int, default=5, help="her sorgu kaç kez ölçülsün")
+    ap.add_argument("--scale", type=int, default=1, help="korpus çarpanı (gürültülü kopyalar)")
+    ap.add_argument("--noise", type=float, default=0.02)
+    ap.add_argument("--index", choices=["hnsw", "ivfflat", "none"], default="hnsw")
+    ap.add_argument("--m", type=int, default=16)
+    ap.add_argument("--ef-construction", type=int, default=64)
+    ap.add_argument("--ef-search", type=int, help="SET hnsw.ef_search")
+    ap.add_argument("--probes", type=int, help="SET ivfflat.probes")
+    ap.add_argument("--paths", nargs="+", default=["chat_unified", "knn", "keyword", "hybrid", "memory"])
+    ap.add_argument("--keep", action="store_true", help=f"{SCHEMA} şemasını sonunda silme")
+    ap.add_argument("--json", help="raporu bu dosyaya yaz")
+    ap.add_argument("--baseline", help="önceki rapor: p95/recall farklarını göster")
+    args = ap.parse_args()
+
+    chunks = load_chunks(args.chunks)
+    if args.queries:
+        queries = [dict(kind="file", **q) for q in load_chunks(args.queries)]
+    else:
+        queries = make_queries(chunks)
+    texts = [q["query"] for q in queries]
+    print(f"ℹ️  {len(chunks)} chunk x{args.scale}, {len(queries)} sorgu, k={args.k}")
+
+    chunk_vecs = encoder_for(model).encode([c["content"] for c in chunks])
+    rows, ids, matrix = corpus(chunks, chunk_vecs, args.scale, args.noise)
+
+    # Sorgu embedding'i ayrı aşama: chat_unified'daki gibi tek tek model.encode
+    embed_ms, qvecs = [], []
+    for text in texts:
+        t0 = time.perf_counter()
+        qvecs.append(model.encode(text))
+        embed_ms.append((time.perf_counter() - t0) * 1000)
+    qvecs = np.asarray(qvecs, dtype=np.float64)
+    qvecs /= np.linalg.norm(qvecs, axis=1, keepdims=True)
+    truth = exact_top_k(matrix.astype(np.float64), qvecs, args.k)
+
+    paths = dict(chat_unified=path_chat_unified, knn=path_knn, keyword=path_keyword, hybrid=path_hybrid,
+                 memory=memory_path(ids, matrix))
+    paths = {name: paths[name] for name in args.paths}
+
+    conn = psycopg2.connect(**DB)
+    conn.autocommit = True      # CREATE INDEX CONCURRENTLY
+    cur = conn.cursor()
+    try:
+        index_info = setup_schema(cur, rows, matrix.shape[1], args.index,
+                                  m=args.m, ef_construction=args.ef_construction)
+        cur.execute(f"SET search_path TO {SCHEMA}, public")
+        if args.ef_search:
+            cur.execute("SET hnsw.ef_search = %s", (args.ef_search,))
+        if args.probes:
+            cur.execute("SET ivfflat.probes = %s", (args.probes,))
+        cur.execute("SELECT version(), (SELECT extversion FROM pg_extension WHERE extname = 'vector')")
+        pg_version, pgvector_version = cur.fetchone()
+
+        vec_lists = [v.tolist() for v in qvecs]
+        for i in range(min(5, len(texts))):                 # ısınma
+            for fn in paths.values():
+                fn(cur, vec_lists[i], texts[i], args.k)
+
+        stats = {name: dict(lat=[], recall=[], hit=[], returned=[]) for name in paths}
+        for rep in range(args.repeat):
+            for i, text in enumerate(texts):
+                want = {ids[j] for j in truth[i]}
+                for name, fn in paths.items():
+                    t0 = time.perf_counter()
+                    got = fn(cur, vec_lists[i], text, args.k)
+                    stats[name]["lat"].append((time.perf_counter() - t0) * 1000)
+                    if rep == 0:
+                        s = stats[name]
+                        s["recall"].append(len(want.intersection(got)) / args.k)
+                        s["hit"].append(any(g.split("#")[0] == queries[i]["chunk_id"] for g in got))
+                        s["returned"].append(len(got))
+    finally:
+        if not args.keep:
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        cur.close()
+        conn.close()
+
+    report = dict(
+        meta=dict(created_at=datetime.now().isoformat(timespec="seconds"), commit=git_commit(),
+                  model=_model_name(model),
+                  dim=int(matrix.shape[1]), rows=len(ids), queries=len(queries), k=args.k,
+                  repeat=args.repeat, scale=args.scale, index=args.index,
+                  index_params=index_info and index_info["params"], ef_search=args.ef_search,
+                  probes=args.probes, postgres=pg_version, pgvector=pgvector_version),
+        paths={"embed": summarize(embed_ms, [], [], [])},
+    )
+    for name, s in stats.items():
+        report["paths"][name] = summarize(s["lat"], s["recall"], s["hit"], s["returned"])
+
+    print(f"\n{'yol':<13} {'p50':>8} {'p95':>8} {'p99':>8}  recall@{args.k}  source_hit  dönen")
+    for name, r in report["paths"].items():
+        extra = (f"  {r['recall']:9.3f}  {r['source_hit']:10.3f}  {r['avg_returned']:5.1f}"
+                 if "recall" in r else "")
+        print(f"{name:<13} {r['p50_ms']:7.2f}ms {r['p95_ms']:7.2f}ms {r['p99_ms']:7.2f}ms{extra}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"✅ {args.json}")
+    if args.baseline:
+        compare(report, args.baseline)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# kb/bench/bench_sectioniser.py
+"""
+preprocess_pdf bölümleyici ölçümü: sentetik 1.000 sayfalık kılavuz.
+
+Eski split_sections (her bölüm için offsets listesini baştan tarayan
+span_to_pages, her madde işareti ayrı bölüm) ile iter_sections
+karşılaştırılır. merge_bullets=False çıktısının eskisiyle birebir aynı
+olduğu da kontrol edilir (bölüm sınırları + sayfa aralıkları).
+
+Kullanım:
+  python kb/bench/bench_sectioniser.py
+  python kb/bench/bench_sectioniser.py --pages 3000 --bullets 12
+"""
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "ingest"))
+from preprocess_pdf import SECTION_RE, iter_sections  # noqa: E402
+
+WORDS = ("fiyat revize ekranında onay talebi mağaza ürün kategori sezon indirim kampanya "
+         "seçilir kaydedilir kontrol edilir rapor alınır stok transfer sipariş").split()
+
+
+def synthetic_pages(n_pages: int, bullets: int, seed: int = 0):
+    rng = random.Random(seed)
+    sentence = lambda k: " ".join(rng.choices(WORDS, k=k)).capitalize() + "."
+    pages, sec = [], 0
+    for num in range(1, n_pages + 1):
+        lines = [f"FIP KULLANICI KILAVUZU Sayfa {num}"]
+        for _ in range(2):
+            sec += 1
+            if sec % 2:
+                lines.append(f"{sec // 10 + 1}.{sec % 10 + 1}) {sentence(4)}")
+            else:
+                lines.append(" ".join(rng.choices(WORDS, k=3)).upper())
+            lines.append(sentence(25))
+            lines += [f"{rng.choice('•-')} {sentence(8)}" for _ in range(bullets)]
+            lines.append(sentence(30))
+        pages.append((num, "\n".join(lines)))
+    return pages
+
+
+def legacy_split_sections(pages):
+    """Değişiklik öncesi split_sections (karşılaştırma için)."""
+    offsets, buf, pos = [], [], 0
+    for num, txt in pages:
+        start = pos
+        buf.append(txt + "\n\n")
+        pos += len(txt) + 2
+        offsets.append((start, pos, num))
+    full = "".join(buf)
+
+    sections, last_idx = [], 0
+    for m in SECTION_RE.finditer(full):
+        start = m.start()
+        if start > last_idx:
+            sections.append((last_idx, start))
+        last_idx = start
+    if last_idx < len(full):
+        sections.append((last_idx, len(full)))
+
+    def span_to_pages(s, e):
+        ps = []
+        for (a, b, pg) in offsets:
+            if b <= s:
+                continue
+            if a >= e:
+                break
+            ps.append(pg)
+        return (min(ps), max(ps)) if ps else (None, None)
+
+    out = []
+    for (s, e) in sections:
+        text = full[s:e].strip()
+        if text:
+            p1, p2 = span_to_pages(s, e)
+            out.append({"text": text, "page_start": p1, "page_end": p2})
+    return out
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--pages", type=int, default=1000)
+    ap.add_argument("--bullets", type=int, default=6, help="bölüm başına madde sayısı")
+    args = ap.parse_args()
+
+    pages = synthetic_pages(args.pages, args.bullets)
+    chars = sum(len(t) for _, t in pages)
+    print(f"ℹ️  {args.pages} sayfa, {chars / 1e6:.1f}M karakter")
+
+    legacy, t_legacy = timed(legacy_split_sections, pages)
+    flat, t_flat = timed(lambda p: list(iter_sections(p, merge_bullets=False)), pages)
+    merged, t_merged = timed(lambda p: list(iter_sections(p)), pages)
+
+    assert flat == legacy, "merge_bullets=False çıktısı eski split_sections'tan farklı"
+    assert "".join(s["text"] for s in merged).replace(" ", "").replace("\n", "") == \
+        "".join(s["text"] for s in legacy).replace(" ", "").replace("\n", ""), "metin kaybı"
+
+    print(f"  eski split_sections        {t_legacy:7.3f}s  {len(legacy):>6} bölüm")
+    print(f"  iter_sections (madde ayrı) {t_flat:7.3f}s  {len(flat):>6} bölüm  x{t_legacy / t_flat:.1f}")
+    print(f"  iter_sections (birleşik)   {t_merged:7.3f}s  {len(merged):>6} bölüm  x{t_legacy / t_merged:.1f}")
+    print("✅ sayfa eşlemesi eskisiyle aynı")
+
+if __name__ == "__main__":
+    main()
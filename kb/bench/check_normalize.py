@@ -0,0 +1,243 @@
+# kb/bench/check_normalize.py
+"""
+normalize.py profillerinin eski temizleyicilerle birebir aynı çıktı
+verdiğinin kontrolü.
+
+Altın küme: temiz_rag_chunks.jsonl metinlerinden pypdf çıktısına benzer
+sayfalar (header/footer blokları, "5/26" / "Sayfa 5" satırları, Görsel/Tablo
+referansları, imza satırları, satır sonu tireleri, \\r\\n, sekmeler, harf
+aralıklı kelimeler, kontrol karakterleri, İÇİNDEKİLER blokları). Üstüne
+küçük bir token alfabesinden rastgele fuzz metinleri eklenir.
+
+tests/test_normalize.py altın kümenin kayıtlı küçük bir örneğini
+(tests/data/normalize_golden.json, eski fonksiyonların çıktılarıyla) ve sabit
+tohumlu bir fuzz alt kümesini CI'da çalıştırır.
+
+Kullanım:
+  python kb/bench/check_normalize.py
+  python kb/bench/check_normalize.py --fuzz 50000 --seed 3
+  python kb/bench/check_normalize.py --write-golden      # kayıtlı örneği yeniden üret
+"""
+import re
+import sys
+import json
+import random
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "ingest"))
+import normalize  # noqa: E402
+
+CHUNKS_FILE = Path(__file__).resolve().parent.parent.parent / "temiz_rag_chunks.jsonl"
+GOLDEN_FILE = Path(__file__).resolve().parent.parent.parent / "tests" / "data" / "normalize_golden.json"
+
+
+# =========================
+# Eski fonksiyonlar (değişiklik öncesi, karşılaştırma için)
+# =========================
+def legacy_plain_text(text: str) -> str:
+    """process_pdfs_hf.clean_text"""
+    if not text:
+        return ""
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'[\x00-\x08\x0b-\x0c\x0e-\x1f\x7f-\x9f]', '', text)
+    text = re.sub(r'(?<=\w)\s(?=\w(?:\s\w){2,})', '', text)
+    text = re.sub(r'-{2,}', ' ', text)
+    return text.strip()
+
+
+def legacy_page_lines(s: str) -> str:
+    """ingest_hf.norm_spaces"""
+    s = re.sub(r"-\n(?=\w)", "", s)
+    s = re.sub(r"[ \t]+", " ", s)
+    s = re.sub(r" ?\n ?", "\n", s)
+    return s.strip()
+
+
+def legacy_preprocess(t: str) -> str:
+    """preprocess_pdf.clean_text"""
+    t = t.replace('\r', '')
+    t = re.sub(r'\n{3,}', '\n\n', t)
+    t = re.sub(r'-\n', '', t)
+    t = re.sub(r'[ \t]{2,}', ' ', t)
+    return t.strip()
+
+
+HEADER_FOOTER_PATTERN = re.compile(r"(KULLANICI KILAVUZU|TALİMAT).*?(DAHİLİ|GENEL)", re.IGNORECASE | re.DOTALL)
+LINE_PAGE_NUMBER_PATTERN = re.compile(r"^\s*(sayfa\s*\d+|\d+\s*/\s*\d+|\d{1,3})\s*$", re.IGNORECASE | re.MULTILINE)
+VISUAL_REF_PATTERN = re.compile(r"\b(Görsel|Tablo|Şekil)[- ]?\d+\b", re.IGNORECASE)
+SIGNOFF_PATTERN = re.compile(
+    r"(Hazırlayan|Kontrol Eden|Onaylayan|OPERASYON MÜDÜRLÜĞÜ|FİYAT VE İNDİRİM PLANLAMA MÜDÜRÜ).*",
+    re.IGNORECASE
+)
+TOC_PATTERN = re.compile(r"(?is)\bİÇİNDEKİLER\b.*?(?:\n\s*\d+(\.\d+)*\s+|(?:\n){2,})")
+
+
+def legacy_pdf_page(text: str) -> str:
+    """clean_pdf_data.clean_page_text"""
+    if not text:
+        return ""
+    text = HEADER_FOOTER_PATTERN.sub(" ", text)
+    text = LINE_PAGE_NUMBER_PATTERN.sub("", text)
+    text = VISUAL_REF_PATTERN.sub(" ", text)
+    text = SIGNOFF_PATTERN.sub("", text)
+    text = re.sub(r"(\w)-\n(\w)", r"\1\2", text)
+    text = re.sub(r"[ \t]+", " ", text)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return text.strip()
+
+
+def legacy_strip_toc(full_text: str) -> str:
+    """clean_pdf_data.remove_toc_block"""
+    head = full_text[:8000]
+    match = TOC_PATTERN.search(head)
+    if match:
+        start, end = match.span()
+        return full_text[:start] + full_text[end:]
+    return full_text
+
+
+PROFILES = {
+    "plain_text": (legacy_plain_text, normalize.plain_text),
+    "page_lines": (legacy_page_lines, normalize.page_lines),
+    "preprocess": (legacy_preprocess, normalize.preprocess),
+    "pdf_page": (legacy_pdf_page, normalize.pdf_page),
+    "strip_toc": (legacy_strip_toc, normalize.strip_toc),
+}
+
+
+# =========================
+# Altın küme
+# =========================
+def load_texts():
+    texts = []
+    if CHUNKS_FILE.exists():
+        with open(CHUNKS_FILE, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    texts.append(json.loads(line).get("content") or "")
+    return [t for t in texts if t] or ["Fiyat revize ekranında onay talebi oluşturulur ve kaydedilir."]
+
+
+def hyphenate(rng, text):
+    """Satır kırma + tire: pypdf'in uzun satırları bölmesine benzer."""
+    words, lines, cur = text.split(), [], ""
+    for w in words:
+        if len(cur) + len(w) > 70 and cur:
+            if len(w) > 6 and rng.random() < 0.3:
+                cut = rng.randint(2, len(w) - 2)
+                lines.append(f"{cur} {w[:cut]}-")
+                cur = w[cut:]
+                continue
+            lines.append(cur)
+            cur = w
+        else:
+            cur = f"{cur} {w}" if cur else w
+    lines.append(cur)
+    return "\n".join(lines)
+
+
+def letter_space(rng, text):
+    words = text.split()
+    for i in rng.sample(range(len(words)), k=min(2, len(words))):
+        words[i] = " ".join(words[i])
+    return " ".join(words)
+
+
+def golden_pages(rng, texts, n):
+    pages = []
+    for i in range(n):
+        body = hyphenate(rng, rng.choice(texts))
+        if rng.random() < 0.3:
+            body = letter_space(rng, body)
+        parts = []
+        if rng.random() < 0.6:
+            parts.append(rng.choice(["FİYAT REVİZE KULLANICI KILAVUZU\nSürüm 1.2\nDAHİLİ",
+                                     "TALİMAT No: 12\nGENEL", "Kullanıcı Kılavuzu  Dahili"]))
+        if rng.random() < 0.2:
+            parts.append("İÇİNDEKİLER\n1. Giriş ..... 3\n2. Fiyat Revize ..... 5" + rng.choice(["\n\n", "\n \n", ""]))
+        parts.append(body)
+        if rng.random() < 0.4:
+            parts.append(rng.choice(["Görsel 3", "Tablo-2 özet", "Şekil 12: ekran"]))
+        if rng.random() < 0.3:
+            parts.append(rng.choice(["Hazırlayan: A. Yılmaz", "Kontrol Eden  B. Kaya", "OPERASYON MÜDÜRLÜĞÜ"]))
+        if rng.random() < 0.7:
+            parts.append(rng.choice([f"{i + 1}/26", f"Sayfa {i + 1}", f"  {i + 1}  ", f"sayfa{i + 1}\n"]))
+        sep = rng.choice(["\n", "\n\n", "\n\n\n", " \n", "\r\n", "\n\t"])
+        page = sep.join(parts)
+        if rng.random() < 0.2:
+            page = page.replace(" ", rng.choice(["  ", "\t", " \x0c", "\x07 "]), 3)
+        pages.append(page)
+    return pages
+
+
+# =========================
+# Fuzz
+# =========================
+FUZZ_TOKENS = ["a", "b", "ş", "1", "12", "5/26", " ", "  ", "\t", "\n", "\n\n", "\r", "-", "--", "\x00",
+               "\x0b", "\x0c", "\x1c", "\x85", "\xa0", "\x9f", "sayfa", "Sayfa 3", "Görsel", "Tablo 4",
+               "Şekil-2", "görsel1", "xTablo 2", "Hazırlayan", "kontrol eden", "\u212aONTROL EDEN",
+               "onaylayan", "KULLANICI KILAVUZU", "TALİMAT", "DAHİLİ", "GENEL", "İÇİNDEKİLER",
+               "kelime", "a b c", ".", "/", "_"]
+
+
+def fuzz_texts(rng, n, max_tokens=25):
+    for _ in range(n):
+        yield "".join(rng.choices(FUZZ_TOKENS, k=rng.randint(0, max_tokens)))
+
+
+def write_golden(rng, n, path=GOLDEN_FILE):
+    """Kısaltılmış altın sayfalar + belgeler, eski fonksiyonların çıktılarıyla"""
+    pages = golden_pages(rng, [t[:400] for t in load_texts()], n)
+    docs = ["\n\n".join(rng.sample(pages, k=5)) for _ in range(max(1, n // 8))]
+    cases = [{"input": t, "expected": {name: old(t) for name, (old, _) in PROFILES.items()}}
+             for t in pages + docs]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(cases, ensure_ascii=False, indent=1) + "\n", encoding="utf-8")
+    print(f"💾 {path} ({len(cases)} örnek)")
+
+
+def check(texts):
+    failures = {name: [] for name in PROFILES}
+    for text in texts:
+        for name, (old, new) in PROFILES.items():
+            if old(text) != new(text):
+                failures[name].append(text)
+    return failures
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--golden", type=int, default=2000, help="altın küme sayfa sayısı")
+    ap.add_argument("--fuzz", type=int, default=20000)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--write-golden", action="store_true", help=f"{GOLDEN_FILE.name} dosyasını yeniden üret")
+    ap.add_argument("--golden-sample", type=int, default=48, help="kayıtlı örnekteki sayfa sayısı")
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    if args.write_golden:
+        write_golden(rng, args.golden_sample)
+        return
+    golden = golden_pages(rng, load_texts(), args.golden)
+    fuzz = list(fuzz_texts(rng, args.fuzz))
+    # Belge düzeyi: strip_toc birleşik metinde çalışır
+    docs = ["\n\n".join(rng.sample(golden, k=5)) for _ in range(args.golden // 10)]
+
+    ok = True
+    for label, texts in (("altın", golden + docs), ("fuzz", fuzz)):
+        failures = check(texts)
+        for name, bad in failures.items():
+            status = "✅" if not bad else "❌"
+            print(f"{status} {label:<6} {name:<11} {len(texts) - len(bad)}/{len(texts)}")
+            if bad:
+                ok = False
+                sample = min(bad, key=len)
+                old, new = PROFILES[name]
+                print(f"   örnek: {sample!r}\n   eski:  {old(sample)!r}\n   yeni:  {new(sample)!r}")
+    if not ok:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# kb/bench/check_prompt_prefix.py
+"""
+prompts.build_messages çıktısındaki sabit önekin istekler arasında bayt bayt
+aynı kaldığının kontrolü (Ollama önek önbelleği ancak böyle isabet eder).
+
+Kontroller:
+  - ilk mesaj her istekte {"role": "system", "content": SYSTEM_PROMPT}
+    ve UTF-8 baytları tek bir sha256'ya iner
+  - SYSTEM_PROMPT'ta biçimlenmemiş yer tutucu ya da tarih/saat yok
+  - sohbet şablonuyla (fake_ollama.render_chat) işlenmiş prompt'ların ortak
+    öneki en az system bloğu kadar; soru ya da bağlam öneke sızmıyor
+
+Örnekler temiz_rag_chunks.jsonl'den, üstüne uç durumlar (boş bağlam, adımlı
+eğitim içeriği, "{}"/satır sonu/emoji içeren sorular) eklenir.
+
+tests/test_prompt_prefix.py aynı kontrolleri CI'da küçük bir örneklemle çalıştırır.
+
+Kullanım: python kb/bench/check_prompt_prefix.py --samples 500
+"""
+import re
+import sys
+import hashlib
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "ingest"))
+from prompts import SYSTEM_PROMPT, build_messages  # noqa: E402
+from fake_ollama import render_chat  # noqa: E402
+from bench_prompt_cache import legacy_messages, sample_requests  # noqa: E402
+
+EDGE_CASES = [
+    ("Fiyat revize nedir?", []),
+    ("  {question}  \n\n Kaynaklar: Kural yok?  ", []),
+    ("İndirim planı 🙂 nasıl açılır?", [
+        {"type": "training", "title": "İndirim planı", "content": "Plan ekranı", "similarity": 0.91, "id": 7,
+         "steps": ["Menüyü aç", "Planı seç", "Kaydet"], "tags": ["indirim"]},
+    ]),
+    ("SADECE verilen bilgileri kullan", [
+        {"type": "document", "title": None, "content": "x" * 5000, "page": None, "similarity": 0.7,
+         "file": "a.pdf", "chunk_id": "c1"},
+    ]),
+]
+
+
+def common_prefix(a: bytes, b: bytes) -> int:
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+def shared_prefix(rendered):
+    prefix = rendered[0]
+    for r in rendered[1:]:
+        prefix = prefix[:common_prefix(prefix, r)]
+    return len(prefix)
+
+
+def system_block() -> bytes:
+    """Sohbet şablonunda system mesajının baytları (assistant açılışı hariç)"""
+    block = render_chat([{"role": "system", "content": SYSTEM_PROMPT}])
+    return block[:-len("<|assistant|>\n")].encode("utf-8")
+
+
+def check_cases(cases):
+    """(hatalar, ölçümler); hatalar boşsa önek tüm isteklerde bayt bayt aynı"""
+    failures = []
+    if re.search(r"\{[^}]*\}", SYSTEM_PROMPT):
+        failures.append("SYSTEM_PROMPT biçimlenmemiş yer tutucu içeriyor")
+    if re.search(r"\d{4}-\d{2}-\d{2}|\d{1,2}:\d{2}", SYSTEM_PROMPT):
+        failures.append("SYSTEM_PROMPT tarih/saat içeriyor")
+
+    digests = set()
+    rendered = []
+    for question, contexts in cases:
+        messages = build_messages(question, contexts)
+        first = messages[0]
+        if first != {"role": "system", "content": SYSTEM_PROMPT}:
+            failures.append(f"ilk mesaj system değil: {question!r}")
+        digests.add(hashlib.sha256(first["content"].encode("utf-8")).hexdigest())
+        rendered.append(render_chat(messages).encode("utf-8"))
+    if len(digests) != 1:
+        failures.append(f"system mesajı {len(digests)} farklı bayt dizisi üretti")
+
+    block = system_block()
+    new_prefix = shared_prefix(rendered)
+    if new_prefix < len(block):
+        failures.append(f"ortak önek {new_prefix} bayt < system bloğu {len(block)} bayt")
+    if not all(r.startswith(block) for r in rendered):
+        failures.append("render edilmiş prompt system bloğuyla başlamıyor")
+
+    stats = dict(
+        requests=len(cases),
+        old_prefix=shared_prefix([render_chat(legacy_messages(q, c)).encode("utf-8") for q, c in cases]),
+        new_prefix=new_prefix,
+        system_block=len(block),
+        avg_prompt=sum(len(r) for r in rendered) / len(rendered),
+    )
+    return failures, stats
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--samples", type=int, default=500)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    failures, st = check_cases(EDGE_CASES + sample_requests(args.samples, seed=args.seed))
+    print(f"📏 {st['requests']} istek · ortak önek: eski {st['old_prefix']} bayt → yeni {st['new_prefix']} bayt "
+          f"(system bloğu {st['system_block']}, ort. prompt {st['avg_prompt']:.0f} bayt)")
+
+    if failures:
+        for f in failures[:20]:
+            print(f"❌ {f}")
+        sys.exit(1)
+    print("✅ sabit önek tüm isteklerde bayt bayt aynı")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# kb/bench/check_section_alignment.py
+"""
+Toplu bölüm yazımında section/embedding eşleşmesinin korunduğunu doğrular.
+
+Binlerce chunk geçici tablolara copy_sections + copy_embeddings ile yazılır;
+her embedding'in ilk bileşeni chunk sırasını taşır ve JOIN sonrası içerikle
+karşılaştırılır. Aynı anda ikinci bir bağlantı sequence'ten id tüketir.
+
+tests/test_section_alignment.py aynı kontrolü küçük boyutla çalıştırır
+(PostgreSQL + pgvector yoksa atlanır).
+
+Kullanım: python kb/bench/check_section_alignment.py --chunks 5000
+"""
+import os
+import sys
+import argparse
+from pathlib import Path
+
+import numpy as np
+import psycopg2
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "ingest"))
+from pg_copy import copy_sections, copy_embeddings  # noqa: E402
+
+DB = dict(
+    host=os.getenv("DB_HOST", "localhost"),
+    port=int(os.getenv("DB_PORT", "5432")),
+    dbname=os.getenv("DB_NAME", "kb"),
+    user=os.getenv("DB_USER", "troy"),
+    password=os.getenv("DB_PASSWORD", "troy1234"),
+)
+SCHEMA = "_align_check"
+DIM = 8
+
+
+def check_alignment(conn, other, chunks: int, docs: int):
+    """(satır, beklenen, hatalı); SCHEMA her çalıştırmada kurulup sonunda silinir"""
+    cur, ocur = conn.cursor(), other.cursor()
+    try:
+        cur.execute("CREATE EXTENSION IF NOT EXISTS vector;")
+        cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE; CREATE SCHEMA {SCHEMA};")
+        cur.execute(f"""
+        CREATE TABLE {SCHEMA}.document_sections (
+          id BIGSERIAL PRIMARY KEY,
+          document_id BIGINT NOT NULL,
+          content TEXT NOT NULL,
+          page_number INT
+        );
+        CREATE TABLE {SCHEMA}.document_embeddings (
+          id BIGSERIAL PRIMARY KEY,
+          section_id BIGINT REFERENCES {SCHEMA}.document_sections(id) ON DELETE CASCADE,
+          embedding vector({DIM}) NOT NULL,
+          model_name VARCHAR(100) NOT NULL
+        );""")
+        conn.commit()
+
+        for doc_id in range(1, docs + 1):
+            rows = [(doc_id, f"doc{doc_id}-chunk{i}", i // 7 + 1) for i in range(chunks)]
+            vecs = np.zeros((chunks, DIM), dtype=np.float32)
+            vecs[:, 0] = np.arange(chunks)
+            vecs[:, 1] = doc_id
+
+            sec_ids = copy_sections(cur, ("document_id", "content", "page_number"),
+                                    ("int8", "text", "int4"), rows,
+                                    table=f"{SCHEMA}.document_sections")
+            # araya başka bir oturumdan sequence tüketimi
+            ocur.execute(f"SELECT nextval(pg_get_serial_sequence('{SCHEMA}.document_sections', 'id')) "
+                         f"FROM generate_series(1, 17)")
+            copy_embeddings(cur, sec_ids, vecs, "check",
+                            table=f"{SCHEMA}.document_embeddings")
+            conn.commit()
+
+        cur.execute(f"""
+        SELECT s.content, s.document_id, e.embedding::text
+        FROM {SCHEMA}.document_sections s
+        JOIN {SCHEMA}.document_embeddings e ON e.section_id = s.id
+        """)
+        rows = cur.fetchall()
+        bad = 0
+        for content, doc_id, emb in rows:
+            vals = emb.strip("[]").split(",")
+            if content != f"doc{int(float(vals[1]))}-chunk{int(float(vals[0]))}" or int(float(vals[1])) != doc_id:
+                bad += 1
+        return len(rows), chunks * docs, bad
+    finally:
+        conn.rollback()
+        cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        conn.commit()
+        cur.close(); ocur.close()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--chunks", type=int, default=5000)
+    ap.add_argument("--docs", type=int, default=3)
+    args = ap.parse_args()
+
+    conn = psycopg2.connect(**DB)
+    other = psycopg2.connect(**DB)
+    try:
+        n, expected, bad = check_alignment(conn, other, args.chunks, args.docs)
+    finally:
+        conn.close(); other.close()
+    print(f"satır={n} beklenen={expected} hatalı={bad}")
+    if bad or n != expected:
+        raise SystemExit("❌ section/embedding eşleşmesi bozuk")
+    print("✅ section/embedding eşleşmesi doğru")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+# kb/bench/fake_ollama.py
+"""
+Ollama yerine geçen sahte HTTP sunucusu: /chat yük testleri gerçek model
+olmadan, tekrarlanabilir sürelerle koşsun diye.
+
+Uçlar (Ollama API ile aynı gövdeler):
+  POST /api/chat       messages -> message.content (stream: NDJSON parçaları)
+  POST /api/generate   prompt -> response (stream: NDJSON parçaları)
+  GET  /api/tags       yüklü model listesi (sağlık kontrolü)
+  GET  /api/version
+  GET  /_fake/stats    sayaçlar (istek, değerlendirilen/önbellekten prompt token'ı, model yükleme)
+
+Gecikme modeli (CPU Ollama'ya benzer):
+  model yükleme   --load-ms; ilk istekte, model değişince ya da keep_alive dolunca
+  prompt eval     değerlendirilen token / --prompt-rate; slot'taki önceki prompt ile
+                  ortak önek önbellekten gelir (--no-prefix-cache ile kapatılır)
+  üretim          her token 1 / --token-rate saniye; token sayısı
+                  min(options.num_predict, --answer-tokens)
+  --parallel      aynı anda üretim yapan slot sayısı (OLLAMA_NUM_PARALLEL); fazlası sıra bekler
+Cevap metni prompt'un sha256'sından türetilir: aynı prompt her zaman aynı cevap.
+Token sayıları yaklaşık: 4 karakter = 1 token.
+
+Kullanım:
+  python kb/bench/fake_ollama.py --port 11435 --token-rate 20 --parallel 2
+  OLLAMA_HOST=http://127.0.0.1:11435 python kb/ingest/chat_unified.py --api
+"""
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CHARS_PER_TOKEN = 4
+ANSWER_WORDS = ("fiyat revize ekranında onay talebi oluşturulur mağaza ürün kategori seçilir "
+                "kaydedilir kontrol edilir rapor alınır stok transfer sipariş kullanıcı işlem "
+                "tamamlandıktan sonra ilgili alanlar doldurulur butonuna tıklanır").split()
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def tokens(text: str) -> int:
+    return max(1, len(text) // CHARS_PER_TOKEN) if text else 0
+
+
+def keep_alive_seconds(value, default: float) -> float:
+    """Ollama keep_alive: saniye sayısı ya da "5m"/"30s"; negatif = sınırsız, 0 = hemen boşalt."""
+    if value is None:
+        return default
+    if isinstance(value, (int, float)):
+        return float("inf") if value < 0 else float(value)
+    value = str(value).strip()
+    for unit in sorted(_DURATION_UNITS, key=len, reverse=True):
+        if value.endswith(unit) and value[:-len(unit)].lstrip("-").replace(".", "", 1).isdigit():
+            secs = float(value[:-len(unit)]) * _DURATION_UNITS[unit]
+            return float("inf") if secs < 0 else secs
+    return default
+
+
+def render_chat(messages) -> str:
+    """Sohbet şablonu: önek önbelleği bu metin üzerinden hesaplanır."""
+    parts = [f"<|{m.get('role', 'user')}|>\n{m.get('content', '')}\n" for m in messages]
+    return "".join(parts) + "<|assistant|>\n"
+
+
+def answer_pieces(prompt: str, n_tokens: int):
+    """Deterministik cevap: ilk parça kaynak atfı, gerisi prompt'a bağlı kelimeler."""
+    rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).digest())
+    pieces = ["Kaynak 1'e göre"]
+    pieces += [" " + rng.choice(ANSWER_WORDS) for _ in range(max(0, n_tokens - 2))]
+    pieces.append(".")
+    return pieces[:max(1, n_tokens)]
+
+
+def common_prefix(a: str, b: str) -> int:
+    n = min(len(a), len(b))
+    if a[:n] == b[:n]:
+        return n
+    lo, hi = 0, n
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+class FakeModel:
+    """Yükleme durumu, slot'lar (paralel üretim + önek önbelleği) ve sayaçlar."""
+
+    def __init__(self, load_ms=800.0, prompt_rate=400.0, token_rate=25.0, answer_tokens=120,
+                 parallel=1, prefix_cache=True, keep_alive=300.0, fail_rate=0.0, seed=0):
+        self.load_s = load_ms / 1000
+        self.prompt_rate = prompt_rate
+        self.token_rate = token_rate
+        self.answer_tokens = answer_tokens
+        self.prefix_cache = prefix_cache
+        self.keep_alive = keep_alive
+        self.fail_rate = fail_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._free = threading.Condition(self._lock)
+        self._slots = [""] * parallel          # slot başına son prompt
+        self._busy = [False] * parallel
+        self._loaded = None                    # (model, bitiş zamanı)
+        self.stats = dict(requests=0, failed=0, loads=0, prompt_tokens=0, cached_tokens=0,
+                          eval_tokens=0, queue_wait_s=0.0)
+
+    def _acquire(self, prompt: str):
+        """Boş slot'lardan ortak öneki en uzun olanı; hiç boş yoksa bekle."""
+        with self._free:
+            while all(self._busy):
+                self._free.wait()
+            best = max((i for i, b in enumerate(self._busy) if not b),
+                       key=lambda i: common_prefix(self._slots[i], prompt))
+            self._busy[best] = True
+            return best
+
+    def _release(self, slot: int, prompt: str):
+        with self._free:
+            self._slots[slot] = prompt
+            self._busy[slot] = False
+            self._free.notify()
+
+    def _ensure_loaded(self, model: str, keep_alive: float) -> float:
+        """Yükleme gerekiyorsa süre (sn); keep_alive penceresi her istekte uzar."""
+        with self._lock:
+            now = time.monotonic()
+            loaded = self._loaded
+            load = 0.0
+            if loaded is None or loaded[0] != model or loaded[1] < now:
+                load = self.load_s
+                self.stats["loads"] += 1
+                self._slots = [""] * len(self._slots)
+            self._loaded = (model, now + load + keep_alive)
+            return load
+
+    def generate(self, model: str, prompt: str, num_predict=None, keep_alive=None):
+        """(parça, metrikler) üreteci; son eleman (None, metrikler)."""
+        t_start = time.perf_counter()
+        with self._lock:
+            self.stats["requests"] += 1
+            fail = self.fail_rate and self._rng.random() < self.fail_rate
+        if fail:
+            with self._lock:
+                self.stats["failed"] += 1
+            raise RuntimeError("fake ollama: enjekte edilen hata")
+
+        slot = self._acquire(prompt)
+        t_slot = time.perf_counter()
+        try:
+            load = self._ensure_loaded(model, keep_alive_seconds(keep_alive, self.keep_alive))
+            time.sleep(load)
+
+            cached = common_prefix(self._slots[slot], prompt) if self.prefix_cache else 0
+            prompt_total = tokens(prompt)
+            evaluated = max(1, prompt_total - cached // CHARS_PER_TOKEN)
+            t_eval = time.perf_counter()
+            time.sleep(evaluated / self.prompt_rate)
+            prompt_eval = time.perf_counter() - t_eval
+
+            limit = self.answer_tokens if num_predict in (None, -1, -2) else min(int(num_predict), self.answer_tokens)
+            t_gen = time.perf_counter()
+            pieces = answer_pieces(prompt, limit)
+            for i, piece in enumerate(pieces):
+                time.sleep(max(0.0, t_gen + (i + 1) / self.token_rate - time.perf_counter()))
+                yield piece, None
+            eval_s = time.perf_counter() - t_gen
+        finally:
+            self._release(slot, prompt)
+
+        with self._lock:
+            self.stats["prompt_tokens"] += evaluated
+            self.stats["cached_tokens"] += prompt_total - evaluated
+            self.stats["eval_tokens"] += len(pieces)
+            self.stats["queue_wait_s"] += t_slot - t_start
+        yield None, dict(
+            total_duration=int((time.perf_counter() - t_start) * 1e9),
+            load_duration=int(load * 1e9),
+            prompt_eval_count=evaluated,
+            prompt_eval_duration=int(prompt_eval * 1e9),
+            eval_count=len(pieces),
+            eval_duration=int(eval_s * 1e9),
+        )
+
+    def tags(self):
+        with self._lock:
+            loaded = self._loaded
+        models = [loaded[0]] if loaded else []
+        return {"models": [{"name": m, "model": m, "size": 0, "digest": hashlib.sha256(m.encode()).hexdigest()}
+                           for m in models]}
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"      # keep-alive; stream cevapları chunked
+    fake: FakeModel = None
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, status: int, body: dict):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _chunk(self, obj: dict):
+        data = json.dumps(obj, ensure_ascii=False).encode("utf-8") + b"\n"
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            return self._json(200, self.fake.tags())
+        if self.path == "/api/version":
+            return self._json(200, {"version": "0.0.0-fake"})
+        if self.path == "/_fake/stats":
+            with self.fake._lock:
+                return self._json(200, dict(self.fake.stats))
+        if self.path == "/":
+            return self._json(200, {"status": "Ollama is running"})
+        self._json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path not in ("/api/chat", "/api/generate"):
+            return self._json(404, {"error": "not found"})
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            req = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self._json(400, {"error": "invalid JSON"})
+
+        model = req.get("model") or ""
+        if not model:
+            return self._json(400, {"error": "model is required"})
+        chat = self.path == "/api/chat"
+        if chat:
+            prompt = render_chat(req.get("messages") or [])
+        else:
+            prompt = (req.get("system") or "") + (req.get("prompt") or "")
+        options = req.get("options") or {}
+        stream = req.get("stream", True)
+
+        def body(text, done, metrics=None):
+            out = {"model": model, "created_at": _now()}
+            if chat:
+                out["message"] = {"role": "assistant", "content": text}
+            else:
+                out["response"] = text
+            out["done"] = done
+            if done:
+                limit = options.get("num_predict")
+                out["done_reason"] = "length" if limit and metrics["eval_count"] >= limit else "stop"
+                out.update(metrics)
+                if not chat:
+                    out["context"] = []
+            return out
+
+        gen = self.fake.generate(model, prompt, options.get("num_predict"), req.get("keep_alive"))
+        try:
+            if not stream:
+                pieces, metrics = [], None
+                for piece, metrics in gen:
+                    if piece is not None:
+                        pieces.append(piece)
+                return self._json(200, body("".join(pieces), True, metrics))
+
+            piece, metrics = next(gen)      # enjekte hata başlıklardan önce yükselsin
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            while True:
+                self._chunk(body("", True, metrics) if piece is None else body(piece, False))
+                if piece is None:
+                    break
+                piece, metrics = next(gen)
+            self.wfile.write(b"0\r\n\r\n")
+        except RuntimeError as e:
+            self._json(500, {"error": str(e)})
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+
+def serve(fake: FakeModel, host: str = "127.0.0.1", port: int = 11435) -> ThreadingHTTPServer:
+    """Arka plan thread'inde başlat (yük testi aynı süreçte kullanır); sunucuyu döndürür."""
+    handler = type("FakeOllamaHandler", (Handler,), {"fake": fake})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_arguments(ap: argparse.ArgumentParser):
+    ap.add_argument("--load-ms", type=float, default=800.0, help="model yükleme süresi")
+    ap.add_argument("--prompt-rate", type=float, default=400.0, help="prompt eval token/sn")
+    ap.add_argument("--token-rate", type=float, default=25.0, help="üretim token/sn")
+    ap.add_argument("--answer-tokens", type=int, default=120, help="cevap uzunluğu üst sınırı (token)")
+    ap.add_argument("--parallel", type=int, default=1, help="eşzamanlı üretim slot'u")
+    ap.add_argument("--no-prefix-cache", action="store_true", help="ortak önek önbelleğini kapat")
+    ap.add_argument("--keep-alive", type=float, default=300.0, help="varsayılan keep_alive (sn)")
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="500 dönecek istek oranı")
+    ap.add_argument("--seed", type=int, default=0)
+
+
+def from_args(args) -> FakeModel:
+    return FakeModel(load_ms=args.load_ms, prompt_rate=args.prompt_rate, token_rate=args.token_rate,
+                     answer_tokens=args.answer_tokens, parallel=args.parallel,
+                     prefix_cache=not args.no_prefix_cache, keep_alive=args.keep_alive,
+                     fail_rate=args.fail_rate, seed=args.seed)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Sahte Ollama sunucusu (yük testleri için)")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=11435)
+    add_arguments(ap)
+    args = ap.parse_args()
+
+    server = serve(from_args(args), args.host, args.port)
+    print(f"✅ sahte Ollama: http://{args.host}:{args.port} "
+          f"(prompt {args.prompt_rate:g} tok/s, üretim {args.token_rate:g} tok/s, {args.parallel} slot)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,427 @@
+# kb/bench/load_chat.py
+"""
+/chat uçtan uca yük testi: hedef RPS (açık döngü) ya da eşzamanlılık (kapalı
+döngü) ile soru gönderir; verim, hata oranı ve aşama başına gecikme
+yüzdeliklerini raporlar. Eşikler verilirse aşımda 1 ile çıkar (CI kapısı).
+
+Aşamalar: client (istemcinin ölçtüğü uçtan uca), server (chat() toplamı),
+embed, faq, retrieve, llm (chat() cevabındaki timings), wait (client - server:
+ağ + sunucuda sıra). Cevaptaki "path" alanına göre yol dağılımı (faq, llm,
+coalesced, fast_path, no_context) da raporlanır. Açık döngüde gecikme
+planlanan gönderim anından ölçülür; istemci geride kalırsa bu da gecikmeye
+yansır.
+
+Soru karışımı: temiz_rag_chunks.jsonl bölüm başlıklarından şablonlar ("X
+nedir?", "X nasıl yapılır?"), içerik cümlesi başları ve %5 alan dışı soru;
+popülerlik Zipf dağılımlı (sık sorulan sorular tekrar eder). --questions ile
+satır başına bir soru içeren dosya verilebilir.
+
+LLM için sahte Ollama (fake_ollama.py) aynı süreçte başlatılabilir;
+--start-api chat_unified'ı OLLAMA_HOST o sunucuyu gösterecek şekilde açar
+(Postgres ve embedding modeli yine gerekir). .github/workflows/load-chat.yml
+bunu pgvector servisiyle elle tetiklenince ve haftalık çalıştırır; PR'larda
+çalışmaz.
+
+Kullanım:
+  python kb/bench/load_chat.py --fake-ollama 11435 --start-api --rps 2 --duration 60 \\
+      --json /tmp/load.json
+  python kb/bench/load_chat.py --concurrency 8 --requests 400 --baseline /tmp/load.json \\
+      --max-error-rate 0.01 --max-p95-ms 8000 --max-regression 1.2
+"""
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import threading
+import subprocess
+import http.client
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+BENCH_DIR = Path(__file__).resolve().parent
+ROOT = BENCH_DIR.parent.parent
+sys.path.insert(0, str(BENCH_DIR))
+import fake_ollama  # noqa: E402
+
+STAGES = ("client", "server", "embed", "faq", "retrieve", "llm", "wait")
+TEMPLATES = ["{} nedir?", "{} nasıl yapılır?", "{} ekranında hangi adımlar izlenir?",
+             "{} için onay gerekir mi?", "{} ile ilgili hata alıyorum, ne yapmalıyım?"]
+OFF_TOPIC = ["Yarın hava nasıl olacak?", "En iyi pizza tarifi nedir?", "Futbol maçı kaç kaç bitti?",
+             "Bana bir şiir yazar mısın?", "Dolar kuru bugün ne kadar?"]
+FALLBACK_TITLES = ["Fiyat revize", "Psikolojik fiyat", "Stok transferi", "Kampanya tanımlama",
+                   "Sipariş onayı", "İndirim planlama", "Mağaza sayımı", "Sezon kapanışı"]
+
+
+# =========================
+# Soru karışımı
+# =========================
+def question_pool(chunks_path, rng, size=400):
+    titles, sentences = [], []
+    if chunks_path and Path(chunks_path).exists():
+        with open(chunks_path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                ch = json.loads(line)
+                title = (ch.get("section_title") or "").strip()
+                # "2.3 Başlık" -> "Başlık"
+                title = title.split(" ", 1)[1] if title[:1].isdigit() and " " in title else title
+                if 3 <= len(title) <= 80:
+                    titles.append(title)
+                words = (ch.get("content") or "").split()
+                if len(words) >= 8:
+                    sentences.append(" ".join(words[:8]).rstrip(".,;:") + " nedir?")
+    titles = sorted(set(titles)) or FALLBACK_TITLES
+    pool = [rng.choice(TEMPLATES).format(rng.choice(titles)) for _ in range(size * 3 // 4)]
+    pool += rng.sample(sentences, k=min(len(sentences), size // 4))
+    pool = list(dict.fromkeys(pool))
+    rng.shuffle(pool)
+    return pool
+
+
+class QuestionMix:
+    """Zipf popülerlikli havuz + alan dışı sorular."""
+
+    def __init__(self, pool, seed=0, zipf=1.1, off_topic=0.05):
+        self.pool = pool
+        self.rng = random.Random(seed)
+        weights = 1.0 / np.arange(1, len(pool) + 1) ** zipf
+        self.cum = np.cumsum(weights / weights.sum())
+        self.off_topic = off_topic
+        self.lock = threading.Lock()
+
+    def next(self):
+        with self.lock:
+            if self.rng.random() < self.off_topic:
+                return self.rng.choice(OFF_TOPIC)
+            i = int(np.searchsorted(self.cum, self.rng.random()))
+            return self.pool[min(i, len(self.pool) - 1)]
+
+
+# =========================
+# HTTP istemcisi
+# =========================
+class ChatClient:
+    """Thread başına kalıcı (keep-alive) bağlantı."""
+
+    def __init__(self, url, timeout):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return conn
+
+    def get(self, path):
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            conn.request("GET", path)
+            resp = conn.getresponse()
+            return resp.status, json.loads(resp.read() or b"{}")
+        finally:
+            conn.close()
+
+    def chat(self, question):
+        """(hata türü ya da None, chat() sonucu)"""
+        body = json.dumps({"message": question}).encode("utf-8")
+        try:
+            conn = self._conn()
+            conn.request("POST", "/chat", body, {"Content-Type": "application/json"})
+            resp = conn.getresponse()
+            payload = resp.read()
+        except (socket.timeout, TimeoutError):  # 3.9'da socket.timeout ayrı sınıf
+            self._reset()
+            return "timeout", None
+        except (OSError, http.client.HTTPException):
+            self._reset()
+            return "connection", None
+        if resp.status != 200:
+            return f"http_{resp.status}", None
+        try:
+            out = json.loads(payload)
+        except ValueError:
+            return "bad_json", None
+        if not out.get("success"):
+            return "app_error", out
+        return None, out.get("data") or {}
+
+    def _reset(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is not None:
+            conn.close()
+        self.local.conn = None
+
+
+# =========================
+# Yük
+# =========================
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {name: [] for name in STAGES}
+        self.errors = {}
+        self.ok = 0
+        self.no_context = 0
+        self.paths = {}
+        self.first_error = None
+
+    def add(self, latency_s, error, data):
+        with self.lock:
+            if error:
+                self.errors[error] = self.errors.get(error, 0) + 1
+                if self.first_error is None and data:
+                    self.first_error = data.get("error")
+                return
+            self.ok += 1
+            client = latency_s * 1000
+            self.samples["client"].append(client)
+            t = data.get("timings") or {}
+            for name in ("embed", "faq", "retrieve", "llm"):
+                if f"{name}_ms" in t:
+                    self.samples[name].append(t[f"{name}_ms"])
+            if "total_ms" in t:
+                self.samples["server"].append(t["total_ms"])
+                self.samples["wait"].append(max(0.0, client - t["total_ms"]))
+            if not data.get("sources"):
+                self.no_context += 1
+            path = data.get("path", "?")
+            self.paths[path] = self.paths.get(path, 0) + 1
+
+
+def run_open_loop(client, mix, rec, rps, duration, n_requests, max_inflight, poisson, seed):
+    """Planlı gönderim: i. istek t0 + sum(aralık) anında; gecikme plandan ölçülür."""
+    rng = random.Random(seed)
+    total = n_requests or int(rps * duration)
+    pool = ThreadPoolExecutor(max_workers=max_inflight)
+
+    def one(scheduled, question):
+        error, data = client.chat(question)
+        rec.add(time.perf_counter() - scheduled, error, data)
+
+    t0 = time.perf_counter()
+    at = t0
+    for _ in range(total):
+        at += rng.expovariate(rps) if poisson else 1.0 / rps
+        delay = at - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        pool.submit(one, at, mix.next())
+    pool.shutdown(wait=True)
+    return time.perf_counter() - t0
+
+
+def run_closed_loop(client, mix, rec, concurrency, duration, n_requests):
+    """concurrency istemci, her biri cevabı alınca sıradaki soruyu yollar."""
+    remaining = [n_requests or float("inf")]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + (duration if not n_requests else float("inf"))
+
+    def worker():
+        while time.perf_counter() < deadline:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            t = time.perf_counter()
+            error, data = client.chat(mix.next())
+            rec.add(time.perf_counter() - t, error, data)
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    return time.perf_counter() - t0
+
+
+def percentiles(values):
+    if not values:
+        return None
+    p50, p90, p95, p99 = np.percentile(values, [50, 90, 95, 99])
+    return dict(p50_ms=round(float(p50), 1), p90_ms=round(float(p90), 1), p95_ms=round(float(p95), 1),
+                p99_ms=round(float(p99), 1), max_ms=round(float(max(values)), 1), samples=len(values))
+
+
+# =========================
+# Ortam (sahte Ollama + API)
+# =========================
+def start_api(url, ollama_host, wait_s):
+    env = dict(os.environ, OLLAMA_HOST=ollama_host) if ollama_host else dict(os.environ)
+    proc = subprocess.Popen([sys.executable, "chat_unified.py", "--api"], cwd=ROOT / "kb" / "ingest", env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    client = ChatClient(url, timeout=2)
+    deadline = time.time() + wait_s
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"API başlamadı:\n{proc.stderr.read().decode(errors='replace')[-2000:]}")
+        try:
+            if client.get("/health")[0] == 200:
+                return proc
+        except OSError:
+            pass
+        time.sleep(0.5)
+    proc.kill()
+    raise RuntimeError(f"API {wait_s}s içinde /health'e cevap vermedi")
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def gate(report, args):
+    """Eşik kontrolü; ihlal mesajlarını döndürür."""
+    failures = []
+    client = report["stages"].get("client") or {}
+    if args.max_error_rate is not None and report["error_rate"] > args.max_error_rate:
+        failures.append(f"hata oranı {report['error_rate']:.3f} > {args.max_error_rate}")
+    if args.max_p95_ms is not None and client.get("p95_ms", float("inf")) > args.max_p95_ms:
+        failures.append(f"client p95 {client.get('p95_ms')}ms > {args.max_p95_ms}ms")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            base = json.load(f)
+        print(f"\nΔ {args.baseline} ({base['meta'].get('commit')})")
+        for name, cur in report["stages"].items():
+            old = base["stages"].get(name)
+            if not (cur and old):
+                continue
+            ratio = cur["p95_ms"] / max(old["p95_ms"], 1e-9)
+            print(f"  {name:<9} p95 {old['p95_ms']:9.1f} -> {cur['p95_ms']:9.1f}ms  x{ratio:.2f}")
+            if args.max_regression and name == "client" and ratio > args.max_regression:
+                failures.append(f"client p95 x{ratio:.2f} > x{args.max_regression} (baseline)")
+        if args.max_regression and base["throughput_rps"] and \
+                report["throughput_rps"] < base["throughput_rps"] / args.max_regression:
+            failures.append(f"verim {report['throughput_rps']} < {base['throughput_rps']} / {args.max_regression}")
+    return failures
+
+
+def main():
+    ap = argparse.ArgumentParser(description="/chat yük testi")
+    ap.add_argument("--url", default="http://127.0.0.1:8000")
+    mode = ap.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--rps", type=float, help="açık döngü: saniyede istek")
+    mode.add_argument("--concurrency", type=int, help="kapalı döngü: eşzamanlı istemci")
+    ap.add_argument("--duration", type=float, default=30.0, help="süre (sn); --requests verilmezse")
+    ap.add_argument("--requests", type=int, help="toplam istek sayısı")
+    ap.add_argument("--warmup", type=int, default=3, help="ölçüm dışı ısınma isteği")
+    ap.add_argument("--poisson", action="store_true", help="açık döngüde üstel varış aralıkları")
+    ap.add_argument("--max-inflight", type=int, default=256, help="açık döngüde eşzamanlı istek üst sınırı")
+    ap.add_argument("--timeout", type=float, default=120.0, help="istek zaman aşımı (sn)")
+    ap.add_argument("--chunks", default=str(ROOT / "temiz_rag_chunks.jsonl"), help="soru üretimi için JSONL")
+    ap.add_argument("--questions", help="satır başına bir soru (karışımın yerine)")
+    ap.add_argument("--fake-ollama", type=int, metavar="PORT", help="bu portta sahte Ollama başlat")
+    ap.add_argument("--start-api", action="store_true", help="chat_unified --api'yi alt süreçte başlat")
+    ap.add_argument("--api-wait", type=float, default=180.0, help="API'nin açılmasını bekleme süresi (sn)")
+    ap.add_argument("--json", help="sonuçları bu dosyaya yaz")
+    ap.add_argument("--baseline", help="önceki --json çıktısı; p95 ve verim karşılaştırılır")
+    ap.add_argument("--max-error-rate", type=float)
+    ap.add_argument("--max-p95-ms", type=float)
+    ap.add_argument("--max-regression", type=float, help="baseline'a göre izin verilen p95/verim oranı")
+    fake_args = ap.add_argument_group("sahte Ollama (--seed soru karışımı için de kullanılır)")
+    fake_ollama.add_arguments(fake_args)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    if args.questions:
+        with open(args.questions, encoding="utf-8") as f:
+            pool = [q.strip() for q in f if q.strip()]
+    else:
+        pool = question_pool(args.chunks, rng)
+    mix = QuestionMix(pool, seed=args.seed)
+
+    fake, server, api = None, None, None
+    ollama_host = None
+    if args.fake_ollama:
+        fake = fake_ollama.from_args(args)
+        server = fake_ollama.serve(fake, "127.0.0.1", args.fake_ollama)
+        ollama_host = f"http://127.0.0.1:{args.fake_ollama}"
+        print(f"ℹ️  sahte Ollama: {ollama_host}")
+    try:
+        if args.start_api:
+            print("ℹ️  chat_unified --api başlatılıyor...")
+            api = start_api(args.url, ollama_host, args.api_wait)
+
+        client = ChatClient(args.url, args.timeout)
+        for _ in range(args.warmup):
+            client.chat(mix.next())
+        stats_before = dict(fake.stats) if fake else None
+
+        rec = Recorder()
+        print(f"ℹ️  {len(pool)} soruluk havuz, "
+              + (f"{args.rps:g} rps" if args.rps else f"{args.concurrency} eşzamanlı istemci"))
+        if args.rps:
+            wall = run_open_loop(client, mix, rec, args.rps, args.duration, args.requests,
+                                 args.max_inflight, args.poisson, args.seed)
+        else:
+            wall = run_closed_loop(client, mix, rec, args.concurrency, args.duration, args.requests)
+        stats_after = dict(fake.stats) if fake else None
+    finally:
+        if api is not None:
+            api.terminate()
+            api.wait(timeout=10)
+        if server is not None:
+            server.shutdown()
+
+    n_errors = sum(rec.errors.values())
+    total = rec.ok + n_errors
+    report = dict(
+        meta=dict(date=datetime.now().isoformat(timespec="seconds"), commit=git_commit(), url=args.url,
+                  mode="open" if args.rps else "closed", rps=args.rps, concurrency=args.concurrency,
+                  questions=len(pool), seed=args.seed, fake_ollama=bool(fake)),
+        requests=total,
+        ok=rec.ok,
+        wall_s=round(wall, 2),
+        throughput_rps=round(rec.ok / wall, 3) if wall else 0.0,
+        error_rate=round(n_errors / total, 4) if total else 0.0,
+        errors=rec.errors,
+        no_context_rate=round(rec.no_context / rec.ok, 4) if rec.ok else 0.0,
+        paths={k: round(v / rec.ok, 4) for k, v in sorted(rec.paths.items())} if rec.ok else {},
+        stages={name: percentiles(rec.samples[name]) for name in STAGES},
+    )
+    if fake:
+        report["ollama"] = {k: round(stats_after[k] - stats_before[k], 3) for k in stats_after}
+
+    print(f"\n✅ {total} istek, {wall:.1f}s: {report['throughput_rps']} rps, hata oranı {report['error_rate']:.3f} "
+          f"{rec.errors or ''}")
+    if report["paths"]:
+        print("   yol      " + ", ".join(f"{k} %{v * 100:.1f}" for k, v in report["paths"].items()))
+    if rec.first_error:
+        print(f"   ilk uygulama hatası: {rec.first_error}")
+    for name, p in report["stages"].items():
+        if p:
+            print(f"   {name:<9} p50 {p['p50_ms']:9.1f}  p90 {p['p90_ms']:9.1f}  p95 {p['p95_ms']:9.1f}  "
+                  f"p99 {p['p99_ms']:9.1f}  max {p['max_ms']:9.1f}ms")
+    if fake:
+        o = report["ollama"]
+        print(f"   ollama    {o['requests']:.0f} istek, prompt {o['prompt_tokens']:.0f} tok "
+              f"(önbellek {o['cached_tokens']:.0f}), üretim {o['eval_tokens']:.0f} tok, "
+              f"yükleme {o['loads']:.0f}, sıra {o['queue_wait_s']:.1f}s")
+
+    failures = gate(report, args)
+    if args.json:
+        report["gate"] = failures
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"✅ {args.json}")
+    if failures:
+        for msg in failures:
+            print(f"❌ {msg}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-import ollama
+import llm_backend
 from sentence_transformers import SentenceTransformer
 import psycopg2
 from typing import List, Dict
@@ -83,9 +83,8 @@ Kullanıcının sorusu: {user_question}
 
 Cevap:"""
 
-    # 4. Ollama ile cevap oluştur
-    response = ollama.chat(
-        model='llama3.2:1b',
+    # 4. LLM ile cevap oluştur (llm_backend: uç seçimi, zaman aşımı, yedek uca geçiş)
+    response = llm_backend.chat(
         messages=[{
             'role': 'user',
             'content': prompt
@@ -1,12 +1,26 @@
-import ollama
+import os
+import re
+import json
+import time
+import threading
+import llm_backend
+import hashlib
+import tempfile
+from pathlib import Path
 from sentence_transformers import SentenceTransformer
 import psycopg2
-from typing import List, Dict
-from fastapi import FastAPI
+from typing import List, Dict, Optional
+from fastapi import FastAPI, File, Request, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from datetime import datetime
 
+import jobs
+from prompts import LLM_OPTIONS, build_messages, extractive_answer
+from faq_index import DOCUMENT_MD5_SQL, TRAINING_MD5_SQL
+from singleflight import SingleFlight
+
 app = FastAPI(title="Troy KB Chatbot API")
 
 # CORS ayarı
@@ -26,24 +40,56 @@ DB_CONFIG = {
     "password": "troy1234"
 }
 
+# PDF yüklemeleri kb_worker ile paylaşılan klasöre yazılır
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", str(Path(__file__).resolve().parent.parent / "data" / "uploads"))
+MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "50"))
+
+# Hızlı yol: en iyi eşleşme adımlı bir eğitim içeriğiyse ve açık farkla öndeyse
+# cevap LLM'siz, içeriğin kendisinden kurulur
+FAST_PATH = os.getenv("FAST_PATH", "1") == "1"
+FAST_PATH_MIN_SIMILARITY = float(os.getenv("FAST_PATH_MIN_SIMILARITY", "0.92"))
+FAST_PATH_MARGIN = float(os.getenv("FAST_PATH_MARGIN", "0.03"))     # ikinci kaynağa göre fark
+
+# Sentetik soru index'i (kb/ingest/faq_index.py): soruya yeterince yakın önceden
+# üretilmiş bir soru varsa kayıtlı cevabı dön, retrieval ve LLM atlanır
+FAQ_INDEX = os.getenv("FAQ_INDEX", "1") == "1"
+FAQ_MIN_SIMILARITY = float(os.getenv("FAQ_MIN_SIMILARITY", "0.94"))
+FAQ_CANDIDATES = int(os.getenv("FAQ_CANDIDATES", "5"))           # kaynağı güncel olan ilk aday seçilir
+FAQ_RECHECK_SECONDS = float(os.getenv("FAQ_RECHECK_SECONDS", "300"))  # tablo yoksa tekrar bakma aralığı
+
+# Aynı soru + aynı bağlamla eşzamanlı gelen istekler tek LLM üretimini paylaşır
+chat_flight = SingleFlight()
+# path: cevabı veren yol (faq | llm | coalesced | fast_path | no_context)
+METRICS = {"requests": 0, "stream_requests": 0, "llm_calls": 0, "coalesced": 0,
+           "fast_path": 0, "faq": 0, "no_context": 0}
+_metrics_lock = threading.Lock()
+
+def count(name: str, n: int = 1):
+    with _metrics_lock:
+        METRICS[name] += n
+
+# kb/bench/bench_retrieval.py aynı sorguyu ölçer: parametreler (vektör, vektör, vektör, top_k)
+RAG_DOCUMENTS_SQL = """
+    SELECT 
+        file_name,
+        section_title,
+        content,
+        page_start,
+        1 - (embedding <=> %s::vector) as similarity,
+        'document' as source_type,
+        chunk_id
+    FROM rag_documents
+    WHERE 1 - (embedding <=> %s::vector) > 0.65
+    ORDER BY embedding <=> %s::vector
+    LIMIT %s
+"""
+
 def retrieve_from_rag_documents(query_embedding: List[float], top_k: int = 2) -> List[Dict]:
     """RAG documents tablosundan arama"""
     conn = psycopg2.connect(**DB_CONFIG)
     cursor = conn.cursor()
     
-    cursor.execute("""
-        SELECT 
-            file_name,
-            section_title,
-            content,
-            page_start,
-            1 - (embedding <=> %s::vector) as similarity,
-            'document' as source_type
-        FROM rag_documents
-        WHERE 1 - (embedding <=> %s::vector) > 0.65
-        ORDER BY embedding <=> %s::vector
-        LIMIT %s
-    """, (query_embedding, query_embedding, query_embedding, top_k))
+    cursor.execute(RAG_DOCUMENTS_SQL, (query_embedding, query_embedding, query_embedding, top_k))
     
     results = cursor.fetchall()
     cursor.close()
@@ -56,7 +102,8 @@ def retrieve_from_rag_documents(query_embedding: List[float], top_k: int = 2) ->
             "content": r[2],
             "page": r[3],
             "similarity": round(r[4], 3),
-            "file": r[0]
+            "file": r[0],
+            "chunk_id": r[6]
         }
         for r in results
     ]
@@ -73,7 +120,8 @@ def retrieve_from_training(query_embedding: List[float], top_k: int = 2) -> List
             tc.step_by_step,
             tc.tags,
             1 - (te.embedding <=> %s::vector) as similarity,
-            'training' as source_type
+            'training' as source_type,
+            tc.id
         FROM training_content tc
         JOIN training_embeddings te ON tc.id = te.training_id
         WHERE 1 - (te.embedding <=> %s::vector) > 0.65
@@ -93,18 +141,96 @@ def retrieve_from_training(query_embedding: List[float], top_k: int = 2) -> List
             "content": r[1],
             "steps": r[2] or [],
             "tags": r[3] or [],
-            "similarity": round(r[4], 3)
+            "similarity": round(r[4], 3),
+            "id": r[6]
         }
         for r in results
     ]
 
-def retrieve_unified_context(query: str, top_k: int = 5) -> List[Dict]:
-    """Her iki kaynaktan da arama yap ve birleştir"""
+# En yakın adaylardan kaynağı hâlâ aynı olan (eğitim içeriği aktif) ilki; kaynak
+# değiştiyse faq_index.py yeniden üretene kadar eski cevap dönmez
+FAQ_SQL = f"""
+    SELECT f.question, f.answer, f.sources, f.similarity
+    FROM (
+        SELECT question, answer, sources, chunk_id, training_id, source_md5,
+               1 - (embedding <=> %s::vector) as similarity
+        FROM faq_questions
+        ORDER BY embedding <=> %s::vector
+        LIMIT %s
+    ) f
+    LEFT JOIN rag_documents rd ON rd.chunk_id = f.chunk_id
+    LEFT JOIN training_content tc ON tc.id = f.training_id
+    WHERE f.source_md5 = CASE
+        WHEN f.chunk_id IS NOT NULL THEN {DOCUMENT_MD5_SQL}
+        WHEN tc.status = 'active' THEN {TRAINING_MD5_SQL}
+    END
+    ORDER BY f.similarity DESC
+    LIMIT 1
+"""
+
+_faq_ready = None
+_faq_checked_at = 0.0
+
+def lookup_faq(query_embedding: List[float], timings: Dict = None) -> Optional[Dict]:
+    """En yakın sentetik soru eşikteyse kayıtlı cevap (timings: faq_ms yazılır)"""
+    global _faq_ready, _faq_checked_at
+    if not FAQ_INDEX:
+        return None
+    # Tablo yoksa (faq_index.py henüz çalışmamış) FAQ_RECHECK_SECONDS boyunca bakılmaz
+    if _faq_ready is False and time.monotonic() - _faq_checked_at < FAQ_RECHECK_SECONDS:
+        return None
+    t0 = time.perf_counter()
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        cursor = conn.cursor()
+        if not _faq_ready:
+            cursor.execute("SELECT to_regclass('public.faq_questions') IS NOT NULL")
+            _faq_ready, _faq_checked_at = cursor.fetchone()[0], time.monotonic()
+            if not _faq_ready:
+                return None
+        try:
+            cursor.execute(FAQ_SQL, (query_embedding, query_embedding, FAQ_CANDIDATES))
+        except psycopg2.Error as e:
+            # Eski şema (source_md5 yok) ya da tablo silinmiş: sohbet FAQ'sız sürer
+            print(f"⚠️  FAQ index sorgusu başarısız, {FAQ_RECHECK_SECONDS:.0f}s atlanıyor: {e}")
+            _faq_ready, _faq_checked_at = False, time.monotonic()
+            return None
+        row = cursor.fetchone()
+        cursor.close()
+    finally:
+        conn.close()
+        if timings is not None:
+            timings["faq_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+    if not row or row[3] < FAQ_MIN_SIMILARITY:
+        return None
+    similarity = round(row[3], 3)
+    return {
+        "question": row[0],
+        "answer": row[1],
+        "sources": [{**src, "similarity": similarity} for src in row[2]],
+        "similarity": similarity
+    }
+
+def embed_query(query: str, timings: Dict = None) -> List[float]:
+    t0 = time.perf_counter()
     query_embedding = model.encode(query).tolist()
+    if timings is not None:
+        timings["embed_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    return query_embedding
+
+def retrieve_unified_context(query: str, top_k: int = 5, timings: Dict = None,
+                             query_embedding: List[float] = None) -> List[Dict]:
+    """Her iki kaynaktan da arama yap ve birleştir (timings: embed_ms/retrieve_ms yazılır)"""
+    if query_embedding is None:
+        query_embedding = embed_query(query, timings)
+    t1 = time.perf_counter()
     
     # Her iki kaynaktan da ara
     doc_results = retrieve_from_rag_documents(query_embedding, top_k=3)
     training_results = retrieve_from_training(query_embedding, top_k=3)
+    if timings is not None:
+        timings["retrieve_ms"] = round((time.perf_counter() - t1) * 1000, 1)
     
     # Birleştir ve similarity'ye göre sırala
     all_results = doc_results + training_results
@@ -112,93 +238,192 @@ def retrieve_unified_context(query: str, top_k: int = 5) -> List[Dict]:
     
     return all_results[:top_k]
 
-def format_context(contexts: List[Dict]) -> str:
-    """Context'leri prompt için formatla"""
-    context_text = ""
-    
-    for i, ctx in enumerate(contexts, 1):
-        if ctx['type'] == 'document':
-            context_text += f"\n[Kaynak {i}: Döküman - {ctx['title']}, Sayfa {ctx.get('page', 'N/A')}]\n"
-            context_text += f"{ctx['content'][:800]}\n"
-        
-        elif ctx['type'] == 'training':
-            context_text += f"\n[Kaynak {i}: Eğitim İçeriği - {ctx['title']}]\n"
-            context_text += f"{ctx['content'][:800]}\n"
-            
-            if ctx.get('steps'):
-                context_text += "Adımlar:\n"
-                for j, step in enumerate(ctx['steps'][:5], 1):
-                    context_text += f"  {j}. {step}\n"
-    
-    return context_text
+def normalize_question(question: str) -> str:
+    """Birleştirme anahtarı için: Türkçe küçük harf, tek boşluk, sondaki noktalama atılır"""
+    q = question.replace("I", "ı").replace("İ", "i").lower()
+    return re.sub(r"\s+", " ", q).strip().rstrip("?!. ")
+
+def context_key(user_question: str, contexts: List[Dict]) -> str:
+    """Normalize soru + sıralı bağlam kimlikleri; aynı anahtar = aynı prompt"""
+    ids = [f"d:{c['chunk_id']}" if c['type'] == 'document' else f"t:{c['id']}" for c in contexts]
+    raw = normalize_question(user_question) + "\n" + ",".join(ids)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def build_sources(contexts: List[Dict]) -> List[Dict]:
+    return [
+        {
+            "type": ctx['type'],
+            "title": ctx['title'],
+            "similarity": ctx['similarity'],
+            "page": ctx.get('page'),
+            "tags": ctx.get('tags')
+        }
+        for ctx in contexts
+    ]
+
+def source_count(sources: List[Dict]) -> Dict:
+    return {
+        "documents": len([s for s in sources if s['type'] == 'document']),
+        "training": len([s for s in sources if s['type'] == 'training'])
+    }
+
+NO_CONTEXT_ANSWER = "Bu konuda dökümanlarımda ve eğitim içeriklerinde bilgi bulamadım."
+
+def fast_path_hit(contexts: List[Dict]):
+    """Hızlı yol koşullarını sağlayan eğitim içeriği (yoksa None)"""
+    if not FAST_PATH or not contexts:
+        return None
+    top = contexts[0]
+    if top['type'] != 'training' or not top.get('steps'):
+        return None
+    if top['similarity'] < FAST_PATH_MIN_SIMILARITY:
+        return None
+    if len(contexts) > 1 and top['similarity'] - contexts[1]['similarity'] < FAST_PATH_MARGIN:
+        return None
+    return top
+
+def generate(messages: List[Dict]) -> Dict:
+    count("llm_calls")
+    return llm_backend.chat(messages=messages, options=LLM_OPTIONS)
 
 def chat(user_question: str) -> Dict:
     """Birleşik RAG chatbot"""
     
+    # Aşama süreleri (ms) cevapla döner; kb/bench/load_chat.py yüzdelikleri buradan hesaplar
+    t_start = time.perf_counter()
+    timings = {}
+    count("requests")
+    
+    # 0. Önceden üretilmiş sorulardan biri yeterince yakınsa kayıtlı cevap
+    query_embedding = embed_query(user_question, timings)
+    faq = lookup_faq(query_embedding, timings)
+    if faq:
+        count("faq")
+        return {
+            "answer": faq["answer"],
+            "sources": faq["sources"],
+            "source_count": source_count(faq["sources"]),
+            "path": "faq",
+            "faq": {"question": faq["question"], "similarity": faq["similarity"]},
+            "coalesced": False,
+            "timings": {**timings, "total_ms": round((time.perf_counter() - t_start) * 1000, 1)}
+        }
+    
     # 1. Her iki kaynaktan da ilgili içerikleri bul
-    contexts = retrieve_unified_context(user_question, top_k=5)
+    contexts = retrieve_unified_context(user_question, top_k=5, timings=timings,
+                                        query_embedding=query_embedding)
     
     if not contexts:
+        count("no_context")
+        timings["total_ms"] = round((time.perf_counter() - t_start) * 1000, 1)
         return {
-            "answer": "Bu konuda dökümanlarımda ve eğitim içeriklerinde bilgi bulamadım.",
-            "sources": []
+            "answer": NO_CONTEXT_ANSWER,
+            "sources": [],
+            "source_count": source_count([]),
+            "path": "no_context",
+            "coalesced": False,
+            "timings": timings
         }
     
-    # 2. Context'i hazırla
-    context_text = format_context(contexts)
+    # 1b. Hızlı yol: LLM yalnızca adımları tekrar edecekse doğrudan içerikten cevapla
+    hit = fast_path_hit(contexts)
+    if hit:
+        count("fast_path")
+        sources = build_sources([hit])
+        return {
+            "answer": extractive_answer(hit),
+            "sources": sources,
+            "source_count": source_count(sources),
+            "path": "fast_path",
+            "coalesced": False,
+            "timings": {**timings, "total_ms": round((time.perf_counter() - t_start) * 1000, 1)}
+        }
     
-    # 3. Prompt oluştur
-    prompt = f"""Sen Troy ekranının iç süreçleri hakkında yardımcı bir asistansın.
-
-Aşağıdaki bilgileri kullanarak kullanıcının sorusunu cevapla:
+    # 2-3. Sabit system mesajı + bağlam/soru (Ollama önek önbelleği için, bkz. prompts.py)
+    messages = build_messages(user_question, contexts)
 
-{context_text}
-
-Kurallar:
-- SADECE verilen bilgileri kullan
-- Bilmediğin şeyleri uydurma
-- Cevabında hangi kaynağı kullandığını belirt (Kaynak 1, Kaynak 2, vb.)
-- Eğer "Eğitim İçeriği" kaynağından adım adım bilgi varsa, bunları sıralı şekilde yaz
-- Türkçe ve net bir dille cevapla
-- Eğer bilgi yoksa, bunu açıkça söyle
-
-Kullanıcının sorusu: {user_question}
-
-Cevap:"""
-
-    # 4. Ollama ile cevap oluştur
-    response = ollama.chat(
-        model='llama3.2:1b',
-        messages=[{'role': 'user', 'content': prompt}],
-        options={
-            'temperature': 0.3,
-            'num_predict': 512
-        }
-    )
+    # 4. LLM ile cevap oluştur (llm_backend: uç seçimi, zaman aşımı, yedek uca geçiş).
+    # Aynı anahtarla uçuşta bir üretim varsa yenisi başlatılmaz, onun sonucu beklenir;
+    # takipçide llm_ms bekleme süresidir.
+    t_llm = time.perf_counter()
+    response, coalesced = chat_flight.do(context_key(user_question, contexts), lambda: generate(messages))
+    if coalesced:
+        count("coalesced")
     
     answer = response['message']['content']
+    timings["llm_ms"] = round((time.perf_counter() - t_llm) * 1000, 1)
     
     # 5. Kaynakları ekle
-    sources = [
-        {
-            "type": ctx['type'],
-            "title": ctx['title'],
-            "similarity": ctx['similarity'],
-            "page": ctx.get('page'),
-            "tags": ctx.get('tags')
-        }
-        for ctx in contexts
-    ]
+    sources = build_sources(contexts)
     
     return {
         "answer": answer,
         "sources": sources,
-        "source_count": {
-            "documents": len([s for s in sources if s['type'] == 'document']),
-            "training": len([s for s in sources if s['type'] == 'training'])
-        }
+        "source_count": source_count(sources),
+        "path": "coalesced" if coalesced else "llm",
+        "coalesced": coalesced,
+        "timings": {**timings, "total_ms": round((time.perf_counter() - t_start) * 1000, 1)}
     }
 
+def chat_stream(user_question: str):
+    """chat() ile aynı akış, cevap parça parça: sources, token..., done olayları.
+    Aynı anahtarlı uçuştaki akışa bağlanan takipçi, token'ları baştan aynı sırayla alır."""
+    t_start = time.perf_counter()
+    timings = {}
+    count("stream_requests")
+
+    query_embedding = embed_query(user_question, timings)
+    faq = lookup_faq(query_embedding, timings)
+    if faq:
+        count("faq")
+        yield {"type": "sources", "sources": faq["sources"], "source_count": source_count(faq["sources"])}
+        yield {"type": "token", "content": faq["answer"]}
+        timings["total_ms"] = round((time.perf_counter() - t_start) * 1000, 1)
+        yield {"type": "done", "answer": faq["answer"], "path": "faq",
+               "faq": {"question": faq["question"], "similarity": faq["similarity"]},
+               "coalesced": False, "timings": timings}
+        return
+
+    contexts = retrieve_unified_context(user_question, top_k=5, timings=timings,
+                                        query_embedding=query_embedding)
+    hit = fast_path_hit(contexts)
+    sources = build_sources([hit] if hit else contexts)
+    yield {"type": "sources", "sources": sources, "source_count": source_count(sources)}
+
+    if not contexts or hit:
+        path = "fast_path" if hit else "no_context"
+        count(path)
+        answer = extractive_answer(hit) if hit else NO_CONTEXT_ANSWER
+        yield {"type": "token", "content": answer}
+        timings["total_ms"] = round((time.perf_counter() - t_start) * 1000, 1)
+        yield {"type": "done", "answer": answer, "path": path, "coalesced": False, "timings": timings}
+        return
+
+    messages = build_messages(user_question, contexts)
+
+    def start():
+        count("llm_calls")
+        return llm_backend.stream(messages=messages, options=LLM_OPTIONS)
+
+    t_llm = time.perf_counter()
+    parts, coalesced = chat_flight.stream(context_key(user_question, contexts), start)
+    if coalesced:
+        count("coalesced")
+
+    answer = []
+    for part in parts:
+        piece = part.get('message', {}).get('content', '')
+        if piece:
+            if not answer:
+                timings["first_token_ms"] = round((time.perf_counter() - t_llm) * 1000, 1)
+            answer.append(piece)
+            yield {"type": "token", "content": piece}
+
+    timings["llm_ms"] = round((time.perf_counter() - t_llm) * 1000, 1)
+    timings["total_ms"] = round((time.perf_counter() - t_start) * 1000, 1)
+    yield {"type": "done", "answer": "".join(answer), "path": "coalesced" if coalesced else "llm",
+           "coalesced": coalesced, "timings": timings}
+
 # FastAPI Endpoints
 class ChatRequest(BaseModel):
     message: str
@@ -215,69 +440,132 @@ class TrainingContentCreate(BaseModel):
     steps: List[str]
     tags: List[str]
 
+@app.on_event("startup")
+def ensure_job_queue():
+    conn = psycopg2.connect(**DB_CONFIG)
+    with conn.cursor() as cursor:
+        jobs.ensure_schema(cursor)
+    conn.commit()
+    conn.close()
+
+def enqueue_job(kind: str, payload: Dict) -> int:
+    conn = psycopg2.connect(**DB_CONFIG)
+    try:
+        with conn.cursor() as cursor:
+            job_id = jobs.enqueue(cursor, kind, payload)
+        conn.commit()
+    finally:
+        conn.close()
+    return job_id
+
 @app.post("/admin/upload-document")
 async def upload_document(doc: DocumentUpload):
-    """Admin: Yeni döküman ekle"""
+    """Admin: Yeni döküman ekle (embedding kb_worker'da üretilir)"""
     try:
-        # Embedding oluştur
-        embedding = model.encode(doc.content).tolist()
-        
-        conn = psycopg2.connect(**DB_CONFIG)
-        cursor = conn.cursor()
-        
         # Chunk ID oluştur
-        import hashlib
         chunk_id = hashlib.md5(f"{doc.title}{datetime.now()}".encode()).hexdigest()[:16]
-        
-        cursor.execute("""
-            INSERT INTO rag_documents 
-            (chunk_id, file_name, section_title, content, embedding, page_start)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """, (chunk_id, doc.category, doc.title, doc.content, embedding, 1))
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
-        return {"success": True, "chunk_id": chunk_id}
+        job_id = enqueue_job("upload_document", {
+            "chunk_id": chunk_id,
+            "title": doc.title,
+            "content": doc.content,
+            "category": doc.category,
+            "tags": doc.tags,
+        })
+        return {"success": True, "job_id": job_id, "chunk_id": chunk_id, "status": "queued"}
     except Exception as e:
         return {"success": False, "error": str(e)}
 
 @app.post("/admin/create-training")
 async def create_training(training: TrainingContentCreate):
-    """Admin: Yeni eğitim içeriği ekle"""
+    """Admin: Yeni eğitim içeriği ekle (embedding kb_worker'da üretilir)"""
     try:
-        # Embedding için text birleştir
-        full_text = f"{training.title}\n{training.description}\n" + "\n".join(training.steps)
-        embedding = model.encode(full_text).tolist()
-        
-        conn = psycopg2.connect(**DB_CONFIG)
-        cursor = conn.cursor()
-        
-        # Training content ekle
-        cursor.execute("""
-            INSERT INTO training_content 
-            (title, description, step_by_step, tags, status, created_at)
-            VALUES (%s, %s, %s, %s, 'active', NOW())
-            RETURNING id
-        """, (training.title, training.description, training.steps, training.tags))
-        
-        training_id = cursor.fetchone()[0]
-        
-        # Embedding ekle
-        cursor.execute("""
-            INSERT INTO training_embeddings (training_id, embedding)
-            VALUES (%s, %s)
-        """, (training_id, embedding))
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
-        return {"success": True, "training_id": training_id}
+        job_id = enqueue_job("create_training", {
+            "title": training.title,
+            "description": training.description,
+            "steps": training.steps,
+            "tags": training.tags,
+        })
+        return {"success": True, "job_id": job_id, "status": "queued"}
     except Exception as e:
         return {"success": False, "error": str(e)}
 
+# UploadFile gövdesi handler çalışmadan önce tamamen diske spool edilir; sınır
+# gövde okunmadan Content-Length ile uygulanır (multipart zarfı için 64KB pay).
+# Content-Length'siz (chunked) yüklemelerde yalnızca upload_pdf içindeki kontrol kalır.
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    if request.url.path == "/admin/upload-pdf":
+        length = request.headers.get("content-length", "")
+        if length.isdigit() and int(length) > (MAX_UPLOAD_MB << 20) + (64 << 10):
+            return JSONResponse({"success": False, "error": f"dosya {MAX_UPLOAD_MB}MB sınırını aşıyor"},
+                                status_code=413)
+    return await call_next(request)
+
+class UploadTooLarge(ValueError):
+    pass
+
+@app.post("/admin/upload-pdf")
+async def upload_pdf(file: UploadFile = File(...)):
+    """Admin: PDF kılavuz yükle (diske parça parça yazılır, kb_worker işler)"""
+    file_name = os.path.basename(file.filename or "")
+    if not file_name.lower().endswith(".pdf"):
+        await file.close()
+        return JSONResponse({"success": False, "error": "yalnızca .pdf kabul edilir"}, status_code=400)
+
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=UPLOAD_DIR, suffix=".part")
+    digest, size = hashlib.sha256(), 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await file.read(1 << 20)
+                if not chunk:
+                    break
+                if size == 0 and not chunk.startswith(b"%PDF-"):
+                    raise ValueError("dosya PDF değil")
+                size += len(chunk)
+                if size > MAX_UPLOAD_MB << 20:
+                    raise UploadTooLarge(f"dosya {MAX_UPLOAD_MB}MB sınırını aşıyor")
+                digest.update(chunk)
+                out.write(chunk)
+        if size == 0:
+            raise ValueError("dosya boş")
+
+        sha = digest.hexdigest()
+        stored_name = f"{sha[:16]}_{file_name}"
+        os.replace(tmp_path, os.path.join(UPLOAD_DIR, stored_name))
+        job_id = enqueue_job("upload_pdf", {
+            "file_name": file_name,
+            "stored_name": stored_name,
+            "sha256": sha,
+            "size": size,
+        })
+        return {"success": True, "job_id": job_id, "file_name": file_name, "size": size, "status": "queued"}
+    except ValueError as e:
+        # reddedilen yükleme istemci hatası: 413 boyut, 400 geçersiz dosya
+        return JSONResponse({"success": False, "error": str(e)},
+                            status_code=413 if isinstance(e, UploadTooLarge) else 400)
+    except Exception as e:
+        return JSONResponse({"success": False, "error": str(e)}, status_code=500)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        await file.close()
+
+@app.get("/admin/jobs/{job_id}")
+async def get_job_status(job_id: int):
+    """Admin: Arka plan işinin durumu (queued/running/done/dead)"""
+    conn = psycopg2.connect(**DB_CONFIG)
+    cursor = conn.cursor()
+    job = jobs.get_job(cursor, job_id)
+    cursor.close(); conn.close()
+
+    if not job:
+        return {"success": False, "error": "not found"}
+
+    job.pop("payload")
+    return {"success": True, **job}
+
 @app.get("/admin/list-documents")
 async def list_documents(skip: int = 0, limit: int = 20):
     """Admin: Döküman listesi"""
@@ -311,29 +599,35 @@ async def list_documents(skip: int = 0, limit: int = 20):
 
 @app.get("/admin/document/{chunk_id}")
 async def get_document(chunk_id: str):
-    """Admin: Tek döküman getir"""
+    """Admin: Tek döküman getir (yükleme id'si verilirse tüm parçalarıyla)"""
     conn = psycopg2.connect(**DB_CONFIG)
     cursor = conn.cursor()
 
+    # PDF yüklemeleri {chunk_id}-000, -001 ... olarak saklanır; delete_document ile aynı eşleşme
     cursor.execute("""
         SELECT chunk_id, file_name, section_title, content, created_at
         FROM rag_documents
-        WHERE chunk_id = %s
-    """, (chunk_id,))
+        WHERE chunk_id = %(id)s OR left(chunk_id, char_length(%(prefix)s)) = %(prefix)s
+        ORDER BY chunk_id
+    """, {"id": chunk_id, "prefix": chunk_id + "-"})
 
-    row = cursor.fetchone()
+    rows = cursor.fetchall()
     cursor.close(); conn.close()
 
-    if not row:
+    if not rows:
         return {"success": False, "error": "not found"}
 
     return {
         "success": True,
-        "id": row[0],
-        "category": row[1],
-        "title": row[2],
-        "content": row[3],
-        "created_at": row[4].isoformat()
+        "id": chunk_id,
+        "category": rows[0][1],
+        "title": rows[0][2],
+        "content": "\n\n".join(r[3] for r in rows),
+        "created_at": rows[0][4].isoformat(),
+        "chunks": [
+            {"id": r[0], "title": r[2], "content": r[3]}
+            for r in rows
+        ]
     }
 
 @app.delete("/admin/document/{chunk_id}")
@@ -342,7 +636,11 @@ async def delete_document(chunk_id: str):
     conn = psycopg2.connect(**DB_CONFIG)
     cursor = conn.cursor()
     
-    cursor.execute("DELETE FROM rag_documents WHERE chunk_id = %s", (chunk_id,))
+    # Yükleme id'si verilirse o yüklemenin tüm parçaları silinir
+    # LIKE değil: id'deki % / _ joker olarak yorumlanıp başka kayıtları silmesin
+    cursor.execute("DELETE FROM rag_documents WHERE chunk_id = %(id)s "
+                   "OR left(chunk_id, char_length(%(prefix)s)) = %(prefix)s",
+                   {"id": chunk_id, "prefix": chunk_id + "-"})
     conn.commit()
     
     deleted = cursor.rowcount > 0
@@ -351,8 +649,10 @@ async def delete_document(chunk_id: str):
     
     return {"success": deleted}
  
+# async değil: chat() bloklayan çağrılar yapar; FastAPI sync uçları thread havuzunda
+# çalıştırır, böylece eşzamanlı istekler birbirini bekletmez (ve birleştirilebilir)
 @app.post("/chat")
-async def chat_endpoint(request: ChatRequest):
+def chat_endpoint(request: ChatRequest):
     """Chatbot endpoint"""
     try:
         result = chat(request.message)
@@ -366,10 +666,31 @@ async def chat_endpoint(request: ChatRequest):
             "error": str(e)
         }
 
+@app.post("/chat/stream")
+def chat_stream_endpoint(request: ChatRequest):
+    """Akışlı chatbot: satır başına bir JSON olay (NDJSON)"""
+    def events():
+        try:
+            for event in chat_stream(request.message):
+                yield json.dumps(event, ensure_ascii=False) + "\n"
+        except Exception as e:
+            yield json.dumps({"type": "error", "error": str(e)}, ensure_ascii=False) + "\n"
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@app.get("/metrics")
+async def get_metrics():
+    """İstek/LLM çağrısı sayaçları, hızlı yol / FAQ oranı ve birleştirme istatistikleri"""
+    with _metrics_lock:
+        metrics = dict(METRICS)
+    total = metrics["requests"] + metrics["stream_requests"]
+    metrics["fast_path_rate"] = round(metrics["fast_path"] / total, 4) if total else 0.0
+    metrics["faq_rate"] = round(metrics["faq"] / total, 4) if total else 0.0
+    return {**metrics, "coalescing": chat_flight.stats()}
+
 @app.get("/health")
 async def health_check():
     """Sağlık kontrolü"""
-    return {"status": "ok", "model": "llama3.2:1b"}
+    return {"status": "ok", "model": llm_backend.MODEL, "backends": llm_backend.get_pool().stats()}
 
 @app.get("/stats")
 async def get_stats():
@@ -414,7 +735,7 @@ def interactive_chat():
         print("\n🤔 Düşünüyorum...\n")
         result = chat(question)
         
-        print(f"✨ Cevap:\n{result['answer']}\n")
+        print(f"✨ Cevap ({result['path']}):\n{result['answer']}\n")
         print(f"📚 Kaynaklar ({result['source_count']}):")
         for i, src in enumerate(result['sources'], 1):
             type_icon = "📄" if src['type'] == 'document' else "🎓"
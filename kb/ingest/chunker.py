@@ -0,0 +1,147 @@
+# kb/ingest/chunker.py
+"""
+Fast tokenizer + offset mapping ile token tabanlı chunker.
+
+Sayfa metni tek seferde tokenize edilir; cümle/paragraf sınırlarının token
+sayıları offset'ler üzerinden bisect ile bulunur. Overlap ve uzun cümle
+bölme aynı sayıları kullanır, tokenizer tekrar çağrılmaz.
+"""
+import re
+from bisect import bisect_left
+from typing import List, Tuple
+
+SENT_SPLIT = re.compile(r'(?<=[.!?])\s+')
+PARA_SPLIT = re.compile(r'\n{2,}')
+
+
+class PageTokens:
+    """Bir sayfanın token offset'leri; karakter aralığı -> token sayısı."""
+
+    def __init__(self, tokenizer, text: str):
+        if not getattr(tokenizer, "is_fast", False):
+            raise ValueError("offset mapping için fast tokenizer gerekli (use_fast=True)")
+        enc = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+        offsets = enc["offset_mapping"]
+        self.starts = [a for a, _ in offsets]
+        self.ends = [b for _, b in offsets]
+
+    def index(self, pos: int) -> int:
+        return bisect_left(self.starts, pos)
+
+    def count(self, start: int, end: int) -> int:
+        return self.index(end) - self.index(start)
+
+    def windows(self, start: int, end: int, size: int) -> List[Tuple[int, int]]:
+        """[start, end) aralığını size token'lık karakter aralıklarına böl."""
+        i, j = self.index(start), self.index(end)
+        out = []
+        for k in range(i, j, size):
+            last = min(k + size, j) - 1
+            out.append((self.starts[k], self.ends[last]))
+        return out
+
+
+def _spans(pattern, text: str, base: int = 0) -> List[Tuple[int, int]]:
+    """pattern ile ayrılmış, kırpılmış ve boş olmayan parçaların (start, end) aralıkları."""
+    out, pos = [], 0
+    for m in list(pattern.finditer(text)) + [None]:
+        end = m.start() if m else len(text)
+        piece = text[pos:end]
+        stripped = piece.strip()
+        if stripped:
+            lead = len(piece) - len(piece.lstrip())
+            out.append((base + pos + lead, base + pos + lead + len(stripped)))
+        if m:
+            pos = m.end()
+    return out
+
+
+def chunk_sentence_spans(text: str, tokenizer, target: int, max_tok: int, overlap: int,
+                         sent_split=SENT_SPLIT) -> List[Tuple[int, int, str]]:
+    """
+    Cümle hizalı chunk'lar: cümleler target token'a kadar biriktirilir,
+    max_tok'u aşan cümle target'lık pencerelere bölünür, yeni chunk
+    önceki chunk'ın son cümlelerinden en fazla overlap token ile başlar.
+    (başlangıç, bitiş, metin) döner; aralık text içindeki karakter konumudur.
+    """
+    if not text.strip():
+        return []
+    pt = PageTokens(tokenizer, text)
+    sents = [(a, b, pt.count(a, b)) for a, b in _spans(sent_split, text)]
+
+    chunks: List[Tuple[int, int, str]] = []
+    current: List[Tuple[int, int, int]] = []
+    current_len = 0
+
+    def flush():
+        chunks.append((current[0][0], current[-1][1],
+                       ' '.join(text[a:b] for a, b, _ in current)))
+
+    for sent in sents:
+        a, b, sent_len = sent
+        if sent_len > max_tok:
+            if current:
+                flush()
+                current, current_len = [], 0
+            chunks.extend((x, y, text[x:y]) for x, y in pt.windows(a, b, target))
+            continue
+
+        if current_len + sent_len <= target:
+            current.append(sent)
+            current_len += sent_len
+            continue
+
+        if current:
+            flush()
+        kept, kept_len = [], 0
+        if overlap > 0:
+            for s in reversed(current):
+                if kept_len + s[2] > overlap:
+                    break
+                kept.insert(0, s)
+                kept_len += s[2]
+        current, current_len = kept + [sent], kept_len + sent_len
+
+    if current:
+        flush()
+    return chunks
+
+
+def chunk_sentences(text: str, tokenizer, target: int, max_tok: int, overlap: int,
+                    sent_split=SENT_SPLIT) -> List[str]:
+    """chunk_sentence_spans'in yalnızca metinleri."""
+    return [c for _, _, c in chunk_sentence_spans(text, tokenizer, target, max_tok, overlap, sent_split)]
+
+
+def chunk_paragraphs(text: str, tokenizer, target: int, maxi: int,
+                     sent_split=SENT_SPLIT) -> List[str]:
+    """
+    Paragraf hizalı chunk'lar: paragraflar target token'a kadar birleştirilir,
+    maxi'yi aşan paragraflar cümle cümle eklenir.
+    """
+    if not text.strip():
+        return []
+    pt = PageTokens(tokenizer, text)
+    chunks: List[str] = []
+    cur, cur_len = "", 0
+    for pa, pb in _spans(PARA_SPLIT, text):
+        n = pt.count(pa, pb)
+        if n > maxi:
+            for a, b in _spans(sent_split, text[pa:pb], base=pa):
+                s, l = text[a:b], pt.count(a, b)
+                if cur_len + l > target:
+                    if cur: chunks.append(cur.strip())
+                    cur, cur_len = s, l
+                else:
+                    cur = (cur + " " + s).strip() if cur else s
+                    cur_len += l
+        else:
+            para = text[pa:pb]
+            if cur_len + n > target:
+                if cur: chunks.append(cur.strip())
+                cur, cur_len = para, n
+            else:
+                cur = (cur + "\n\n" + para).strip() if cur else para
+                cur_len += n
+    if cur: chunks.append(cur.strip())
+    return chunks
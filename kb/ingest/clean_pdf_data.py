@@ -2,8 +2,11 @@ import os
 import re
 import json
 import hashlib
-from typing import List, Dict, Tuple
-from pypdf import PdfReader
+from typing import List, Dict, Tuple, Iterator
+
+import pdf_text
+from pdf_text import extract_pages
+from normalize import pdf_page, strip_toc
 
 # =========================
 # 1) Konfigürasyon
@@ -19,41 +22,23 @@ CHARS_PER_TOKEN = 4
 TARGET_TOKENS = 700
 OVERLAP_TOKENS = 120
 
+# Sayfa birleştirme ayracı (sayfa offset'leri bu ayraçla hesaplanır)
+PAGE_SEP = "\n\n[[PAGE_BREAK]]\n\n"
+
 TARGET_CHARS = TARGET_TOKENS * CHARS_PER_TOKEN
 OVERLAP_CHARS = OVERLAP_TOKENS * CHARS_PER_TOKEN
 
 # =========================
 # 2) Desenler (Regex)
 # =========================
-# (A) Header/Footer & Gürültü
-HEADER_FOOTER_PATTERN = re.compile(
-    r"(KULLANICI KILAVUZU|TALİMAT).*?(DAHİLİ|GENEL)", re.IGNORECASE | re.DOTALL
-)
-
-# Satır bazlı "sayfa 5", "5/26" veya tek başına sayılar (maks 3-4 karakter) gibi numaraları silecek,
-# ama gövdedeki ciddi sayıları dokunmadan bırakacak bir yaklaşım:
-LINE_PAGE_NUMBER_PATTERN = re.compile(
-    r"^\s*(sayfa\s*\d+|\d+\s*/\s*\d+|\d{1,3})\s*$", re.IGNORECASE | re.MULTILINE
-)
-
-VISUAL_REF_PATTERN = re.compile(r"\b(Görsel|Tablo|Şekil)[- ]?\d+\b", re.IGNORECASE)
+# (A) Header/Footer, sayfa no, görsel referansı, imza ve İÇİNDEKİLER desenleri
+# normalize.py'de (pdf_page / strip_toc) tek geçişte uygulanır.
 
 # (B) Bölüm Başlıkları (hiyerarşik)
 CHUNK_START_PATTERN = re.compile(
     r"(?m)^\s*(\d+(?:\.\d+)*)(?:\.|\))?\s+([A-ZÇĞİÖŞÜ].+?)\s*$"
 )
 
-# (C) İmza blokları / roller (çok tekrar eden kuyruk metinleri)
-SIGNOFF_PATTERN = re.compile(
-    r"(Hazırlayan|Kontrol Eden|Onaylayan|OPERASYON MÜDÜRLÜĞÜ|FİYAT VE İNDİRİM PLANLAMA MÜDÜRÜ).*",
-    re.IGNORECASE
-)
-
-# İçindekiler (TOC) blok temizliği: belgelerin başında yer alan kısım
-TOC_PATTERN = re.compile(
-    r"(?is)\bİÇİNDEKİLER\b.*?(?:\n\s*\d+(\.\d+)*\s+|(?:\n){2,})"
-)
-
 
 # =========================
 # 3) Yardımcılar
@@ -72,37 +57,16 @@ def normalize_spaces(text: str) -> str:
     return text.strip()
 
 def clean_page_text(text: str) -> str:
-    if not text:
-        return ""
-    # İçindekiler sayfasındaki başlığı sayfa bazında gelirse zayıf dokunuş
-    text = HEADER_FOOTER_PATTERN.sub(" ", text)
-    text = LINE_PAGE_NUMBER_PATTERN.sub("", text)
-    text = VISUAL_REF_PATTERN.sub(" ", text)
-    text = SIGNOFF_PATTERN.sub("", text)
-    # Kaynakta bazen satır sonlarında kırık tireler bulunabilir: "fiyatla-\nrma"
-    text = re.sub(r"(\w)-\n(\w)", r"\1\2", text)
-    # Normalizasyon
-    text = normalize_spaces(text)
-    return text
+    # header/footer, sayfa no satırları, görsel ref, imza, kırık tireler + boşluklar
+    return pdf_page(text)
 
 def remove_toc_block(full_text: str) -> str:
     # Belgenin başı yakınlarında ise temizle
-    head = full_text[:8000]
-    match = TOC_PATTERN.search(head)
-    if match:
-        start, end = match.span()
-        return full_text[:start] + full_text[end:]
-    return full_text
-
-def paged_extract(reader: PdfReader) -> List[str]:
-    pages = []
-    for p in reader.pages:
-        try:
-            raw = p.extract_text() or ""
-        except Exception:
-            raw = ""
-        pages.append(raw)
-    return pages
+    return strip_toc(full_text)
+
+def paged_extract(file_path: str) -> List[str]:
+    # sayfa metinleri pdf_text cache'inden (okunamayan sayfa boş metin)
+    return extract_pages(file_path)
 
 def map_index_to_page(index: int, page_offsets: List[int]) -> int:
     # page_offsets: her sayfanın birleşik metin içindeki başlangıç indeksi
@@ -162,33 +126,15 @@ def sectionize_with_titles(text: str) -> List[Tuple[str, int, int]]:
 # =========================
 # 4) PDF İşleme
 # =========================
-def process_pdf(file_path: str) -> List[Dict]:
-    file_name = os.path.basename(file_path)
-    print(f"-> {file_name} işleniyor...")
-
-    try:
-        reader = PdfReader(file_path)
-    except Exception as e:
-        print(f"  HATA: {file_name} açılırken: {e}")
-        return []
-
-    raw_pages = paged_extract(reader)
-    if not any(raw_pages):
-        print(f"  UYARI: {file_name} içeriği boş görünüyor.")
-        return []
-
+def clean_pages(raw_pages: List[str]) -> Tuple[str, List[int]]:
+    """
+    Temizlik kuralları: sayfa bazlı gürültü temizliği, İÇİNDEKİLER bloğu,
+    boşluk sadeleştirme. (birleşik metin, sayfa başlangıç offset'leri) döner.
+    """
     # Sayfa bazlı temizlik
     cleaned_pages = [clean_page_text(p) for p in raw_pages]
 
-    # Belge başındaki İÇİNDEKİLER'i belge genelinde kaldır (sayfa bazında kaçmış olabilir)
-    joined_for_toc = "\n\n".join(cleaned_pages)
-    joined_for_toc = remove_toc_block(joined_for_toc)
-
-    # Sayfa offsetlerini yeniden hesapla
-    # Sayfaları tekrar böl: "\n\n[[PAGE_BREAK]]\n\n" ile
-    PAGE_SEP = "\n\n[[PAGE_BREAK]]\n\n"
-    # joined_for_toc'u tekrar sayfa listesine bölmek hassas olabilir; daha güvenlisi:
-    # temizlenmiş sayfaları tek tek birleştirip offset tut.
+    # Temizlenmiş sayfaları tek tek birleştirip offset tut
     concat_text = ""
     page_offsets = []
     for idx, page_text in enumerate(cleaned_pages):
@@ -197,9 +143,27 @@ def process_pdf(file_path: str) -> List[Dict]:
         if idx < len(cleaned_pages) - 1:
             concat_text += PAGE_SEP
 
-    # concat_text içinde İÇİNDEKİLER temizliğini de uygulayalım:
+    # Belge başındaki İÇİNDEKİLER'i belge genelinde kaldır (sayfa bazında kaçmış olabilir)
     concat_text = remove_toc_block(concat_text)
     concat_text = normalize_spaces(concat_text)
+    return concat_text, page_offsets
+
+
+def process_pdf(file_path: str) -> List[Dict]:
+    file_name = os.path.basename(file_path)
+    print(f"-> {file_name} işleniyor...")
+
+    try:
+        raw_pages = paged_extract(file_path)
+    except Exception as e:
+        print(f"  HATA: {file_name} açılırken: {e}")
+        return []
+
+    if not any(raw_pages):
+        print(f"  UYARI: {file_name} içeriği boş görünüyor.")
+        return []
+
+    concat_text, page_offsets = clean_pages(raw_pages)
 
     # Bölümlere ayır ve içeride sliding window uygula
     sections = sectionize_with_titles(concat_text)
@@ -245,6 +209,12 @@ def process_pdf(file_path: str) -> List[Dict]:
     return chunks_out
 
 
+def iter_corpus_chunks(pdf_dir: str, pdf_files: List[str]) -> Iterator[List[Dict]]:
+    """Dokümanları sırayla işle; her dokümanın chunk listesini ayrı ayrı üret."""
+    for pdf in pdf_files:
+        yield process_pdf(os.path.join(pdf_dir, pdf))
+
+
 # =========================
 # 5) Ana Döngü
 # =========================
@@ -258,20 +228,19 @@ def main():
         print(f"HATA: '{PDF_DIR}' içinde PDF yok.")
         return
 
-    all_chunks: List[Dict] = []
-
-    for pdf in pdf_files:
-        path = os.path.join(PDF_DIR, pdf)
-        chunks = process_pdf(path)
-        all_chunks.extend(chunks)
-
+    # Her dokümanın chunk'ları biter bitmez yazılır; korpus bellekte tutulmaz
+    total = 0
     with open(OUTPUT_FILE, "w", encoding=ENCODING) as f:
-        for ch in all_chunks:
-            f.write(json.dumps(ch, ensure_ascii=False) + "\n")
+        for chunks in iter_corpus_chunks(PDF_DIR, pdf_files):
+            for ch in chunks:
+                f.write(json.dumps(ch, ensure_ascii=False) + "\n")
+            f.flush()
+            total += len(chunks)
 
     print("\n" + "=" * 60)
     print("--- İŞLEM TAMAMLANDI ---")
-    print(f"Toplam chunk: {len(all_chunks)}")
+    print(f"Toplam chunk: {total}")
+    pdf_text.report()
     print(f"Çıktı: {os.path.abspath(OUTPUT_FILE)}")
     print("=" * 60)
     print("\nSonraki adımlar:")
@@ -0,0 +1,201 @@
+# kb/ingest/dedup.py
+"""
+Korpus genelinde near-duplicate tespiti.
+
+- Her bölüm için 64-bit SimHash (kelime 3-gram) saklanır; 4x16-bit bant
+  üzerinde GIN ifade index'i ile Hamming <= MAX_HAMMING adaylar bulunur.
+- Embedding'ler hem doküman içinde (tüm tutulanlara karşı, matris çarpımı)
+  hem de mevcut vektör index'ine karşı (tek sorgu, LATERAL en yakın komşu)
+  cosine ile kontrol edilir. Cosine index'i yoksa (--defer-index ile
+  bırakılmışsa) korpus kontrolü yalnız SimHash ile yapılır; index'siz
+  LATERAL her chunk için tam tablo taraması olurdu.
+- Tekrarlar bir kez saklanır; tüm kaynak sayfalar section_sources'a bağlanır
+  ve enhanced_search sonuçlarında source_pages olarak döner.
+"""
+import os
+import re
+import hashlib
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from pg_copy import copy_rows
+from index_manager import has_vector_index
+
+COSINE_THRESHOLD = float(os.getenv("DEDUP_COSINE", "0.98"))
+MAX_HAMMING = int(os.getenv("DEDUP_HAMMING", "3"))
+IVFFLAT_PROBES = int(os.getenv("DEDUP_IVFFLAT_PROBES", "10"))
+HNSW_EF_SEARCH = int(os.getenv("DEDUP_HNSW_EF_SEARCH", "40"))
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+_BITS = np.uint64(1) << np.arange(64, dtype=np.uint64)
+
+
+def _bands_sql(col: str) -> str:
+    # 64-bit imzayı 4 adet (bant_no << 16 | 16 bit) int'e böl
+    return "ARRAY[" + ", ".join(
+        f"(({i} << 16) | (({col} >> {16 * i}) & 65535))::int" for i in range(4)
+    ) + "]"
+
+
+def simhash(text: str, ngram: int = 3) -> int:
+    """Kelime n-gram'larından 64-bit SimHash (BIGINT için işaretli)."""
+    words = _WORD.findall(text.lower())
+    grams = [" ".join(words[i:i + ngram]) for i in range(max(1, len(words) - ngram + 1))]
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=8).digest(), "little")
+         for g in grams),
+        dtype=np.uint64, count=len(grams),
+    )
+    bits = (hashes[:, None] & _BITS) != 0
+    votes = bits.sum(axis=0) * 2 - len(grams)
+    sig = sum(1 << int(i) for i in np.flatnonzero(votes > 0))
+    return sig - (1 << 64) if sig >= (1 << 63) else sig
+
+
+def hamming(a: int, b: int) -> int:
+    return bin((a ^ b) & 0xFFFFFFFFFFFFFFFF).count("1")
+
+
+def _popcount(x: np.ndarray) -> np.ndarray:
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(x)
+    return np.unpackbits(x.view(np.uint8)).reshape(-1, 64).sum(axis=1)
+
+
+def find_local_duplicates(vecs: np.ndarray, sigs: Sequence[int],
+                          cos_thr: float = COSINE_THRESHOLD,
+                          max_ham: int = MAX_HAMMING) -> List[Optional[int]]:
+    """
+    Doküman içi tekrarlar: her chunk için kendinden önce tutulan ve benzer
+    olan chunk'ın indeksi, yoksa None. vecs L2-normalize olmalı.
+    """
+    vecs = np.asarray(vecs, dtype=np.float32)
+    usigs = np.asarray(sigs, dtype=np.int64).view(np.uint64)
+    kept = np.empty(len(vecs), dtype=np.int64)
+    k = 0
+    out: List[Optional[int]] = []
+    for i, v in enumerate(vecs):
+        target = None
+        if k:
+            sims = vecs[kept[:k]] @ v
+            j = int(np.argmax(sims))
+            if sims[j] >= cos_thr:
+                target = int(kept[j])
+            else:
+                dists = _popcount(usigs[kept[:k]] ^ usigs[i])
+                j = int(np.argmin(dists))
+                if dists[j] <= max_ham:
+                    target = int(kept[j])
+        if target is None:
+            kept[k] = i
+            k += 1
+        out.append(target)
+    return out
+
+
+def find_corpus_duplicates(cur, vecs: np.ndarray, sigs: Sequence[int],
+                           cos_thr: float = COSINE_THRESHOLD,
+                           max_ham: int = MAX_HAMMING) -> List[Optional[int]]:
+    """
+    Mevcut bölümlere karşı tekrarlar: her chunk için eşleşen section_id ya da None.
+    Sorgu vektörleri geçici tabloya binary COPY ile yazılır, iki set-based sorgu çalışır;
+    cosine sorgusu yalnız geçerli bir cosine index'i varken çalışır.
+    """
+    if len(sigs) == 0:
+        return []
+    cur.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS _dedup_query (
+          ord INT, simhash BIGINT, embedding vector
+        ) ON COMMIT DELETE ROWS
+    """)
+    cur.execute("TRUNCATE _dedup_query")
+    vecs = np.asarray(vecs, dtype=np.float32)
+    copy_rows(cur, "_dedup_query", ("ord", "simhash", "embedding"), ("int4", "int8", "vector"),
+              ((i, sig, vecs[i]) for i, sig in enumerate(sigs)))
+
+    found: List[Optional[int]] = [None] * len(sigs)
+
+    cur.execute(f"""
+        SELECT q.ord, s.id
+        FROM _dedup_query q
+        CROSS JOIN LATERAL (
+          SELECT ds.id FROM document_sections ds
+          WHERE ds.simhash IS NOT NULL
+            AND {_bands_sql('ds.simhash')} && {_bands_sql('q.simhash')}
+            AND bit_count((ds.simhash # q.simhash)::bit(64)) <= %s
+          ORDER BY bit_count((ds.simhash # q.simhash)::bit(64)), ds.id
+          LIMIT 1
+        ) s
+    """, (max_ham,))
+    for ord_, sid in cur.fetchall():
+        found[ord_] = sid
+
+    if not has_vector_index(cur, "document_embeddings", "embedding", "vector_cosine_ops"):
+        return found
+    cur.execute("SET LOCAL ivfflat.probes = %s", (IVFFLAT_PROBES,))
+    cur.execute("SET LOCAL hnsw.ef_search = %s", (HNSW_EF_SEARCH,))
+    cur.execute("""
+        SELECT q.ord, nn.section_id
+        FROM _dedup_query q
+        CROSS JOIN LATERAL (
+          SELECT e.section_id, e.embedding <=> q.embedding AS dist
+          FROM document_embeddings e
+          ORDER BY e.embedding <=> q.embedding
+          LIMIT 1
+        ) nn
+        WHERE 1 - nn.dist >= %s
+    """, (cos_thr,))
+    for ord_, sid in cur.fetchall():
+        if found[ord_] is None:
+            found[ord_] = sid
+    return found
+
+
+def ensure_dedup_schema(cur):
+    cur.execute("ALTER TABLE document_sections ADD COLUMN IF NOT EXISTS simhash BIGINT;")
+    cur.execute(f"""
+    CREATE INDEX IF NOT EXISTS idx_sections_simhash_bands
+    ON document_sections USING gin (({_bands_sql('simhash')}))
+    WHERE simhash IS NOT NULL;
+    """)
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS section_sources (
+      section_id  BIGINT NOT NULL REFERENCES document_sections(id) ON DELETE CASCADE,
+      document_id BIGINT NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+      page_number INT NOT NULL DEFAULT 0,
+      PRIMARY KEY (section_id, document_id, page_number)
+    );
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_section_sources_document ON section_sources(document_id);")
+
+
+def link_sources(cur, rows: Iterable[Tuple[int, int, Optional[int]]]):
+    """(section_id, document_id, page_number) bağlantılarını yaz."""
+    rows = sorted({(sid, did, page or 0) for sid, did, page in rows})
+    if not rows:
+        return
+    cur.execute("""
+        INSERT INTO section_sources (section_id, document_id, page_number)
+        SELECT * FROM unnest(%s::bigint[], %s::bigint[], %s::int[])
+        ON CONFLICT DO NOTHING
+    """, ([r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows]))
+
+
+def release_document_sections(cur, doc_id: int):
+    """
+    Doküman yeniden işlenirken: bağlantılarını kaldır, başka dokümanların da
+    kaynak gösterdiği bölümleri o dokümanlardan birine devret, kalanları sil.
+    """
+    cur.execute("DELETE FROM section_sources WHERE document_id=%s", (doc_id,))
+    cur.execute("""
+        UPDATE document_sections s
+        SET document_id = ss.document_id, page_number = ss.page_number
+        FROM (
+          SELECT DISTINCT ON (section_id) section_id, document_id, page_number
+          FROM section_sources
+          ORDER BY section_id, document_id, page_number
+        ) ss
+        WHERE s.id = ss.section_id AND s.document_id = %s
+    """, (doc_id,))
+    cur.execute("DELETE FROM document_sections WHERE document_id=%s", (doc_id,))
@@ -0,0 +1,313 @@
+# kb/ingest/emails_ocr.py
+"""
+Taranmış e-posta içeriklerini OCR ile training_content'e yükler.
+
+Girdi klasöründeki .eml (gövde + görsel/PDF ekleri), .pdf ve görsel
+dosyaları (.png/.jpg/.tif...) doküman olarak işlenir:
+- PDF sayfasında metin katmanı varsa OCR yapılmaz, gömülü görseller çıkarılır.
+- Görseller gri tona çevrilip küçültülür, eğiklik düzeltilir; tesseract (tur)
+  CPU sayısı kadar process'te çalışır (süreç başına tek OpenMP thread).
+- OCR çıktısı görsel hash'i ile diske cache'lenir (klasör: dil + OCR_CONFIG,
+  OCR_MAX_SIDE ve ön işleme sürümünün özeti); tekrar çalıştırmada aynı görsel
+  aynı ayarlarla yeniden OCR'lanmaz.
+- Sonuçlar emails_txt ile aynı şekilde ayrıştırılıp (adımlar, etiketler,
+  konu) toplu upsert edilir ve değişen satırlar embed edilir.
+
+Kullanım:
+  python kb/ingest/emails_ocr.py --dir kb/data/emails --theme "Aylik Troy Egitimleri"
+"""
+import io
+import os
+import json
+import time
+import hashlib
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from email import policy
+from email.parser import BytesParser
+from typing import Dict, List, Optional, Tuple
+
+# tesseract'ın kendi OpenMP thread'leri process havuzuyla yarışmasın
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+import numpy as np
+import pytesseract
+from PIL import Image, ImageOps
+from pypdf import PdfReader
+
+from emails_txt import connect, ensure_schema, build_item, TrainingWriter
+
+OCR_LANG = os.getenv("OCR_LANG", "tur")
+OCR_CONFIG = os.getenv("OCR_CONFIG", "--oem 1 --psm 3")
+MAX_SIDE = int(os.getenv("OCR_MAX_SIDE", "2500"))       # px; ~300dpi A4 uzun kenar
+MIN_SIDE = int(os.getenv("OCR_MIN_SIDE", "200"))        # logo/ikon gibi küçük görselleri atla
+MIN_TEXT_LAYER = 20                                     # karakter; altı taranmış sayfa sayılır
+CACHE_DIR = os.getenv("OCR_CACHE_DIR", os.path.join(os.path.dirname(__file__), "..", "data", "ocr_cache"))
+
+# preprocess() / estimate_skew davranışı değişince artırın: eski OCR cache'i kullanılmasın
+PREPROCESS_VERSION = 1
+# Çıktıyı etkileyen tüm ayarlar cache klasörünün adında
+SETTINGS_KEY = hashlib.sha256(json.dumps(
+    [OCR_LANG, OCR_CONFIG, MAX_SIDE, PREPROCESS_VERSION]).encode("utf-8")).hexdigest()[:12]
+
+IMAGE_EXT = ('.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp', '.gif', '.webp')
+SOURCE_EXT = ('.eml', '.pdf') + IMAGE_EXT
+
+
+# ---------- OCR cache ----------
+def image_key(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def cache_path(cache_dir: str, key: str) -> str:
+    # ayarlar değişirse eski çıktılar kullanılmasın
+    return os.path.join(cache_dir, f"{OCR_LANG}-{SETTINGS_KEY}", key[:2], key + ".txt")
+
+def cache_get(cache_dir: str, key: str) -> Optional[str]:
+    try:
+        with open(cache_path(cache_dir, key), encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+def cache_put(cache_dir: str, key: str, text: str):
+    path = cache_path(cache_dir, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+# ---------- Görsel ön işleme ----------
+def estimate_skew(gray: Image.Image, max_angle: float = 5.0, step: float = 0.5) -> float:
+    """Satır profili varyansını en büyük yapan açı (projeksiyon yöntemi, küçük kopyada)."""
+    small = gray.copy()
+    small.thumbnail((800, 800))
+    ink = Image.fromarray(((np.asarray(small) < 128) * 255).astype(np.uint8))
+    best, best_score = 0.0, -1.0
+    for angle in np.arange(-max_angle, max_angle + step / 2, step):
+        rows = np.asarray(ink.rotate(float(angle), resample=Image.NEAREST)).sum(axis=1, dtype=np.float64)
+        score = float(np.sum(np.diff(rows) ** 2))
+        if score > best_score:
+            best, best_score = float(angle), score
+    return best
+
+def preprocess(img: Image.Image, max_side: int = MAX_SIDE) -> Image.Image:
+    img = ImageOps.exif_transpose(img)
+    gray = ImageOps.autocontrast(img.convert("L"))
+    if max(gray.size) > max_side:
+        gray.thumbnail((max_side, max_side), Image.LANCZOS)
+    angle = estimate_skew(gray)
+    if abs(angle) >= 0.5:
+        gray = gray.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+    return gray
+
+def ocr_image(task: Tuple[str, bytes, str]) -> Tuple[str, str, float]:
+    """Worker: (key, görsel bytes, cache_dir) -> (key, metin, süre)."""
+    key, data, cache_dir = task
+    t0 = time.perf_counter()
+    img = preprocess(Image.open(io.BytesIO(data)))
+    text = pytesseract.image_to_string(img, lang=OCR_LANG, config=OCR_CONFIG).strip()
+    cache_put(cache_dir, key, text)
+    return key, text, time.perf_counter() - t0
+
+
+# ---------- Kaynaklardan sayfa toplama ----------
+def usable_image(data: bytes) -> bool:
+    try:
+        with Image.open(io.BytesIO(data)) as im:
+            return min(im.size) >= MIN_SIDE
+    except Exception:
+        return False
+
+def pdf_pages(data: bytes) -> List[Tuple[str, object]]:
+    """PDF sayfaları: metin katmanı varsa ('text', metin), yoksa gömülü görseller ('image', bytes)."""
+    pages = []
+    for page in PdfReader(io.BytesIO(data)).pages:
+        try:
+            text = (page.extract_text() or "").strip()
+        except Exception:
+            text = ""
+        if len(text) >= MIN_TEXT_LAYER:
+            pages.append(("text", text))
+            continue
+        try:
+            images = [im.data for im in page.images]
+        except Exception:
+            images = []
+        pages.extend(("image", b) for b in images if usable_image(b))
+    return pages
+
+def eml_parts(data: bytes) -> Tuple[str, str, List[Tuple[str, object]]]:
+    """E-posta: (konu, düz metin gövde, ek sayfaları)."""
+    msg = BytesParser(policy=policy.default).parsebytes(data)
+    subject = str(msg.get("subject") or "").strip()
+    body_part = msg.get_body(preferencelist=("plain",))
+    body = body_part.get_content().strip() if body_part else ""
+    pages: List[Tuple[str, object]] = []
+    for part in msg.walk():
+        if part.is_multipart() or part is body_part:
+            continue
+        ctype = part.get_content_type()
+        payload = part.get_payload(decode=True) or b""
+        if ctype.startswith("image/") and usable_image(payload):
+            pages.append(("image", payload))
+        elif ctype == "application/pdf" or (part.get_filename() or "").lower().endswith(".pdf"):
+            pages.extend(pdf_pages(payload))
+    return subject, body, pages
+
+def load_source(path: str) -> Tuple[str, str, List[Tuple[str, object]]]:
+    with open(path, "rb") as f:
+        data = f.read()
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".eml":
+        return eml_parts(data)
+    if ext == ".pdf":
+        return "", "", pdf_pages(data)
+    return "", "", [("image", data)]
+
+def iter_source_files(root_dir: str):
+    for base, _, files in os.walk(root_dir):
+        for fn in sorted(files):
+            if fn.lower().endswith(SOURCE_EXT):
+                yield os.path.join(base, fn)
+
+
+# ---------- Doküman birleştirme ----------
+class Doc:
+    """Bir kaynak dosya; OCR sayfaları tamamlanınca training_content satırına dönüşür."""
+
+    def __init__(self, path: str, subject: str, body: str, pages: List[Tuple[str, object]]):
+        self.path, self.subject, self.body = path, subject, body
+        self.pages = pages                      # ('text', metin) | ('key', image_key)
+        self.texts: Dict[str, str] = {}         # image_key -> OCR metni
+        self.futures: Dict[str, object] = {}
+
+    def item(self) -> Optional[Dict]:
+        parts = [self.body] if self.body else []
+        for kind, val in self.pages:
+            parts.append(val if kind == "text" else self.texts.get(val, ""))
+        full = "\n\n".join(p for p in parts if p and p.strip())
+        if not full.strip():
+            return None
+        lines = [ln.strip() for ln in full.splitlines() if ln.strip()]
+        title = (self.subject or lines[0] or os.path.basename(self.path))[:500]
+        body = full if self.subject else "\n".join(lines[1:]) or lines[0]
+        return build_item(self.path, title, body)
+
+
+class Throughput:
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.docs = self.pages = self.text_pages = self.ocr_pages = self.cache_hits = self.empty = 0
+        self.ocr_seconds = 0.0
+        self.slowest: Tuple[float, str] = (0.0, "")
+
+    def ocr(self, label: str, seconds: float):
+        self.ocr_pages += 1
+        self.ocr_seconds += seconds
+        self.slowest = max(self.slowest, (seconds, label))
+        print(f"  🖼️  {label}: {seconds:.2f}s")
+
+    def summary(self) -> str:
+        wall = time.perf_counter() - self.t0
+        per_page = self.ocr_seconds / self.ocr_pages if self.ocr_pages else 0.0
+        return (f"docs={self.docs}, pages={self.pages} (metin katmanı={self.text_pages}, "
+                f"ocr={self.ocr_pages}, cache={self.cache_hits}), boş={self.empty}\n"
+                f"  ocr_cpu={self.ocr_seconds:.1f}s ({per_page:.2f}s/sayfa), wall={wall:.1f}s, "
+                f"{self.pages / wall if wall else 0:.2f} sayfa/s, "
+                f"en yavaş: {self.slowest[1] or '-'} {self.slowest[0]:.2f}s")
+
+
+def process_ocr_dir(root_dir: str, campaign_id: str, monthly_theme: str, batch_size: int = 100,
+                    workers: Optional[int] = None, cache_dir: str = CACHE_DIR, embed: bool = True):
+    workers = workers or os.cpu_count() or 1
+    window = workers * 2                       # bellekte bekleyen doküman sayısı
+    stats = Throughput()
+    conn = connect(); writer = TrainingWriter(conn, monthly_theme, campaign_id)
+    batch: List[Dict] = []
+
+    def finish(doc: Doc):
+        nonlocal batch
+        for key, fut in doc.futures.items():
+            try:
+                _, text, secs = fut.result()
+                doc.texts[key] = text
+                stats.ocr(f"{os.path.basename(doc.path)}#{key[:8]}", secs)
+            except Exception as e:
+                writer.failed += 1
+                print(f"❌ OCR {os.path.basename(doc.path)}#{key[:8]} -> {e}")
+        item = doc.item()
+        stats.docs += 1
+        if item is None:
+            stats.empty += 1
+            print(f"⚠️  {os.path.basename(doc.path)}: metin çıkmadı")
+            return
+        batch.append(item)
+        if len(batch) >= batch_size:
+            writer.write(batch); batch = []
+            print(f"⏳ {writer.progress()}")
+
+    try:
+        ensure_schema(writer.cur); conn.commit()
+        pending: deque = deque()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for path in iter_source_files(root_dir):
+                try:
+                    subject, body, raw_pages = load_source(path)
+                except Exception as e:
+                    writer.failed += 1; print(f"❌ {os.path.basename(path)} -> {e}")
+                    continue
+                pages = []
+                doc = Doc(path, subject, body, pages)
+                for kind, val in raw_pages:
+                    stats.pages += 1
+                    if kind == "text":
+                        stats.text_pages += 1
+                        pages.append(("text", val))
+                        continue
+                    key = image_key(val)
+                    pages.append(("key", key))
+                    cached = cache_get(cache_dir, key)
+                    if cached is not None:
+                        stats.cache_hits += 1
+                        doc.texts[key] = cached
+                    elif key not in doc.futures:
+                        doc.futures[key] = pool.submit(ocr_image, (key, val, cache_dir))
+                pending.append(doc)
+                while len(pending) > window:
+                    finish(pending.popleft())
+            while pending:
+                finish(pending.popleft())
+        if batch:
+            writer.write(batch)
+        if embed:
+            writer.embed_changed()
+    finally:
+        writer.close(); conn.close()
+    print(f"\nSummary: {writer.summary()}")
+    print(f"OCR: {stats.summary()}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Taranmış e-posta/PDF/görselleri OCR ile training_content tablosuna yükler.")
+    ap.add_argument('--dir', required=True)
+    ap.add_argument('--theme', '--monthly-theme', dest='theme', default='Genel Bilgilendirme')
+    ap.add_argument('--campaign-id', default=None, help="varsayılan: ocr-<klasör adı>")
+    ap.add_argument('--batch-size', type=int, default=100)
+    ap.add_argument('--workers', type=int, default=None, help="OCR process sayısı (varsayılan: CPU sayısı)")
+    ap.add_argument('--cache-dir', default=CACHE_DIR)
+    ap.add_argument('--no-embed', action='store_true', help="eklenen/değişen satırları embed etme")
+    args = ap.parse_args()
+    if not os.path.isdir(args.dir): raise SystemExit(f"Dizin bulunamadı: {args.dir}")
+    try:
+        pytesseract.get_tesseract_version()
+    except Exception as e:
+        raise SystemExit(f"tesseract bulunamadı ({e}); 'tesseract-ocr tesseract-ocr-tur' kurulu olmalı")
+    campaign_id = args.campaign_id or f"ocr-{os.path.basename(os.path.normpath(args.dir))}"
+    process_ocr_dir(args.dir, campaign_id, args.theme, batch_size=args.batch_size,
+                    workers=args.workers, cache_dir=args.cache_dir, embed=not args.no_embed)
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 # kb/ingest/emails_txt.py
 import os, re, argparse, psycopg2
+from concurrent.futures import ProcessPoolExecutor
+from psycopg2.extras import execute_values
 
 TOPIC_KEYWORDS = {
     'fiyat': ['fiyat','revize','marj','psf','markup'],
@@ -64,14 +66,19 @@ def extract_steps(text: str):
             steps.append(s)
     return steps[:20]
 
-def split_title_body(path:str):
+def read_text(path:str):
+    # dosya bir kez okunur, kodlama bellekte denenir
+    with open(path,'rb') as f:
+        raw=f.read()
     for enc in ('utf-8','cp1254'):
         try:
-            with open(path,'r',encoding=enc) as f:
-                lines=[ln.rstrip() for ln in f]
-            break
+            return raw.decode(enc)
         except UnicodeDecodeError:
             continue
+    return raw.decode('utf-8', errors='replace')
+
+def split_title_body(path:str):
+    lines=[ln.rstrip() for ln in read_text(path).splitlines()]
     if not lines:
         base=os.path.splitext(os.path.basename(path))[0]
         return base[:500],''
@@ -83,66 +90,162 @@ def make_tags(text:str):
     t=text.lower()
     return [kw for kw in TAGS_TERMS if kw in t][:10]
 
-def upsert_training(cur, title, desc, monthly_theme, campaign_id, steps, tags, update_if_exists=False):
-    topic, level = classify(title+' '+desc)
-    # dupe önleme
-    cur.execute("SELECT id FROM training_content WHERE email_campaign_id=%s AND title=%s LIMIT 1",
-                (campaign_id, title))
-    row=cur.fetchone()
-    if row:
-        if update_if_exists:
-            cur.execute("""
-                UPDATE training_content
-                SET description=%s, step_by_step=%s, tags=%s, monthly_theme=%s, updated_at=NOW()
-                WHERE id=%s
-                RETURNING id
-            """, (desc, steps, tags, monthly_theme, row[0]))
-            return row[0], 'updated'
-        return row[0], 'skipped'
+def build_item(path:str, title:str, body:str):
+    """Başlık/gövdeden training_content satırı (adımlar, etiketler, konu, seviye)."""
+    topic,level=classify(title+' '+body)
+    return dict(path=path, title=title, body=body, steps=extract_steps(body),
+                tags=make_tags(title+' '+body), topic=topic, level=level)
 
-    cur.execute("""
-        INSERT INTO training_content
-        (title, description, content_type, topic_category, difficulty_level,
-         thumbnail_url, step_by_step, related_screens, tags, monthly_theme,
-         email_campaign_id, status)
-        VALUES (%s, %s, 'tutorial', %s, %s,
-                NULL, %s, ARRAY[]::text[], %s, %s,
-                %s, 'active')
-        RETURNING id
-    """, (title, desc, topic, level, steps, tags, monthly_theme, campaign_id))
-    return cur.fetchone()[0], 'inserted'
-
-def process_txt_dir(root_dir:str, campaign_id:str, monthly_theme:str):
-    conn=connect(); cur=conn.cursor()
-    inserted=skipped=failed=0
+def parse_email(path:str):
+    """Dosyayı oku ve ayrıştır (worker process'te çalışır)."""
     try:
-        for base,_,files in os.walk(root_dir):
-            for fn in sorted(files):
-                if not fn.lower().endswith('.txt'): continue
-                path=os.path.join(base,fn)
+        title,body=split_title_body(path)
+        return build_item(path, title, body)
+    except Exception as e:
+        return dict(path=path, error=str(e))
+
+def ensure_schema(cur):
+    # ON CONFLICT hedefi. Eski mükerrer kayıtlar varsa index kurulamaz; kayıt silmek
+    # (embedding'leriyle birlikte) migration'ın işi, burada yalnızca erken durulur.
+    cur.execute("SELECT to_regclass('uq_training_campaign_title')")
+    if cur.fetchone()[0] is not None:
+        return
+    cur.execute("""
+        SELECT COUNT(*) FROM (
+          SELECT 1 FROM training_content
+          WHERE email_campaign_id IS NOT NULL
+          GROUP BY email_campaign_id, title HAVING COUNT(*) > 1
+        ) d
+    """)
+    dups = cur.fetchone()[0]
+    if dups:
+        raise SystemExit(f"training_content'te {dups} mükerrer (email_campaign_id, title) var; "
+                         f"önce: psql -U troy -d kb -f kb/schema/20251020_training_upsert.sql")
+    cur.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_training_campaign_title
+        ON training_content (email_campaign_id, title)
+    """)
+
+UPSERT_SQL = """
+    INSERT INTO training_content
+    (title, description, content_type, topic_category, difficulty_level,
+     thumbnail_url, step_by_step, related_screens, tags, monthly_theme,
+     email_campaign_id, status)
+    VALUES %s
+    ON CONFLICT (email_campaign_id, title) DO {action}
+    RETURNING id, (xmax = 0) AS inserted
+"""
+UPSERT_UPDATE = """UPDATE
+    SET description=EXCLUDED.description, step_by_step=EXCLUDED.step_by_step,
+        tags=EXCLUDED.tags, monthly_theme=EXCLUDED.monthly_theme, updated_at=NOW()
+    WHERE (training_content.description, training_content.step_by_step,
+           training_content.tags, training_content.monthly_theme)
+          IS DISTINCT FROM
+          (EXCLUDED.description, EXCLUDED.step_by_step, EXCLUDED.tags, EXCLUDED.monthly_theme)"""
+UPSERT_TEMPLATE = "(%s, %s, 'tutorial', %s, %s, NULL, %s::text[], ARRAY[]::text[], %s::text[], %s, %s, 'active')"
+
+def upsert_batch(cur, items, monthly_theme, campaign_id, update_if_exists=True):
+    """
+    Tek INSERT ... ON CONFLICT ile yaz. Yalnızca eklenen/değişen satırlar döner:
+    [(training_id, inserted)]; içerik aynıysa satır dokunulmadan atlanır.
+    """
+    # aynı batch'te aynı başlık iki kez gelirse son geleni al
+    by_title={it['title']:it for it in items}
+    rows=[(it['title'], it['body'], it['topic'], it['level'], it['steps'], it['tags'],
+           monthly_theme, campaign_id) for it in by_title.values()]
+    sql=UPSERT_SQL.format(action=UPSERT_UPDATE if update_if_exists else 'NOTHING')
+    return execute_values(cur, sql, rows, template=UPSERT_TEMPLATE, page_size=len(rows), fetch=True)
+
+def iter_txt_files(root_dir:str):
+    for base,_,files in os.walk(root_dir):
+        for fn in sorted(files):
+            if fn.lower().endswith('.txt'):
+                yield os.path.join(base,fn)
+
+class TrainingWriter:
+    """upsert_batch + batch hatasında satır satır yeniden deneme; sayaçları ve değişen id'leri tutar."""
+    def __init__(self, conn, monthly_theme:str, campaign_id:str):
+        self.conn=conn; self.cur=conn.cursor()
+        self.monthly_theme=monthly_theme; self.campaign_id=campaign_id
+        self.inserted=self.updated=self.skipped=self.failed=0
+        self.changed_ids=[]
+
+    def write(self, items):
+        conn, cur = self.conn, self.cur
+        # upsert_batch ile aynı: başlık başına son gelen
+        unique=list({it['title']:it for it in items}.values())
+        failed=0
+        try:
+            res=upsert_batch(cur, unique, self.monthly_theme, self.campaign_id)
+            conn.commit()
+        except Exception as e:
+            # batch'i kaybetme: hatalı satırı bulmak için tek tek dene
+            conn.rollback()
+            print(f"⚠️  batch hatası ({e}); satır satır yeniden deneniyor")
+            res=[]
+            for it in unique:
                 try:
-                    title,body=split_title_body(path)
-                    steps=extract_steps(body)
-                    tags=make_tags(title+' '+body)
-                    tid,st=upsert_training(cur,title,body,monthly_theme,campaign_id,steps,tags, update_if_exists=True)
-                    if st=='inserted':
-                        inserted+=1; print(f"✅ {fn} -> training_id={tid}")
-                    else:
-                        skipped+=1; print(f"⏭️  {fn} -> already exists (training_id={tid})")
-                except Exception as e:
-                    failed+=1; print(f"❌ {fn} -> {e}")
-        conn.commit()
+                    res.extend(upsert_batch(cur, [it], self.monthly_theme, self.campaign_id))
+                    conn.commit()
+                except Exception as e2:
+                    conn.rollback(); failed+=1
+                    print(f"❌ {os.path.basename(it['path'])} -> {e2}")
+        n_ins=sum(1 for _,ins in res if ins)
+        self.inserted+=n_ins; self.updated+=len(res)-n_ins; self.failed+=failed
+        # dönmeyen satırlar: içeriği aynı (atlandı) ya da yazılamadı (failed)
+        self.skipped+=len(unique)-len(res)-failed
+        self.changed_ids.extend(tid for tid,_ in res)
+
+    def embed_changed(self):
+        if self.changed_ids:
+            # eklenen/değişen satırların vektörleri aynı çalıştırmada yenilenir
+            from training_embeddings import generate_embeddings_for_training
+            generate_embeddings_for_training(ids=self.changed_ids, conn=self.conn)
+
+    def progress(self):
+        return f"inserted={self.inserted}, updated={self.updated}, skipped={self.skipped}"
+
+    def summary(self):
+        return f"{self.progress()}, failed={self.failed}"
+
+    def close(self):
+        self.cur.close()
+
+def process_txt_dir(root_dir:str, campaign_id:str, monthly_theme:str,
+                    batch_size:int=500, workers:int=None, embed:bool=True):
+    conn=connect(); writer=TrainingWriter(conn, monthly_theme, campaign_id)
+    try:
+        ensure_schema(writer.cur); conn.commit()
+        batch=[]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for it in pool.map(parse_email, iter_txt_files(root_dir), chunksize=32):
+                if 'error' in it:
+                    writer.failed+=1; print(f"❌ {os.path.basename(it['path'])} -> {it['error']}")
+                    continue
+                batch.append(it)
+                if len(batch)>=batch_size:
+                    writer.write(batch); batch=[]
+                    print(f"⏳ {writer.progress()}")
+            if batch:
+                writer.write(batch)
+
+        if embed:
+            writer.embed_changed()
     finally:
-        cur.close(); conn.close()
-    print(f"\nSummary: inserted={inserted}, skipped={skipped}, failed={failed}")
+        writer.close(); conn.close()
+    print(f"\nSummary: {writer.summary()}")
 
 def main():
     ap=argparse.ArgumentParser(description="TXT e-posta içeriklerini training_content tablosuna yükler.")
     ap.add_argument('--dir', required=True)
     ap.add_argument('--campaign-id', required=True)
     ap.add_argument('--monthly-theme', default='Genel Bilgilendirme')
+    ap.add_argument('--batch-size', type=int, default=500)
+    ap.add_argument('--workers', type=int, default=None, help="ayrıştırma process sayısı (varsayılan: CPU sayısı)")
+    ap.add_argument('--no-embed', action='store_true', help="eklenen/değişen satırları embed etme")
     args=ap.parse_args()
     if not os.path.isdir(args.dir): raise SystemExit(f"Dizin bulunamadı: {args.dir}")
-    process_txt_dir(args.dir, args.campaign_id, args.monthly_theme)
+    process_txt_dir(args.dir, args.campaign_id, args.monthly_theme,
+                    batch_size=args.batch_size, workers=args.workers, embed=not args.no_embed)
 
 if __name__=='__main__': main()
@@ -0,0 +1,280 @@
+# kb/ingest/encoder.py
+"""
+Uzunluk kovalı (length-bucketed) encode.
+
+Girdiler tek fast-tokenizer çağrısıyla ölçülür, uzundan kısaya sıralanır ve
+sabit adet yerine padding'li token bütçesine göre gruplanır:
+  batch boyu * en uzun girdi <= token_budget
+Böylece kısa chunk'lar büyük, uzun chunk'lar küçük batch'lerde işlenir;
+padding'e harcanan hesap azalır. Sonuçlar orijinal sıraya geri konur.
+
+Bütçe ENCODE_TOKEN_BUDGET ile verilebilir; verilmezse mevcut CPU'da kısa bir
+kalibrasyonla (birkaç aday bütçe, token/s) seçilir ve model + CPU + thread
+sayısı anahtarıyla dosyaya yazılır, sonraki çalıştırmalar tekrar ölçmez.
+
+Kullanım:
+  from encoder import encoder_for
+  vecs = encoder_for(model).encode(texts, normalize_embeddings=True)
+
+  python kb/ingest/encoder.py --model intfloat/multilingual-e5-large   # kalibrasyon
+
+Toplu yeniden index'te tek torch sürecinin intra-op thread'leri çekirdekleri
+doldurmaz; EncoderPool aynı arayüzle N süreç (her biri cpu/N thread) kullanır:
+  with EncoderPool(MODEL_NAME, procs=4) as pool:
+      vecs = pool.encode(texts)                      # parçalara bölünür, sıra korunur
+      for batch, result in pool.imap(batches, texts_of):
+          write(batch, result())                     # DB yazarken sonraki batch'ler encode edilir
+"""
+import os
+import json
+import time
+import random
+import argparse
+import platform
+import multiprocessing as mp
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+TOKEN_BUDGET = int(os.getenv("ENCODE_TOKEN_BUDGET", "0"))      # 0 = kalibrasyonla seç
+MAX_BATCH = int(os.getenv("ENCODE_MAX_BATCH", "256"))
+CANDIDATE_BUDGETS = (2048, 4096, 8192, 16384, 32768)
+CALIBRATION_FILE = os.getenv(
+    "ENCODE_CALIBRATION_FILE",
+    str(Path(__file__).resolve().parent.parent / "data" / "encoder_calibration.json"),
+)
+
+_WORDS = ("fiyat revize ekranında onay talebi mağaza ürün kategori sezon indirim kampanya "
+          "psikolojik yurt dışı devir raporu seçilir kaydedilir kontrol edilir").split()
+
+
+def _model_name(model) -> str:
+    try:
+        cfg = model[0].auto_model.config
+        return f"{os.path.basename(str(cfg._name_or_path).rstrip('/'))}:{cfg.hidden_size}x{cfg.num_hidden_layers}"
+    except Exception:
+        return type(model).__name__
+
+
+def _host_key(model) -> str:
+    try:
+        import torch
+        threads = torch.get_num_threads()
+    except ImportError:
+        threads = 0
+    return f"{_model_name(model)}|{platform.processor() or platform.machine()}|cpu{os.cpu_count()}|t{threads}"
+
+
+class BucketEncoder:
+    """SentenceTransformer sarmalayıcı: token bütçeli, uzunluk sıralı batch'ler."""
+
+    def __init__(self, model, token_budget: Optional[int] = None, max_batch: int = MAX_BATCH):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_len = int(getattr(model, "max_seq_length", 512) or 512)
+        self.token_budget = token_budget or TOKEN_BUDGET or self.tuned_budget()
+
+    # ---------- ölçüm ----------
+    def lengths(self, texts: Sequence[str]) -> np.ndarray:
+        """Özel token'lar dahil, max_seq_length'e kırpılmış token sayıları (tek tokenizer çağrısı)."""
+        enc = self.model.tokenizer(list(texts), add_special_tokens=True, truncation=True,
+                                   max_length=self.max_len, return_attention_mask=False,
+                                   return_token_type_ids=False)
+        return np.fromiter((len(ids) for ids in enc["input_ids"]), dtype=np.int64, count=len(texts))
+
+    def buckets(self, lengths: np.ndarray, budget: Optional[int] = None) -> List[np.ndarray]:
+        """Uzundan kısaya sıralı indeks grupları; her grupta adet * en uzun <= budget."""
+        budget = budget or self.token_budget
+        order = np.argsort(-lengths, kind="stable")
+        out, start = [], 0
+        while start < len(order):
+            longest = max(int(lengths[order[start]]), 1)
+            size = max(1, min(self.max_batch, budget // longest))
+            out.append(order[start:start + size])
+            start += size
+        return out
+
+    # ---------- encode ----------
+    def encode(self, texts: Sequence[str], budget: Optional[int] = None, **kw) -> np.ndarray:
+        """model.encode ile aynı çıktı (np.ndarray, orijinal sıra); batch'ler token bütçesiyle."""
+        texts = list(texts)
+        if not texts:
+            dim = self.model.get_sentence_embedding_dimension()
+            return np.empty((0, dim), dtype=np.float32)
+        kw.setdefault("show_progress_bar", False)
+        kw["convert_to_numpy"] = True
+        out = None
+        for idx in self.buckets(self.lengths(texts), budget):
+            vecs = self.model.encode([texts[i] for i in idx], batch_size=len(idx), **kw)
+            if out is None:
+                out = np.empty((len(texts), vecs.shape[1]), dtype=vecs.dtype)
+            out[idx] = vecs
+        return out
+
+    def imap(self, batches: Iterable, texts_of: Callable, **kw) -> Iterator[Tuple[object, Callable]]:
+        """EncoderPool.imap ile aynı arayüz; encode, result() çağrıldığında yapılır."""
+        for batch in batches:
+            yield batch, (lambda texts=texts_of(batch): self.encode(texts, **kw))
+
+    # ---------- kalibrasyon ----------
+    def calibrate(self, candidates: Sequence[int] = CANDIDATE_BUDGETS, n_texts: int = 96,
+                  seed: int = 0) -> Dict[int, float]:
+        """Karışık uzunlukta sentetik metinlerle aday bütçeleri ölç: {bütçe: token/s}."""
+        rng = random.Random(seed)
+        texts = [" ".join(rng.choices(_WORDS, k=rng.choice((8, 24, 60, 120, 250, 400))))
+                 for _ in range(n_texts)]
+        real_tokens = int(self.lengths(texts).sum())
+        self.encode(texts[:8], budget=candidates[0])          # ısınma
+        result = {}
+        for budget in candidates:
+            t0 = time.perf_counter()
+            self.encode(texts, budget=budget)
+            result[budget] = real_tokens / (time.perf_counter() - t0)
+        return result
+
+    def tuned_budget(self, force: bool = False) -> int:
+        """Kayıtlı kalibrasyon sonucu; yoksa (ya da force) ölç ve kaydet."""
+        key = _host_key(self.model)
+        try:
+            with open(CALIBRATION_FILE, encoding="utf-8") as f:
+                saved = json.load(f)
+        except (FileNotFoundError, ValueError):
+            saved = {}
+        if key in saved and not force:
+            return int(saved[key]["budget"])
+
+        self.token_budget = CANDIDATE_BUDGETS[0]
+        t0 = time.perf_counter()
+        scores = self.calibrate()
+        best = max(scores, key=scores.get)
+        print(f"ℹ️  encoder kalibrasyonu ({time.perf_counter() - t0:.1f}s): "
+              + ", ".join(f"{b}={s:.0f} tok/s" for b, s in scores.items()) + f" -> {best}")
+        saved[key] = {"budget": best, "tokens_per_sec": round(scores[best], 1)}
+        os.makedirs(os.path.dirname(CALIBRATION_FILE), exist_ok=True)
+        tmp = f"{CALIBRATION_FILE}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(saved, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, CALIBRATION_FILE)
+        return best
+
+
+_encoders: Dict[int, BucketEncoder] = {}
+
+
+def encoder_for(model) -> BucketEncoder:
+    """Model başına tek BucketEncoder (kalibrasyon bir kez)."""
+    enc = _encoders.get(id(model))
+    if enc is None or enc.model is not model:
+        enc = _encoders[id(model)] = BucketEncoder(model)
+    return enc
+
+
+# ---------- çok süreçli encode ----------
+_pool_encoder: Optional[BucketEncoder] = None
+
+
+def _pool_init(model_name: str, threads: int, max_seq_length: Optional[int], token_budget: Optional[int],
+               calibration_lock):
+    global _pool_encoder
+    import torch
+    torch.set_num_threads(threads)
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(model_name, device="cpu")
+    if max_seq_length:
+        model.max_seq_length = max_seq_length
+    if not (token_budget or TOKEN_BUDGET):
+        # Kilidi ilk alan süreç (kayıt yoksa) tek başına ölçüp kaydeder; diğerleri aynı
+        # anahtarla (model + thread sayısı) kaydı okur, ölçümler CPU için yarışmaz
+        with calibration_lock:
+            token_budget = BucketEncoder(model, token_budget=CANDIDATE_BUDGETS[0]).tuned_budget()
+    _pool_encoder = BucketEncoder(model, token_budget=token_budget)
+
+
+def _pool_encode(texts: List[str], kw: Dict) -> np.ndarray:
+    return _pool_encoder.encode(texts, **kw)
+
+
+def _pool_dimension() -> int:
+    return _pool_encoder.model.get_sentence_embedding_dimension()
+
+
+class EncoderPool:
+    """
+    N encoder süreci; her biri modeli bir kez yükler, torch thread sayısı
+    threads (varsayılan cpu/N) ile sınırlıdır. BucketEncoder ile aynı
+    encode/imap arayüzü. token_budget verilmezse bu thread sayısı için
+    kalibre edilmiş bütçe kullanılır; kayıt yoksa tek bir süreç ölçer, diğerleri
+    onu bekler. İş bitince close() (ya da with) ile kapatın.
+    """
+
+    def __init__(self, model_name: str, procs: int, threads: Optional[int] = None,
+                 max_seq_length: Optional[int] = None, token_budget: Optional[int] = None):
+        self.procs = procs
+        self.threads = threads or max(1, (os.cpu_count() or 1) // procs)
+        # torch + fork güvenli değil; spawn ile her süreç temiz başlar
+        ctx = mp.get_context("spawn")
+        self.executor = ProcessPoolExecutor(
+            max_workers=procs, mp_context=ctx, initializer=_pool_init,
+            initargs=(model_name, self.threads, max_seq_length, token_budget, ctx.Lock()),
+        )
+        self._dimension = None
+
+    @property
+    def dimension(self) -> int:
+        if self._dimension is None:
+            self._dimension = self.executor.submit(_pool_dimension).result()
+        return self._dimension
+
+    def encode(self, texts: Sequence[str], **kw) -> np.ndarray:
+        """Metinleri süreç sayısının iki katı parçaya böl, sonuçları sırayla birleştir."""
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        step = -(-len(texts) // (self.procs * 2))
+        shards = [texts[i:i + step] for i in range(0, len(texts), step)]
+        return np.concatenate(list(self.executor.map(_pool_encode, shards, [kw] * len(shards))))
+
+    def imap(self, batches: Iterable, texts_of: Callable, depth: Optional[int] = None,
+             **kw) -> Iterator[Tuple[object, Callable]]:
+        """
+        (batch, result) çiftlerini giriş sırasıyla üret; result() vektörleri
+        döndürür (encode hatası orada yükselir). Arkada depth (varsayılan
+        2*procs) batch encode edilmeye devam eder, çağıran bu sırada DB'ye yazar.
+        """
+        depth = depth or self.procs * 2
+        pending = deque()
+        for batch in batches:
+            pending.append((batch, self.executor.submit(_pool_encode, texts_of(batch), kw).result))
+            if len(pending) >= depth:
+                yield pending.popleft()
+        while pending:
+            yield pending.popleft()
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Token bütçesi kalibrasyonu")
+    ap.add_argument("--model", default=os.getenv("HF_EMBED_MODEL", "intfloat/multilingual-e5-large"))
+    ap.add_argument("--max-seq-length", type=int, default=512)
+    args = ap.parse_args()
+
+    from sentence_transformers import SentenceTransformer
+    model = SentenceTransformer(args.model)
+    model.max_seq_length = args.max_seq_length
+    enc = BucketEncoder(model, token_budget=CANDIDATE_BUDGETS[0])
+    best = enc.tuned_budget(force=True)
+    print(f"✅ {_host_key(model)} -> token_budget={best} ({CALIBRATION_FILE})")
+
+if __name__ == "__main__":
+    main()
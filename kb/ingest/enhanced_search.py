@@ -1,6 +1,6 @@
 import os
 import psycopg2
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import List, Optional
 
 @dataclass
@@ -15,6 +15,7 @@ class EnhancedSearchResult:
     related_screens: List[str]
     tags: List[str]
     estimated_duration: Optional[int] = None
+    source_pages: List[int] = field(default_factory=list)
 
 def _conn():
     return psycopg2.connect(
@@ -29,9 +30,21 @@ def unified_search(query: str, limit: int = 20) -> List[EnhancedSearchResult]:
     conn = _conn(); cur = conn.cursor()
     try:      
         q = f"%{query}%"
-        
+
+        # Tekrar eden bölümler bir kez saklanır; diğer kaynak sayfalar section_sources'ta
+        cur.execute("SELECT to_regclass('section_sources')")
+        if cur.fetchone()[0]:
+            doc_sections = """
+              SELECT document_id, id AS section_id, page_number FROM document_sections
+              UNION
+              SELECT document_id, section_id, page_number FROM section_sources"""
+        else:
+            doc_sections = "SELECT document_id, id AS section_id, page_number FROM document_sections"
+
         sql = """
-        WITH unified_content AS (
+        WITH doc_sections AS (""" + doc_sections + """
+        ),
+        unified_content AS (
           SELECT 
             d.id as content_id,
             d.title,
@@ -45,9 +58,11 @@ def unified_search(query: str, limit: int = 20) -> List[EnhancedSearchResult]:
             ) as score,
             ARRAY[]::text[] as related_screens,
             COALESCE(array_agg(DISTINCT dk.keyword), ARRAY[]::text[]) as tags,
-            NULL::integer as estimated_duration
+            NULL::integer as estimated_duration,
+            array_remove(array_agg(DISTINCT x.page_number ORDER BY x.page_number), NULL) as source_pages
           FROM documents d
-          LEFT JOIN document_sections ds ON d.id = ds.document_id
+          LEFT JOIN doc_sections x ON x.document_id = d.id
+          LEFT JOIN document_sections ds ON ds.id = x.section_id
           LEFT JOIN document_keywords dk ON d.id = dk.document_id
           WHERE d.status = 'active'
             AND (
@@ -73,7 +88,8 @@ def unified_search(query: str, limit: int = 20) -> List[EnhancedSearchResult]:
             END as score,
             COALESCE(tc.related_screens, ARRAY[]::text[]) as related_screens,
             COALESCE(tc.tags, ARRAY[]::text[]) as tags,
-            tc.estimated_duration_minutes as estimated_duration
+            tc.estimated_duration_minutes as estimated_duration,
+            ARRAY[]::int[] as source_pages
           FROM training_content tc
           WHERE tc.status = 'active'
             AND (tc.title ILIKE %s OR tc.description ILIKE %s OR %s = ANY(tc.tags))
@@ -99,7 +115,8 @@ def unified_search(query: str, limit: int = 20) -> List[EnhancedSearchResult]:
                 score=float(r[6] or 0.0),
                 related_screens=r[7] or [],
                 tags=r[8] or [],
-                estimated_duration=r[9]
+                estimated_duration=r[9],
+                source_pages=r[10] or []
             ))
         return res
     finally:
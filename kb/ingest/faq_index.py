@@ -0,0 +1,320 @@
+# kb/ingest/faq_index.py
+"""
+Sentetik soru index'i (faq_questions): çevrimdışı üretilen soru → cevap çiftleri.
+
+Her rag_documents chunk'ı ve aktif training_content için kullanıcıların
+sorabileceği sorular üretilir, cevapları önceden hazırlanır ve soruların
+embedding'leri HNSW index'li faq_questions tablosuna yazılır. chat_unified
+sorgu embedding'iyle önce bu tabloya bakar; yeterince yakın bir soru varsa
+kayıtlı cevabı döner (retrieval ve LLM atlanır). LLM maliyeti istek anından
+ingest anına taşınır.
+
+Sorular (--questions):
+  template  bölüm başlığından şablonlar ("X nedir?", "X nasıl yapılır?")
+  llm       llm_backend ile kaynak başına N soru; boş dönerse şablonlar
+Cevaplar (--answers):
+  llm         soru + tek kaynak, chat() ile aynı mesajlar (prompts.build_messages)
+  extractive  kaynağın kendisinden şablon, LLM'siz
+Adımlı eğitim içeriklerinin cevabı her zaman prompts.extractive_answer'dır.
+LLM çağrıları --workers thread ile eşzamanlı gider (llm_backend uçlar
+arasında dağıtır).
+
+Artımlı çalışır: kaynak metni + üretim ayarları source_hash'te tutulur;
+değişmeyen kaynaklar atlanır, değişenlerin soruları silinip yeniden üretilir.
+Silinen kaynakların soruları FK ile gider. Ingest / PDF yüklemesi sonrası
+(ya da cron ile) çalıştırın. Arada değişen ya da pasife alınan kaynakların
+soruları eşleşme anında elenir: her satır kaynak metninin SQL'de hesaplanan
+özetini (source_md5) taşır, chat_unified bunu kaynağın güncel satırıyla
+karşılaştırır.
+
+Kullanım:
+  python kb/ingest/faq_index.py                          # şablon sorular, LLM cevaplar
+  python kb/ingest/faq_index.py --questions llm --workers 8
+  python kb/ingest/faq_index.py --sources training --answers extractive
+  python kb/ingest/faq_index.py --limit 5 --dry-run      # yazmadan örnek göster
+  python kb/ingest/faq_index.py --rebuild
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import argparse
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+import psycopg2
+from sentence_transformers import SentenceTransformer
+
+import llm_backend
+from encoder import encoder_for
+from pg_copy import copy_rows
+from prompts import LLM_OPTIONS, build_messages, extractive_answer, format_context
+
+DB = dict(
+    host=os.getenv("DB_HOST", "localhost"),
+    port=int(os.getenv("DB_PORT", "5432")),
+    dbname=os.getenv("DB_NAME", "kb"),
+    user=os.getenv("DB_USER", "troy"),
+    password=os.getenv("DB_PASSWORD", "troy1234"),
+)
+MODEL_NAME = "intfloat/multilingual-e5-small"      # chat_unified sorguları da bununla encode edilir
+SCHEMA_FILE = Path(__file__).resolve().parent.parent / "schema" / "20251022_faq_questions.sql"
+
+QUESTIONS_PER_SOURCE = int(os.getenv("FAQ_QUESTIONS", "3"))
+WORKERS = int(os.getenv("FAQ_WORKERS", "4"))
+BATCH_SIZE = int(os.getenv("FAQ_BATCH", "32"))      # kaynak; her grup tek COPY + commit
+
+DOCUMENT_TEMPLATES = ("{t} nedir?", "{t} hakkında bilgi verir misin?", "{t} nasıl yapılır?")
+TRAINING_TEMPLATES = ("{t} nasıl yapılır?", "{t} adımları nelerdir?", "{t} nedir?")
+
+# Soru üretimi de sabit system mesajı + kaynak düzeninde (önek önbelleği)
+QUESTION_SYSTEM_PROMPT = """Sen Troy ekranı kullanıcılarının sorabileceği soruları yazan bir asistansın.
+
+Kurallar:
+- Soruları SADECE verilen kaynağa göre yaz; kaynak bu soruları cevaplayabilmeli
+- Her satıra bir soru yaz; numara, madde işareti ya da açıklama ekleme
+- Kısa, günlük dilde ve Türkçe yaz"""
+
+_NUMBERING = re.compile(r"^\s*\d+(?:\.\d+)*\.?\s+")
+_BULLET = re.compile(r"^\s*(?:\d+\s*[.)-]|[-*•])\s*")
+
+COLUMNS = ("source_type", "chunk_id", "training_id", "source_hash", "source_md5", "question", "answer",
+           "sources", "generator", "embedding")
+TYPES = ("text", "text", "int8", "text", "text", "text", "text", "jsonb", "text", "vector")
+
+# Cevabın dayandığı kaynak alanlarının özeti (rd: rag_documents, tc: training_content).
+# chat_unified.FAQ_SQL aynı ifadelerle güncel satırı hesaplar; ikisi birlikte değişmeli.
+DOCUMENT_MD5_SQL = "md5(concat_ws(E'\\x1f', rd.file_name, rd.section_title, rd.content, rd.page_start::text))"
+TRAINING_MD5_SQL = "md5(concat_ws(E'\\x1f', tc.title, tc.description, array_to_string(tc.step_by_step, E'\\x1e')))"
+
+
+def ensure_schema(cur):
+    cur.execute(SCHEMA_FILE.read_text(encoding="utf-8"))
+
+
+# =========================
+# Kaynaklar
+# =========================
+def load_sources(cur, kinds: List[str], limit: int = 0) -> List[Dict]:
+    """Kaynaklar retrieve_unified_context biçiminde (format_context ile aynı alanlar)"""
+    out = []
+    lim = f"LIMIT {int(limit)}" if limit else ""
+    if "documents" in kinds:
+        cur.execute(f"""
+            SELECT rd.chunk_id, rd.file_name, rd.section_title, rd.content, rd.page_start, {DOCUMENT_MD5_SQL}
+            FROM rag_documents rd
+            ORDER BY rd.chunk_id {lim}
+        """)
+        out += [
+            {"type": "document", "chunk_id": r[0], "file": r[1], "title": r[2] or r[1],
+             "section": r[2], "content": r[3], "page": r[4], "source_md5": r[5]}
+            for r in cur.fetchall()
+        ]
+    if "training" in kinds:
+        cur.execute(f"""
+            SELECT tc.id, tc.title, tc.description, tc.step_by_step, tc.tags, {TRAINING_MD5_SQL}
+            FROM training_content tc
+            WHERE tc.status = 'active'
+            ORDER BY tc.id {lim}
+        """)
+        out += [
+            {"type": "training", "id": r[0], "title": r[1], "content": r[2] or "",
+             "steps": r[3] or [], "tags": r[4] or [], "source_md5": r[5]}
+            for r in cur.fetchall()
+        ]
+    return out
+
+
+def source_key(ctx: Dict) -> Tuple[str, str]:
+    return (ctx["type"], str(ctx["chunk_id"] if ctx["type"] == "document" else ctx["id"]))
+
+
+def source_hash(ctx: Dict, generator: str, n: int) -> str:
+    raw = json.dumps([generator, n, ctx["title"], ctx.get("content"), ctx.get("steps"), ctx.get("page"),
+                      ctx["source_md5"]], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def existing_hashes(cur) -> Dict[Tuple[str, str], set]:
+    cur.execute("""
+        SELECT source_type, COALESCE(chunk_id, training_id::text), source_hash
+        FROM faq_questions
+        GROUP BY 1, 2, 3
+    """)
+    out = {}
+    for t, sid, h in cur.fetchall():
+        out.setdefault((t, sid), set()).add(h)
+    return out
+
+
+# =========================
+# Soru / cevap üretimi
+# =========================
+def clean_title(title: str) -> str:
+    return _NUMBERING.sub("", title or "").strip().rstrip(":.")
+
+
+def template_questions(ctx: Dict, n: int) -> List[str]:
+    if ctx["type"] == "document" and not ctx.get("section"):
+        return []               # dosya adından soru kurulmaz
+    t = clean_title(ctx["title"])
+    if not t:
+        return []
+    templates = DOCUMENT_TEMPLATES if ctx["type"] == "document" else TRAINING_TEMPLATES
+    return [tpl.format(t=t) for tpl in templates[:n]]
+
+
+def parse_questions(text: str, n: int) -> List[str]:
+    out, seen = [], set()
+    for line in text.splitlines():
+        q = _BULLET.sub("", line).strip().strip('"').strip()
+        if len(q) < 8 or not q.endswith("?"):
+            continue
+        if q.casefold() in seen:
+            continue
+        seen.add(q.casefold())
+        out.append(q)
+    return out[:n]
+
+
+def llm_questions(ctx: Dict, n: int) -> List[str]:
+    response = llm_backend.chat(messages=[
+        {'role': 'system', 'content': QUESTION_SYSTEM_PROMPT},
+        {'role': 'user', 'content': f"Kaynak:\n{format_context([ctx])}\n{n} soru yaz."},
+    ], options=LLM_OPTIONS)
+    return parse_questions(response['message']['content'], n)
+
+
+def document_answer(ctx: Dict) -> str:
+    """Döküman chunk'ından şablon cevap (LLM'siz)"""
+    page = f", Sayfa {ctx['page']}" if ctx.get("page") else ""
+    return f"{ctx['title']}\n\n{ctx['content'].strip()}\n\n(Kaynak 1: Döküman - {ctx['title']}{page})"
+
+
+def llm_answer(question: str, ctx: Dict) -> str:
+    response = llm_backend.chat(messages=build_messages(question, [ctx]), options=LLM_OPTIONS)
+    return response['message']['content'].strip()
+
+
+def build_source(ctx: Dict, questions_mode: str, answers_mode: str, n: int) -> List[Tuple[str, str]]:
+    """Bir kaynağın (soru, cevap) çiftleri"""
+    questions = llm_questions(ctx, n) if questions_mode == "llm" else []
+    if not questions:
+        questions = template_questions(ctx, n)
+    if not questions:
+        return []
+
+    if ctx["type"] == "training" and (ctx["steps"] or answers_mode == "extractive"):
+        return [(q, extractive_answer(ctx)) for q in questions]
+    if answers_mode == "extractive":
+        return [(q, document_answer(ctx)) for q in questions]
+    return [(q, llm_answer(q, ctx)) for q in questions]
+
+
+def stored_sources(ctx: Dict) -> List[Dict]:
+    """Cevapla dönecek kaynak listesi (similarity eşleşme anında eklenir)"""
+    return [{"type": ctx["type"], "title": ctx["title"], "page": ctx.get("page"), "tags": ctx.get("tags")}]
+
+
+# =========================
+# Ana akış
+# =========================
+def main():
+    ap = argparse.ArgumentParser(description="Sentetik soru index'i (faq_questions) üret")
+    ap.add_argument("--sources", default="documents,training", help="documents,training")
+    ap.add_argument("--questions", choices=("template", "llm"), default="template")
+    ap.add_argument("--answers", choices=("llm", "extractive"), default="llm")
+    ap.add_argument("-n", "--per-source", type=int, default=QUESTIONS_PER_SOURCE, help="kaynak başına soru")
+    ap.add_argument("--workers", type=int, default=WORKERS, help="eşzamanlı LLM isteği")
+    ap.add_argument("--limit", type=int, default=0, help="tür başına en çok kaynak (deneme için)")
+    ap.add_argument("--rebuild", action="store_true", help="tüm index'i silip baştan üret")
+    ap.add_argument("--dry-run", action="store_true", help="yazmadan örnek soru/cevap göster")
+    args = ap.parse_args()
+
+    kinds = [k.strip() for k in args.sources.split(",") if k.strip()]
+    generator = f"questions={args.questions},answers={args.answers}"
+
+    conn = psycopg2.connect(**DB)
+    cur = conn.cursor()
+    ensure_schema(cur)
+    if not args.dry_run:
+        if args.rebuild:
+            cur.execute("TRUNCATE faq_questions")
+        # Pasife alınan eğitim içeriklerinin soruları da gitsin
+        cur.execute("""
+            DELETE FROM faq_questions f
+            USING training_content tc
+            WHERE f.training_id = tc.id AND tc.status <> 'active'
+        """)
+    conn.commit()
+
+    sources = load_sources(cur, kinds, args.limit)
+    existing = existing_hashes(cur)
+    todo = []
+    for ctx in sources:
+        h = source_hash(ctx, generator, args.per_source)
+        if existing.get(source_key(ctx)) != {h}:
+            todo.append((ctx, h))
+    print(f"📊 {len(sources)} kaynak, {len(todo)} yeni/değişmiş ({generator}, kaynak başına {args.per_source} soru)")
+    if not todo:
+        print("✅ FAQ index güncel")
+        return
+
+    model = None if args.dry_run else SentenceTransformer(MODEL_NAME)
+    written, failed, t0 = 0, 0, time.time()
+
+    def work(item):
+        ctx, h = item
+        try:
+            return ctx, h, build_source(ctx, args.questions, args.answers, args.per_source), None
+        except llm_backend.LLMError as e:
+            return ctx, h, [], e
+
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        for i in range(0, len(todo), BATCH_SIZE):
+            results = list(pool.map(work, todo[i:i + BATCH_SIZE]))
+            rows = []
+            done_docs, done_training = [], []
+            for ctx, h, pairs, error in results:
+                if error is not None:
+                    failed += 1
+                    print(f"❌ {source_key(ctx)} {ctx['title'][:60]}: {error}")
+                    continue
+                (done_docs if ctx["type"] == "document" else done_training).append(
+                    ctx["chunk_id"] if ctx["type"] == "document" else ctx["id"])
+                rows += [(ctx, h, q, a) for q, a in pairs]
+
+            if args.dry_run:
+                for ctx, _, q, a in rows[:2 * args.per_source]:
+                    print(f"\n❓ {q}\n💬 {a[:300]}")
+                print("\nℹ️  --dry-run: ilk grup gösterildi, yazılmadı")
+                return
+
+            vecs = encoder_for(model).encode([r[2] for r in rows]) if rows else []
+            # Kaynağın eski soruları, yenileri yazılmadan aynı transaction'da silinir
+            cur.execute("DELETE FROM faq_questions WHERE chunk_id = ANY(%s)", (done_docs,))
+            cur.execute("DELETE FROM faq_questions WHERE training_id = ANY(%s::bigint[])", (done_training,))
+            copy_rows(cur, "faq_questions", COLUMNS, TYPES, (
+                (ctx["type"],
+                 ctx["chunk_id"] if ctx["type"] == "document" else None,
+                 ctx["id"] if ctx["type"] == "training" else None,
+                 h, ctx["source_md5"], q, a, stored_sources(ctx), generator, vecs[j])
+                for j, (ctx, h, q, a) in enumerate(rows)
+            ))
+            conn.commit()
+            written += len(rows)
+            n_done = min(i + BATCH_SIZE, len(todo))
+            print(f"⏳ {n_done}/{len(todo)} kaynak, {written} soru ({n_done / (time.time() - t0):.2f} kaynak/s)")
+
+    cur.execute("SELECT COUNT(*) FROM faq_questions")
+    total = cur.fetchone()[0]
+    cur.close()
+    conn.close()
+    print(f"✅ {written} soru yazıldı, {failed} kaynak hatalı; index'te toplam {total} soru "
+          f"({time.time() - t0:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+# kb/ingest/index_manager.py
+"""
+Vektör index yaşam döngüsü.
+
+Toplu yüklemede vektör index'leri bırakılır/ertelenir, yükleme bitince satır
+sayısına göre boyutlanıp `CREATE INDEX CONCURRENTLY` ile yeniden kurulur.
+
+Kullanım:
+  python kb/ingest/index_manager.py report
+  python kb/ingest/index_manager.py drop  --table document_embeddings
+  python kb/ingest/index_manager.py build --table document_embeddings --method hnsw --m 16 --ef-construction 64
+  python kb/ingest/index_manager.py rebuild --table rag_documents --method hnsw
+"""
+import os
+import re
+import math
+import time
+import argparse
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+import psycopg2
+
+DB = dict(
+    host=os.getenv("DB_HOST", "localhost"),
+    port=int(os.getenv("DB_PORT", "5432")),
+    dbname=os.getenv("DB_NAME", "kb"),
+    user=os.getenv("DB_USER", "troy"),
+    password=os.getenv("DB_PASSWORD", "troy1234"),
+)
+
+INDEX_METHOD = os.getenv("VECTOR_INDEX_METHOD", "ivfflat")
+MAINTENANCE_WORK_MEM = os.getenv("INDEX_MAINTENANCE_WORK_MEM", "512MB")
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "64"))
+
+
+def db_connect():
+    conn = psycopg2.connect(**DB)
+    conn.autocommit = True  # CONCURRENTLY transaction içinde çalışmaz
+    return conn
+
+def ivfflat_lists(rows: int) -> int:
+    """pgvector önerisi: 1M satıra kadar rows/1000, üstünde sqrt(rows)."""
+    if rows <= 1_000_000:
+        return max(1, rows // 1000)
+    return int(math.sqrt(rows))
+
+def index_name(table: str, column: str, method: str) -> str:
+    return f"idx_{table.split('.')[-1]}_{column}_{method}"
+
+def vector_indexes(cur, table: str) -> List[Dict]:
+    """Tablodaki ivfflat/hnsw index'leri; kolon ve operatör sınıfı ilk anahtardan okunur."""
+    cur.execute("""
+        SELECT i.indexrelid::regclass::text, am.amname, i.indisvalid,
+               pg_relation_size(i.indexrelid), a.attname, opc.opcname,
+               pg_get_indexdef(i.indexrelid)
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_am am ON am.oid = c.relam
+        LEFT JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+        LEFT JOIN pg_opclass opc ON opc.oid = i.indclass[0]
+        WHERE i.indrelid = to_regclass(%s) AND am.amname IN ('ivfflat', 'hnsw')
+        ORDER BY 1
+    """, (table,))
+    return [dict(name=r[0], method=r[1], valid=r[2], size=r[3], column=r[4], ops=r[5], ddl=r[6])
+            for r in cur.fetchall()]
+
+def matching_indexes(cur, table: str, column: str = "embedding",
+                     ops: str = "vector_cosine_ops") -> List[Dict]:
+    """Aynı kolon + operatör sınıfındaki vektör index'leri (l2 index'i cosine sorguya yaramaz)."""
+    return [ix for ix in vector_indexes(cur, table) if ix["column"] == column and ix["ops"] == ops]
+
+def has_vector_index(cur, table: str, column: str = "embedding",
+                     ops: str = "vector_cosine_ops") -> bool:
+    return any(ix["valid"] for ix in matching_indexes(cur, table, column, ops))
+
+def vector_index_defs(cur, table: str) -> List[Tuple[str, str]]:
+    """Geçerli vektör index'lerinin (ad, CREATE INDEX tanımı) listesi."""
+    return [(ix["name"], ix["ddl"]) for ix in vector_indexes(cur, table) if ix["valid"]]
+
+def restore_vector_indexes(cur, defs: List[Tuple[str, str]], rows: Optional[int] = None,
+                           maintenance_work_mem: str = MAINTENANCE_WORK_MEM) -> List[str]:
+    """
+    Bırakılan index'leri aynı ad ve tanımla geri kur; kurulamayanların adlarını döndür.
+    rows verilirse ivfflat lists değeri yeni satır sayısına göre yeniden hesaplanır.
+    """
+    failed = []
+    cur.execute("SET maintenance_work_mem = %s", (maintenance_work_mem,))
+    for name, ddl in defs:
+        ddl = ddl.replace("CREATE INDEX ", "CREATE INDEX CONCURRENTLY IF NOT EXISTS ", 1)
+        if rows:
+            ddl = re.sub(r"lists\s*=\s*'?\d+'?", f"lists='{ivfflat_lists(rows)}'", ddl)
+        try:
+            cur.execute(ddl)
+            print(f"♻️  index geri kuruldu: {name}")
+        except psycopg2.Error as e:
+            failed.append(name)
+            print(f"❌ index geri kurulamadı: {name}: {e}")
+    cur.execute("RESET maintenance_work_mem")
+    return failed
+
+def drop_vector_indexes(cur, table: str) -> List[str]:
+    dropped = []
+    for ix in vector_indexes(cur, table):
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {ix['name']}")
+        dropped.append(ix["name"])
+    return dropped
+
+def build_vector_index(cur, table: str, column: str = "embedding", ops: str = "vector_cosine_ops",
+                       method: str = INDEX_METHOD, m: int = HNSW_M,
+                       ef_construction: int = HNSW_EF_CONSTRUCTION,
+                       maintenance_work_mem: str = MAINTENANCE_WORK_MEM,
+                       name: Optional[str] = None) -> Optional[Dict]:
+    """Index'i satır sayısına göre kur; geçersiz (yarım kalmış) kopyayı önce sil."""
+    cur.execute(f"SELECT COUNT(*) FROM {table}")
+    rows = cur.fetchone()[0]
+    if rows == 0:
+        print(f"ℹ️  {table} boş, vektör index'i ertelendi")
+        return None
+
+    if method == "hnsw":
+        params = f"m = {m}, ef_construction = {ef_construction}"
+    else:
+        params = f"lists = {ivfflat_lists(rows)}"
+    name = name or index_name(table, column, method)
+
+    for ix in vector_indexes(cur, table):
+        if ix["name"].split(".")[-1] == name and not ix["valid"]:
+            cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {ix['name']}")
+
+    cur.execute("SET maintenance_work_mem = %s", (maintenance_work_mem,))
+    t0 = time.time()
+    cur.execute(f"""
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS {name}
+        ON {table} USING {method} ({column} {ops}) WITH ({params})
+    """)
+    elapsed = time.time() - t0
+    cur.execute("RESET maintenance_work_mem")
+    cur.execute("SELECT pg_relation_size(%s::regclass)", (name,))
+    size = cur.fetchone()[0]
+    info = dict(name=name, method=method, params=params, rows=rows, size=size, seconds=elapsed)
+    print(f"✅ {name}: {method}({params}) rows={rows} size={size / 1e6:.1f}MB build={elapsed:.1f}s")
+    return info
+
+def ensure_vector_index(cur, table: str, column: str = "embedding",
+                        ops: str = "vector_cosine_ops", **kw) -> Optional[Dict]:
+    """Aynı kolon + operatör sınıfında geçerli bir vektör index'i yoksa kur."""
+    if has_vector_index(cur, table, column, ops):
+        return None
+    return build_vector_index(cur, table, column=column, ops=ops, **kw)
+
+def rebuild_vector_index(cur, table: str, column: str = "embedding", ops: str = "vector_cosine_ops",
+                         method: str = INDEX_METHOD, **kw) -> Optional[Dict]:
+    """
+    Aramayı kesmeden yeniden kur: yeni index'i geçici adla CONCURRENTLY kur,
+    aynı kolon + operatör sınıfındaki eskileri bırak, yenisini eski adına taşı
+    (idx_embeddings_vector gibi şema adları korunur; yoksa index_name kullanılır).
+    """
+    final = index_name(table, column, method)
+    generated = {index_name(table, column, mth) for mth in ("ivfflat", "hnsw")}
+    for ix in matching_indexes(cur, table, column, ops):
+        short = ix["name"].split(".")[-1]
+        if ix["valid"] and not short.endswith("_new") and short not in generated:
+            final = short
+            break
+    tmp = f"{final}_new"
+    cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {tmp}")
+    info = build_vector_index(cur, table, column=column, ops=ops, method=method, name=tmp, **kw)
+    if info is None:
+        return None
+    for ix in matching_indexes(cur, table, column, ops):
+        if ix["name"].split(".")[-1] != tmp:
+            cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {ix['name']}")
+    cur.execute(f"ALTER INDEX {tmp} RENAME TO {final}")
+    info["name"] = final
+    return info
+
+@contextmanager
+def bulk_load(table: str, defer: bool = True, **kw):
+    """
+    Toplu yükleme: girişte vektör index'lerini bırak (defer=True), çıkışta
+    aynı ad ve tanımlarla (ivfflat lists yeni satır sayısına göre) geri kur;
+    tabloda istenen kolon + operatör sınıfında index yoksa yenisini kur.
+    Yükleme hata (ya da Ctrl-C) ile biterse index'ler eski tanımlarıyla döner.
+    """
+    conn = db_connect()
+    try:
+        dropped = []
+        if defer:
+            with conn.cursor() as cur:
+                dropped = vector_index_defs(cur, table)
+                for name in drop_vector_indexes(cur, table):
+                    print(f"ℹ️  index bırakıldı (yükleme sonrası kurulacak): {name}")
+        try:
+            yield
+        except BaseException:
+            if dropped:
+                print(f"⚠️  yükleme yarıda kaldı, {table} index'leri geri kuruluyor...")
+                with conn.cursor() as cur:
+                    failed = restore_vector_indexes(cur, dropped)
+                if failed:
+                    print(f"❌ {table} vektör index'siz: python kb/ingest/index_manager.py build --table {table}")
+            raise
+        try:
+            with conn.cursor() as cur:
+                if dropped:
+                    cur.execute(f"SELECT COUNT(*) FROM {table}")
+                    rows = cur.fetchone()[0]
+                    mwm = kw.get("maintenance_work_mem", MAINTENANCE_WORK_MEM)
+                    for name in restore_vector_indexes(cur, dropped, rows=rows, maintenance_work_mem=mwm):
+                        print(f"❌ {name} geri kurulamadı; python kb/ingest/index_manager.py rebuild --table {table}")
+                ensure_vector_index(cur, table, **kw)
+        except psycopg2.Error as e:
+            print(f"❌ {table} vektör index'i kurulamadı ({e}); "
+                  f"python kb/ingest/index_manager.py build --table {table}")
+            raise
+    finally:
+        conn.close()
+
+def report(cur, tables: List[str]):
+    for table in tables:
+        cur.execute("SELECT to_regclass(%s)", (table,))
+        if cur.fetchone()[0] is None:
+            continue
+        cur.execute(f"SELECT COUNT(*) FROM {table}")
+        rows = cur.fetchone()[0]
+        print(f"{table}: rows={rows}")
+        for ix in vector_indexes(cur, table):
+            state = "" if ix["valid"] else " (INVALID)"
+            print(f"  - {ix['name']} [{ix['method']} {ix['column']} {ix['ops']}] size={ix['size'] / 1e6:.1f}MB{state}")
+
+def main():
+    ap = argparse.ArgumentParser(description="pgvector index yönetimi")
+    ap.add_argument("command", choices=["report", "drop", "build", "rebuild"])
+    ap.add_argument("--table", default="document_embeddings")
+    ap.add_argument("--column", default="embedding")
+    ap.add_argument("--ops", default="vector_cosine_ops")
+    ap.add_argument("--method", choices=["ivfflat", "hnsw"], default=INDEX_METHOD)
+    ap.add_argument("--m", type=int, default=HNSW_M)
+    ap.add_argument("--ef-construction", type=int, default=HNSW_EF_CONSTRUCTION)
+    ap.add_argument("--maintenance-work-mem", default=MAINTENANCE_WORK_MEM)
+    args = ap.parse_args()
+
+    conn = db_connect()
+    try:
+        with conn.cursor() as cur:
+            if args.command == "report":
+                report(cur, ["document_embeddings", "rag_documents", "training_embeddings"])
+                return
+            opts = dict(column=args.column, ops=args.ops, method=args.method, m=args.m,
+                        ef_construction=args.ef_construction,
+                        maintenance_work_mem=args.maintenance_work_mem)
+            if args.command == "drop":
+                for name in drop_vector_indexes(cur, args.table):
+                    print(f"🗑️  {name}")
+            elif args.command == "build":
+                build_vector_index(cur, args.table, **opts)
+            else:
+                rebuild_vector_index(cur, args.table, **opts)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
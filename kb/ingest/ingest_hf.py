@@ -3,10 +3,17 @@ from dataclasses import dataclass
 from typing import List, Tuple, Dict
 
 import psycopg2
-from psycopg2.extras import execute_values
-from pypdf import PdfReader
 from sentence_transformers import SentenceTransformer
 from transformers import AutoTokenizer
+import numpy as np
+
+from pg_copy import copy_sections, copy_embeddings
+from chunker import chunk_paragraphs
+from index_manager import bulk_load
+from encoder import encoder_for, EncoderPool
+from normalize import page_lines
+import pdf_text
+from pdf_text import extract_pages
 
 # ======= Config =======
 MODEL_NAME = os.getenv("HF_EMBED_MODEL", "intfloat/multilingual-e5-large")  # 1024-dim
@@ -28,22 +35,11 @@ def sha256(s: str) -> str:
     return hashlib.sha256(s.encode("utf-8")).hexdigest()
 
 def norm_spaces(s: str) -> str:
-    # satır sonu tire birleştirme: "yan-\nlış" -> "yanlış"
-    s = re.sub(r"-\n(?=\w)", "", s)
-    s = re.sub(r"[ \t]+", " ", s)
-    s = re.sub(r" ?\n ?", "\n", s)
-    return s.strip()
+    # satır sonu tire birleştirme ("yan-\nlış" -> "yanlış") + satır içi boşluklar, tek geçiş
+    return page_lines(s)
 
 def read_pdf_pages(pdf_path: str) -> List[Tuple[int, str]]:
-    r = PdfReader(pdf_path)
-    out = []
-    for i, p in enumerate(r.pages, start=1):
-        try:
-            t = p.extract_text() or ""
-        except Exception:
-            t = ""
-        out.append((i, norm_spaces(t)))
-    return out
+    return [(i, norm_spaces(t)) for i, t in enumerate(extract_pages(pdf_path), start=1)]
 
 @dataclass
 class Chunk:
@@ -51,32 +47,11 @@ class Chunk:
     page: int
     title: str
 
+_SENT_SPLIT = re.compile(r"(?<=[\.\!\?…])\s+")
+
 def token_chunks(text: str, tokenizer, target: int, maxi: int, overlap: int) -> List[str]:
-    paras = [p.strip() for p in re.split(r"\n{2,}", text) if p.strip()]
-    chunks, cur, cur_len = [], "", 0
-    for para in paras:
-        ids = tokenizer(para, add_special_tokens=False)["input_ids"]
-        n = len(ids)
-        if n > maxi:
-            sents = re.split(r"(?<=[\.\!\?…])\s+", para)
-            for s in sents:
-                s = s.strip()
-                if not s: continue
-                l = len(tokenizer(s, add_special_tokens=False)["input_ids"])
-                if cur_len + l > target:
-                    if cur: chunks.append(cur.strip())
-                    cur, cur_len = s, l
-                else:
-                    cur = (cur + " " + s).strip() if cur else s
-                    cur_len += l
-        else:
-            if cur_len + n > target:
-                if cur: chunks.append(cur.strip())
-                cur, cur_len = para, n
-            else:
-                cur = (cur + "\n\n" + para).strip() if cur else para
-                cur_len += n
-    if cur: chunks.append(cur.strip())
+    # sayfa tek seferde tokenize edilir; paragraf/cümle token sayıları offset'lerden gelir
+    chunks = chunk_paragraphs(text, tokenizer, target, maxi, sent_split=_SENT_SPLIT)
     # minimum kırıntıları at
     return [c for c in chunks if len(c.split()) >= 20]
 
@@ -91,7 +66,7 @@ def ensure_schema(cur, dim: int):
     cur.execute("""
     SELECT format_type(atttypid, atttypmod) AS typ
     FROM pg_attribute
-    WHERE attrelid='public.document_embeddings'::regclass
+    WHERE attrelid=to_regclass('public.document_embeddings')
       AND attname='embedding' AND NOT attisdropped
     """)
     row = cur.fetchone()
@@ -122,15 +97,8 @@ def ensure_schema(cur, dim: int):
             f"Tablo boşsa: DROP TABLE public.document_embeddings; sonra ingest’i tekrar çalıştırın."
         )
 
-    # cosine index
-    cur.execute("""
-    DO $$
-    BEGIN
-      IF NOT EXISTS (SELECT 1 FROM pg_indexes WHERE indexname='idx_embeddings_vector') THEN
-        CREATE INDEX idx_embeddings_vector
-        ON public.document_embeddings USING ivfflat (embedding vector_cosine_ops) WITH (lists = 100);
-      END IF;
-    END$$;""")
+    # vektör index'i burada kurulmaz: boş tabloda centroid'ler anlamsız olur,
+    # yükleme sonrası index_manager satır sayısına göre kurar
 
 
 def upsert_document(cur, meta) -> Tuple[int, bool]:
@@ -155,22 +123,16 @@ def upsert_document(cur, meta) -> Tuple[int, bool]:
           meta["department"], meta["document_code"], meta["version_number"], meta["content_hash"]))
     return cur.fetchone()[0], True
 
-def insert_sections_and_embeddings(cur, doc_id: int, chunks: List[Chunk], vectors: List[List[float]], model_name: str):
-    # sections
-    sec_ids = []
-    for ch in chunks:
-        cur.execute("""
-        INSERT INTO document_sections(document_id, section_title, content, page_number, word_count, content_hash)
-        VALUES (%s,%s,%s,%s,%s,%s) RETURNING id
-        """, (doc_id, ch.title, ch.text, ch.page, len(ch.text.split()), sha256(ch.text)))
-        sec_ids.append(cur.fetchone()[0])
-    # embeddings
-    def vec_lit(v): return "[" + ",".join(f"{x:.6f}" for x in v) + "]"
-    vals = [(sid, vec_lit(vec), model_name) for sid, vec in zip(sec_ids, vectors)]
-    execute_values(cur,
-        "INSERT INTO document_embeddings(section_id, embedding, model_name) VALUES %s",
-        vals, template="(%s, %s::vector, %s)"
+def insert_sections_and_embeddings(cur, doc_id: int, chunks: List[Chunk], vectors: np.ndarray, model_name: str):
+    # sections: id'ler önceden ayrılır, tek binary COPY ile yazılır (sıra korunur)
+    sec_ids = copy_sections(
+        cur,
+        ("document_id", "section_title", "content", "page_number", "word_count", "content_hash"),
+        ("int8", "text", "text", "int4", "int4", "text"),
+        [(doc_id, ch.title, ch.text, ch.page, len(ch.text.split()), sha256(ch.text)) for ch in chunks],
     )
+    # embeddings: NumPy buffer'ından doğrudan binary vector
+    copy_embeddings(cur, sec_ids, vectors, model_name)
 
 def extract_metadata(full_text: str, file_name: str, file_path: str) -> Dict:
     code = None
@@ -192,7 +154,7 @@ def extract_metadata(full_text: str, file_name: str, file_path: str) -> Dict:
         content_hash=sha256(full_text),
     )
 
-def run_one(pdf_path: str, model, tokenizer, dim: int) -> Tuple[int, int, bool]:
+def run_one(pdf_path: str, encoder, tokenizer, dim: int) -> Tuple[int, int, bool]:
     pages = read_pdf_pages(pdf_path)
     full_text = "\n\n".join(t for _, t in pages)
     meta = extract_metadata(full_text, os.path.basename(pdf_path), os.path.abspath(pdf_path))
@@ -210,7 +172,7 @@ def run_one(pdf_path: str, model, tokenizer, dim: int) -> Tuple[int, int, bool]:
         return (0, 0, False)
 
     texts = [c.text for c in chunks]
-    vecs = model.encode(texts, normalize_embeddings=True, convert_to_numpy=True, show_progress_bar=True).tolist()  # cosine için normalize
+    vecs = encoder.encode(texts, normalize_embeddings=True)  # cosine için normalize
 
     with connect() as conn:
         with conn.cursor() as cur:
@@ -225,26 +187,44 @@ def run_one(pdf_path: str, model, tokenizer, dim: int) -> Tuple[int, int, bool]:
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--dir", required=True, help="PDF klasörü (örn. kb/data/docs)")
+    ap.add_argument("--defer-index", action="store_true",
+                    help="yükleme boyunca vektör index'ini bırak, sonunda yeniden kur")
+    ap.add_argument("--embed-procs", type=int, default=1, help="encoder süreç sayısı (her biri cpu/N thread)")
     args = ap.parse_args()
 
+    max_seq_length = int(os.getenv("MAX_SEQ_LENGTH", "510"))
     print(f"ℹ️  model yükleniyor: {MODEL_NAME}")
-    model = SentenceTransformer(MODEL_NAME)
-    model.max_seq_length = int(os.getenv("MAX_SEQ_LENGTH", "510")) 
-    print("max_seq_length =", model.max_seq_length)
-    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-    dim = len(model.encode(["probe"], convert_to_numpy=True)[0])
-    print(f"ℹ️  dim={dim}")
-
-    pdfs = [f for f in os.listdir(args.dir) if f.lower().endswith(".pdf")]
-    if not pdfs:
-        print("⚠️  PDF bulunmadı")
-        return
-
-    docs = secs = 0
-    for f in pdfs:
-        d, s, _ = run_one(os.path.join(args.dir, f), model, tokenizer, dim)
-        docs += d; secs += s
+    pool = EncoderPool(MODEL_NAME, args.embed_procs, max_seq_length=max_seq_length) if args.embed_procs > 1 else None
+    try:
+        if pool is not None:
+            encoder = pool
+            dim = pool.dimension
+            print(f"ℹ️  {args.embed_procs} encoder süreci x {pool.threads} thread")
+        else:
+            model = SentenceTransformer(MODEL_NAME)
+            model.max_seq_length = max_seq_length
+            encoder = encoder_for(model)
+            dim = len(model.encode(["probe"], convert_to_numpy=True)[0])
+        print("max_seq_length =", max_seq_length)
+        tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME, use_fast=True)
+        print(f"ℹ️  dim={dim}")
+
+        pdfs = [f for f in os.listdir(args.dir) if f.lower().endswith(".pdf")]
+        if not pdfs:
+            print("⚠️  PDF bulunmadı")
+            return
+
+        docs = secs = 0
+        with bulk_load("document_embeddings", defer=args.defer_index):
+            for f in pdfs:
+                d, s, _ = run_one(os.path.join(args.dir, f), encoder, tokenizer, dim)
+                docs += d; secs += s
+    finally:
+        # hata / Ctrl-C'de de encoder süreçleri kapansın
+        if pool is not None:
+            pool.close()
     print(f"\nSummary: docs={docs}, sections={secs}")
+    pdf_text.report()
 
 if __name__ == "__main__":
     main()
@@ -7,11 +7,17 @@ import time
 from typing import List, Tuple, Dict, Any
 
 import psycopg2
-from psycopg2.extras import execute_values
-from pypdf import PdfReader
 from sentence_transformers import SentenceTransformer
 from transformers import AutoTokenizer
-import numpy as np
+
+from pg_copy import copy_sections, copy_embeddings
+from chunker import chunk_sentences
+from index_manager import bulk_load
+from encoder import encoder_for, EncoderPool
+import pdf_text
+from pdf_text import extract_pages
+from dedup import (simhash, find_local_duplicates, find_corpus_duplicates,
+                   ensure_dedup_schema, link_sources, release_document_sections)
 
 # Config
 DB = dict(
@@ -27,8 +33,9 @@ TARGET_TOKENS = int(os.getenv("TARGET_TOKENS", "400"))
 MAX_TOKENS = int(os.getenv("MAX_TOKENS", "512"))
 OVERLAP_TOKENS = int(os.getenv("OVERLAP_TOKENS", "50"))
 MIN_CHUNK_WORDS = int(os.getenv("MIN_CHUNK_WORDS", "15"))
+EMBED_PROCS = int(os.getenv("EMBED_PROCS", "1"))
 
-_model = None
+_encoder = None
 _tokenizer = None
 _dim = None
 
@@ -60,15 +67,22 @@ class Stats:
 stats = Stats()
 
 def get_model():
-    global _model, _tokenizer, _dim
-    if _model is None:
+    """(encoder, tokenizer, dim); EMBED_PROCS > 1 ise encoder bir EncoderPool."""
+    global _encoder, _tokenizer, _dim
+    if _encoder is None:
         print(f"Model yukleniyor: {MODEL_NAME}")
-        _model = SentenceTransformer(MODEL_NAME)
-        _model.max_seq_length = MAX_TOKENS
-        _tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-        _dim = _model.get_sentence_embedding_dimension()
+        if EMBED_PROCS > 1:
+            _encoder = EncoderPool(MODEL_NAME, EMBED_PROCS, max_seq_length=MAX_TOKENS)
+            _dim = _encoder.dimension
+            print(f"  {EMBED_PROCS} encoder sureci x {_encoder.threads} thread")
+        else:
+            model = SentenceTransformer(MODEL_NAME)
+            model.max_seq_length = MAX_TOKENS
+            _encoder = encoder_for(model)
+            _dim = model.get_sentence_embedding_dimension()
+        _tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME, use_fast=True)
         print(f"  Dim: {_dim}, Max tokens: {MAX_TOKENS}")
-    return _model, _tokenizer, _dim
+    return _encoder, _tokenizer, _dim
 
 def db_connect():
     return psycopg2.connect(**DB)
@@ -96,15 +110,9 @@ def remove_header_block(text: str) -> str:
     return '\n'.join(lines[start_idx:]) if start_idx > 0 else text
 
 def read_pdf(path: str) -> List[Tuple[int, str]]:
-    reader = PdfReader(path)
     pages = []
     
-    for i, page in enumerate(reader.pages, start=1):
-        try:
-            text = page.extract_text() or ""
-        except:
-            text = ""
-        
+    for i, text in enumerate(extract_pages(path), start=1):
         text = clean_text(text)
         
         # Header'i sil
@@ -138,55 +146,8 @@ def is_chunk_noise(chunk: str) -> bool:
     return False
 
 def chunk_text(text: str, tokenizer, target: int, max_tok: int, overlap: int) -> List[str]:
-    sentences = re.split(r'(?<=[.!?])\s+', text)
-    sentences = [s.strip() for s in sentences if s.strip()]
-    
-    chunks = []
-    current = []
-    current_len = 0
-    
-    for sent in sentences:
-        tokens = tokenizer.encode(sent, add_special_tokens=False)
-        sent_len = len(tokens)
-        
-        if sent_len > max_tok:
-            if current:
-                chunks.append(' '.join(current))
-                current = []
-                current_len = 0
-            
-            for i in range(0, len(tokens), target):
-                piece = tokenizer.decode(tokens[i:i+target])
-                chunks.append(piece)
-            continue
-        
-        if current_len + sent_len <= target:
-            current.append(sent)
-            current_len += sent_len
-        else:
-            if current:
-                chunks.append(' '.join(current))
-            
-            if overlap > 0 and current:
-                overlap_sents = []
-                overlap_len = 0
-                for s in reversed(current):
-                    s_len = len(tokenizer.encode(s, add_special_tokens=False))
-                    if overlap_len + s_len > overlap:
-                        break
-                    overlap_sents.insert(0, s)
-                    overlap_len += s_len
-                current = overlap_sents
-                current_len = overlap_len
-            else:
-                current = []
-                current_len = 0
-            
-            current.append(sent)
-            current_len += sent_len
-    
-    if current:
-        chunks.append(' '.join(current))
+    # Sayfa tek tokenizer cagrisi; cumle sinirlari ve overlap offset'lerden hesaplanir
+    chunks = chunk_sentences(text, tokenizer, target, max_tok, overlap)
     
     # Gurultu chunk'lari filtrele
     return [c for c in chunks if not is_chunk_noise(c)]
@@ -229,11 +190,9 @@ def ensure_schema(cur, dim: int):
         );
         """)
     
-    cur.execute("""
-    CREATE INDEX IF NOT EXISTS idx_embeddings_cosine
-    ON document_embeddings USING ivfflat (embedding vector_cosine_ops)
-    WITH (lists = 100);
-    """)
+    # Vektor index'i yukleme sonrasi index_manager ile kurulur
+    
+    ensure_dedup_schema(cur)
 
 def upsert_document(cur, title: str, path: str, content_hash: str) -> Tuple[int, bool]:
     cur.execute("SELECT id, content_hash FROM documents WHERE file_path=%s", (path,))
@@ -243,8 +202,8 @@ def upsert_document(cur, title: str, path: str, content_hash: str) -> Tuple[int,
         if row[1] == content_hash:
             return row[0], False
         
-        cur.execute("DELETE FROM document_embeddings WHERE section_id IN (SELECT id FROM document_sections WHERE document_id=%s)", (row[0],))
-        cur.execute("DELETE FROM document_sections WHERE document_id=%s", (row[0],))
+        # Baska dokumanlarin da kaynak gosterdigi bolumler korunur (embedding'ler cascade)
+        release_document_sections(cur, row[0])
         cur.execute("UPDATE documents SET content_hash=%s WHERE id=%s", (content_hash, row[0]))
         return row[0], True
     
@@ -257,25 +216,16 @@ def upsert_document(cur, title: str, path: str, content_hash: str) -> Tuple[int,
     return cur.fetchone()[0], True
 
 def insert_sections(cur, doc_id: int, chunks: List[Dict]) -> List[int]:
-    ids = []
-    for chunk in chunks:
-        cur.execute("""
-        INSERT INTO document_sections (document_id, content, page_number)
-        VALUES (%s, %s, %s)
-        RETURNING id
-        """, (doc_id, chunk['text'], chunk['page']))
-        ids.append(cur.fetchone()[0])
-    return ids
+    # Tek COPY; id'ler chunks ile aynı sırada döner
+    return copy_sections(
+        cur,
+        ("document_id", "content", "page_number", "simhash"),
+        ("int8", "text", "int4", "int8"),
+        [(doc_id, chunk['text'], chunk['page'], chunk['simhash']) for chunk in chunks],
+    )
 
 def insert_embeddings(cur, section_ids: List[int], vectors: List, model: str):
-    def vec_str(v):
-        return '[' + ','.join(f'{x:.6f}' for x in v) + ']'
-    
-    values = [(sid, vec_str(vec), model) for sid, vec in zip(section_ids, vectors)]
-    execute_values(cur, """
-    INSERT INTO document_embeddings (section_id, embedding, model_name)
-    VALUES %s
-    """, values, template="(%s, %s::vector, %s)")
+    copy_embeddings(cur, section_ids, vectors, model)
 
 def process_pdf(path: str) -> Tuple[int, int]:
     start = time.time()
@@ -290,7 +240,7 @@ def process_pdf(path: str) -> Tuple[int, int]:
     full_text = ' '.join(t for _, t in pages)
     content_hash = hashlib.sha256(full_text.encode()).hexdigest()
     
-    model, tokenizer, dim = get_model()
+    encoder, tokenizer, dim = get_model()
     
     # Chunk'la
     all_chunks = []
@@ -307,25 +257,13 @@ def process_pdf(path: str) -> Tuple[int, int]:
     
     # Embed
     texts = [c['text'] for c in all_chunks]
-    embeddings = model.encode(texts, normalize_embeddings=True, convert_to_numpy=True, show_progress_bar=False)
-    
-    # Semantic dedup
-    kept_chunks = []
-    kept_vecs = []
-    
-    for chunk, vec in zip(all_chunks, embeddings):
-        is_dup = False
-        for existing_vec in kept_vecs[-3:]:
-            sim = np.dot(vec, existing_vec)
-            if sim > 0.98:
-                is_dup = True
-                break
-        
-        if not is_dup:
-            kept_chunks.append(chunk)
-            kept_vecs.append(vec)
+    embeddings = encoder.encode(texts, normalize_embeddings=True)
     
-    filtered = initial - len(kept_chunks)
+    # Dokuman ici dedup: tum tutulan chunk'lara karsi (cosine + SimHash)
+    for c in all_chunks:
+        c['simhash'] = simhash(c['text'])
+    local_dups = find_local_duplicates(embeddings, [c['simhash'] for c in all_chunks])
+    kept_idx = [i for i, d in enumerate(local_dups) if d is None]
     
     # DB
     conn = db_connect()
@@ -334,40 +272,68 @@ def process_pdf(path: str) -> Tuple[int, int]:
     try:
         ensure_schema(cur, dim)
         doc_id, changed = upsert_document(cur, title, os.path.abspath(path), content_hash)
-        sec_ids = insert_sections(cur, doc_id, kept_chunks)
-        insert_embeddings(cur, sec_ids, kept_vecs, MODEL_NAME)
+        
+        # Korpus dedup: mevcut bolumlere karsi; tekrarlar yeniden yazilmaz, kaynak olarak baglanir
+        corpus_dups = find_corpus_duplicates(
+            cur, embeddings[kept_idx], [all_chunks[i]['simhash'] for i in kept_idx])
+        new_idx = [i for i, d in zip(kept_idx, corpus_dups) if d is None]
+        
+        sec_ids = insert_sections(cur, doc_id, [all_chunks[i] for i in new_idx])
+        insert_embeddings(cur, sec_ids, embeddings[new_idx], MODEL_NAME)
+        
+        section_of = dict(zip(new_idx, sec_ids))
+        section_of.update((i, d) for i, d in zip(kept_idx, corpus_dups) if d is not None)
+        link_sources(cur, [
+            (section_of[i if d is None else d], doc_id, c['page'])
+            for i, (c, d) in enumerate(zip(all_chunks, local_dups))
+        ])
         conn.commit()
         
+        filtered = initial - len(kept_idx)
+        linked = len(kept_idx) - len(new_idx)
+        
         elapsed = time.time() - start
-        stats.add(len(kept_chunks), filtered, elapsed)
+        stats.add(len(new_idx), filtered, elapsed)
         
         print(f"  OK: {os.path.basename(path)}")
-        print(f"      chunks={len(kept_chunks)}, filtered={filtered}, {elapsed:.1f}s")
+        print(f"      chunks={len(new_idx)}, filtered={filtered}, linked={linked}, {elapsed:.1f}s")
         
-        return 1, len(kept_chunks)
+        return 1, len(new_idx)
     
     finally:
         cur.close()
         conn.close()
 
 def main():
+    global EMBED_PROCS
     parser = argparse.ArgumentParser()
     parser.add_argument('--dir', required=True)
+    parser.add_argument('--defer-index', action='store_true',
+                        help="yukleme boyunca vektor index'ini birak, sonunda yeniden kur")
+    parser.add_argument('--embed-procs', type=int, default=EMBED_PROCS,
+                        help="encoder surec sayisi (her biri cpu/N thread)")
     args = parser.parse_args()
     
-    get_model()
-    
-    pdfs = [f for f in os.listdir(args.dir) if f.lower().endswith('.pdf')]
-    if not pdfs:
-        print("PDF yok")
-        return
-    
-    print(f"\n{len(pdfs)} PDF isleniyor...\n")
-    
-    for pdf in pdfs:
-        process_pdf(os.path.join(args.dir, pdf))
-    
+    EMBED_PROCS = args.embed_procs
+    try:
+        get_model()
+        
+        pdfs = [f for f in os.listdir(args.dir) if f.lower().endswith('.pdf')]
+        if not pdfs:
+            print("PDF yok")
+            return
+        
+        print(f"\n{len(pdfs)} PDF isleniyor...\n")
+        
+        with bulk_load('document_embeddings', defer=args.defer_index):
+            for pdf in pdfs:
+                process_pdf(os.path.join(args.dir, pdf))
+    finally:
+        # erken donus / hata / Ctrl-C'de de encoder surecleri kapansin
+        if EMBED_PROCS > 1 and _encoder is not None:
+            _encoder.close()
     stats.print_summary()
+    pdf_text.report()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,209 @@
+# kb/ingest/jobs.py
+"""
+Postgres tabanlı kalıcı iş kuyruğu (kb_jobs).
+
+- API iş ekler (enqueue) ve id'yi hemen döner; kb_worker süreçleri işleri
+  `FOR UPDATE SKIP LOCKED` ile birbirini beklemeden alır.
+- Hata alan iş üstel geri çekilme (+ jitter) ile tekrar kuyruğa girer;
+  max_attempts dolunca 'dead' olur ve elle yeniden denenene kadar bekler.
+- Çöken worker'ın 'running' bıraktığı iş JOB_LOCK_TIMEOUT sonra yeniden alınır;
+  çalışan worker locked_at'i heartbeat ile tazeler, uzun işler elinden alınmaz.
+
+Kullanım:
+  python kb/ingest/jobs.py list --status dead
+  python kb/ingest/jobs.py retry 42
+"""
+import os
+import random
+import argparse
+from typing import Dict, Optional
+
+import psycopg2
+from psycopg2.extras import Json
+
+DB = dict(
+    host=os.getenv("DB_HOST", "localhost"),
+    port=int(os.getenv("DB_PORT", "5432")),
+    dbname=os.getenv("DB_NAME", "kb"),
+    user=os.getenv("DB_USER", "troy"),
+    password=os.getenv("DB_PASSWORD", "troy1234"),
+)
+
+MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+BACKOFF_BASE = float(os.getenv("JOB_BACKOFF_BASE", "5"))      # saniye
+BACKOFF_MAX = float(os.getenv("JOB_BACKOFF_MAX", "600"))
+LOCK_TIMEOUT = int(os.getenv("JOB_LOCK_TIMEOUT", "900"))      # saniye
+CHANNEL = "kb_jobs"
+
+
+class PermanentJobError(Exception):
+    """Tekrar denemekle düzelmeyecek hata (bozuk girdi vb.); iş doğrudan 'dead' olur."""
+
+
+JOB_COLUMNS = ("id", "kind", "payload", "status", "attempts", "max_attempts",
+               "run_after", "locked_by", "last_error", "result", "created_at", "updated_at")
+
+
+def ensure_schema(cur):
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS kb_jobs (
+      id           BIGSERIAL PRIMARY KEY,
+      kind         VARCHAR(50) NOT NULL,
+      payload      JSONB NOT NULL DEFAULT '{}'::jsonb,
+      status       VARCHAR(20) NOT NULL DEFAULT 'queued'
+                   CHECK (status IN ('queued', 'running', 'done', 'dead')),
+      attempts     INT NOT NULL DEFAULT 0,
+      max_attempts INT NOT NULL DEFAULT 5,
+      run_after    TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+      locked_by    TEXT,
+      locked_at    TIMESTAMPTZ,
+      last_error   TEXT,
+      result       JSONB,
+      created_at   TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+      updated_at   TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    );
+    """)
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_kb_jobs_ready
+    ON kb_jobs (run_after, id) WHERE status = 'queued';
+    """)
+    cur.execute("""
+    CREATE INDEX IF NOT EXISTS idx_kb_jobs_running
+    ON kb_jobs (locked_at) WHERE status = 'running';
+    """)
+
+
+def enqueue(cur, kind: str, payload: Dict, max_attempts: int = MAX_ATTEMPTS) -> int:
+    """İşi kuyruğa ekle; commit ile birlikte bekleyen worker'lar uyanır."""
+    cur.execute("""
+        INSERT INTO kb_jobs (kind, payload, max_attempts)
+        VALUES (%s, %s, %s)
+        RETURNING id
+    """, (kind, Json(payload), max_attempts))
+    job_id = cur.fetchone()[0]
+    cur.execute("SELECT pg_notify(%s, %s)", (CHANNEL, str(job_id)))
+    return job_id
+
+
+def claim(cur, worker: str, lock_timeout: int = LOCK_TIMEOUT) -> Optional[Dict]:
+    """
+    Sıradaki hazır işi al (yoksa None). Kilit süresi dolmuş 'running' işler de
+    alınır. Çağıran hemen commit etmeli; iş ayrı transaction'da çalışır.
+    """
+    cur.execute("""
+        UPDATE kb_jobs j
+        SET status = 'running', attempts = j.attempts + 1,
+            locked_by = %s, locked_at = NOW(), updated_at = NOW()
+        FROM (
+          SELECT id FROM kb_jobs
+          WHERE (status = 'queued' AND run_after <= NOW())
+             OR (status = 'running' AND locked_at < NOW() - make_interval(secs => %s))
+          ORDER BY run_after, id
+          FOR UPDATE SKIP LOCKED
+          LIMIT 1
+        ) next
+        WHERE j.id = next.id
+        RETURNING j.id, j.kind, j.payload, j.attempts, j.max_attempts
+    """, (worker, lock_timeout))
+    row = cur.fetchone()
+    if not row:
+        return None
+    return dict(id=row[0], kind=row[1], payload=row[2], attempts=row[3], max_attempts=row[4])
+
+
+def heartbeat(cur, job_id: int, worker: str) -> bool:
+    """Çalışan işin kilidini tazele; iş artık bu worker'da değilse False."""
+    cur.execute("""
+        UPDATE kb_jobs SET locked_at = NOW()
+        WHERE id = %s AND status = 'running' AND locked_by = %s
+    """, (job_id, worker))
+    return cur.rowcount > 0
+
+
+def complete(cur, job_id: int, result: Optional[Dict] = None):
+    cur.execute("""
+        UPDATE kb_jobs
+        SET status = 'done', result = %s, last_error = NULL,
+            locked_by = NULL, locked_at = NULL, updated_at = NOW()
+        WHERE id = %s
+    """, (Json(result) if result is not None else None, job_id))
+
+
+def backoff_seconds(attempts: int, base: float = BACKOFF_BASE, cap: float = BACKOFF_MAX) -> float:
+    """base * 2^(deneme-1), üst sınırlı; ±%50 jitter ile worker'lar senkronlanmaz."""
+    delay = min(cap, base * (2 ** max(0, attempts - 1)))
+    return delay * (0.5 + random.random())
+
+
+def fail(cur, job: Dict, error: str, permanent: bool = False) -> str:
+    """Hatayı yaz; deneme hakkı varsa geri çekilmeyle kuyruğa al, yoksa 'dead'."""
+    if permanent or job["attempts"] >= job["max_attempts"]:
+        status, delay = "dead", 0.0
+    else:
+        status, delay = "queued", backoff_seconds(job["attempts"])
+    cur.execute("""
+        UPDATE kb_jobs
+        SET status = %s, last_error = %s,
+            run_after = NOW() + make_interval(secs => %s),
+            locked_by = NULL, locked_at = NULL, updated_at = NOW()
+        WHERE id = %s
+    """, (status, error[-4000:], delay, job["id"]))
+    return status
+
+
+def retry(cur, job_id: int) -> bool:
+    """Dead-letter'daki işi deneme sayacını sıfırlayıp yeniden kuyruğa al."""
+    cur.execute("""
+        UPDATE kb_jobs
+        SET status = 'queued', attempts = 0, run_after = NOW(), updated_at = NOW()
+        WHERE id = %s AND status = 'dead'
+    """, (job_id,))
+    if cur.rowcount:
+        cur.execute("SELECT pg_notify(%s, %s)", (CHANNEL, str(job_id)))
+    return cur.rowcount > 0
+
+
+def get_job(cur, job_id: int) -> Optional[Dict]:
+    cur.execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM kb_jobs WHERE id = %s", (job_id,))
+    row = cur.fetchone()
+    if not row:
+        return None
+    job = dict(zip(JOB_COLUMNS, row))
+    for k in ("run_after", "created_at", "updated_at"):
+        job[k] = job[k].isoformat() if job[k] else None
+    return job
+
+
+def main():
+    ap = argparse.ArgumentParser(description="kb_jobs kuyruğu")
+    sub = ap.add_subparsers(dest="command", required=True)
+    ls = sub.add_parser("list")
+    ls.add_argument("--status", choices=["queued", "running", "done", "dead"])
+    ls.add_argument("--limit", type=int, default=20)
+    rt = sub.add_parser("retry")
+    rt.add_argument("job_id", type=int)
+    args = ap.parse_args()
+
+    conn = psycopg2.connect(**DB)
+    try:
+        with conn.cursor() as cur:
+            ensure_schema(cur)
+            if args.command == "retry":
+                ok = retry(cur, args.job_id)
+                print(f"🔁 iş {args.job_id} kuyruğa alındı" if ok else f"⚠️  iş {args.job_id} dead değil")
+            else:
+                cur.execute("""
+                    SELECT id, kind, status, attempts, max_attempts, updated_at, last_error
+                    FROM kb_jobs
+                    WHERE %(status)s IS NULL OR status = %(status)s
+                    ORDER BY id DESC LIMIT %(limit)s
+                """, dict(status=args.status, limit=args.limit))
+                for jid, kind, status, att, mx, upd, err in cur.fetchall():
+                    err = f" — {err.splitlines()[-1][:80]}" if err else ""
+                    print(f"#{jid} {kind:<16} {status:<8} {att}/{mx} {upd:%Y-%m-%d %H:%M:%S}{err}")
+        conn.commit()
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+# kb/ingest/kb_worker.py
+"""
+kb_jobs kuyruğunu tüketen worker.
+
+Admin panelinden gelen döküman / eğitim içeriği / PDF işleri burada
+chunk'lanıp toplu embed edilir ve yazılır; API isteği beklemez. Birden
+fazla süreç aynı anda çalışabilir (işler SKIP LOCKED ile dağıtılır). Yeni iş LISTEN/NOTIFY ile hemen fark
+edilir, bildirim kaçarsa --poll saniyede bir kuyruk yine taranır.
+
+Her iş kendi transaction'ında çalışır ve aynı transaction'da 'done' olur;
+hata alırsa geri alınır, jobs.fail ile yeniden kuyruğa/dead-letter'a düşer.
+İş done ya da dead olunca yüklenen PDF UPLOAD_DIR'dan silinir (dead bir
+upload_pdf işi retry ile değil, dosya yeniden yüklenerek tekrarlanır).
+
+Kullanım:
+  python kb/ingest/kb_worker.py
+  python kb/ingest/kb_worker.py --once      # kuyruk boşalınca çık
+"""
+import os
+import re
+import time
+import select
+import socket
+import argparse
+import threading
+import traceback
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import psycopg2
+from sentence_transformers import SentenceTransformer
+
+import jobs
+from chunker import chunk_sentence_spans
+from pg_copy import copy_rows
+from encoder import encoder_for
+from training_embeddings import EMBED_TEXT_SQL, content_hash_sql
+from clean_pdf_data import (clean_pages, sectionize_with_titles, map_index_to_page,
+                            paged_extract, approx_token_count, hash_id, PAGE_SEP)
+
+MODEL_NAME = os.getenv("CHAT_EMBED_MODEL", "intfloat/multilingual-e5-small")
+TARGET_TOKENS = int(os.getenv("TARGET_TOKENS", "400"))
+MAX_TOKENS = int(os.getenv("MAX_TOKENS", "512"))
+OVERLAP_TOKENS = int(os.getenv("OVERLAP_TOKENS", "50"))
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", str(Path(__file__).resolve().parent.parent / "data" / "uploads"))
+HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "60"))  # < jobs.LOCK_TIMEOUT
+
+RAG_COLUMNS = ("chunk_id", "file_name", "section_title", "content", "page_start",
+               "page_end", "chunk_index", "approx_tokens", "embedding")
+RAG_TYPES = ("text", "text", "text", "text", "int4", "int4", "text", "int4", "vector")
+
+model = None
+
+
+def get_model():
+    global model
+    if model is None:
+        model = SentenceTransformer(MODEL_NAME)
+        model.max_seq_length = MAX_TOKENS
+    return model
+
+
+def chunk_spans(text: str) -> List[Tuple[int, int, str]]:
+    """Token boyutlu, overlap'li cümle chunk'ları (PDF hattıyla aynı chunker)."""
+    return chunk_sentence_spans(text, get_model().tokenizer, TARGET_TOKENS, MAX_TOKENS, OVERLAP_TOKENS)
+
+
+def write_rag_chunks(cur, rows: Sequence[Tuple]) -> int:
+    """
+    rows: embedding hariç RAG_COLUMNS sırasında satırlar. İçerikler toplu
+    encode edilir, satırlar tek binary COPY ile yazılır.
+    """
+    if not rows:
+        return 0
+    vecs = encoder_for(get_model()).encode([r[3] for r in rows])
+    return copy_rows(cur, "rag_documents", RAG_COLUMNS, RAG_TYPES,
+                     (row + (vec,) for row, vec in zip(rows, vecs)))
+
+
+def handle_upload_document(cur, payload: Dict) -> Dict:
+    base, content = payload["chunk_id"], payload["content"].strip()
+    if not content:
+        raise jobs.PermanentJobError("içerik boş")
+    spans = chunk_spans(content) or [(0, len(content), content)]
+    rows = [
+        (f"{base}-{i:03d}", payload["category"], payload["title"], text, 1, 1,
+         f"{i:03d}", approx_token_count(text))
+        for i, (_, _, text) in enumerate(spans)
+    ]
+    # Tekrar denemede (ör. kilit süresi dolup iş yeniden alınırsa) önceki parçaları sil
+    # LIKE değil: base'deki % / _ joker olarak yorumlanmasın
+    cur.execute("DELETE FROM rag_documents WHERE left(chunk_id, char_length(%(prefix)s)) = %(prefix)s",
+                {"prefix": base + "-"})
+    n = write_rag_chunks(cur, rows)
+    return {"chunk_id": base, "chunks": n}
+
+
+def handle_upload_pdf(cur, payload: Dict) -> Dict:
+    """Yüklenen PDF: clean_pdf_data temizlik kuralları + başlık bölümleri + token chunk'ları."""
+    file_name = payload["file_name"]
+    path = os.path.join(UPLOAD_DIR, payload["stored_name"])
+    try:
+        raw_pages = paged_extract(path)
+    except FileNotFoundError:
+        raise jobs.PermanentJobError(f"yüklenen dosya bulunamadı: {path}")
+    except Exception as e:
+        raise jobs.PermanentJobError(f"PDF okunamadı: {e}")
+    if not any(p.strip() for p in raw_pages):
+        raise jobs.PermanentJobError("PDF'ten metin çıkarılamadı (taranmış olabilir)")
+
+    concat_text, page_offsets = clean_pages(raw_pages)
+    # Sayfa ayracı chunk'lara girmesin; aynı uzunlukta boşlukla offset'ler korunur
+    marker = PAGE_SEP.strip()
+    masked = concat_text.replace(marker, " " * len(marker))
+
+    rows = []
+    for sec_idx, (title, s, e) in enumerate(sectionize_with_titles(masked)):
+        for i, (a, b, text) in enumerate(chunk_spans(masked[s:e])):
+            text = re.sub(r"\s+", " ", text).strip()
+            if not text:
+                continue
+            p_start = map_index_to_page(s + a, page_offsets)
+            p_end = map_index_to_page(s + b, page_offsets)
+            chunk_index = f"{sec_idx:03d}-{i:03d}"
+            cid = hash_id(file_name, title, str(p_start), str(p_end), chunk_index, text[:64])
+            rows.append((cid, file_name, title, text, p_start, p_end, chunk_index,
+                         approx_token_count(text)))
+
+    # Aynı dosya tekrar yüklenirse eski sürümün yerini alır
+    cur.execute("DELETE FROM rag_documents WHERE file_name = %s", (file_name,))
+    n = write_rag_chunks(cur, rows)
+    return {"file_name": file_name, "pages": len(raw_pages), "chunks": n}
+
+
+def cleanup_upload_pdf(cur, job: Dict):
+    """İş bitti ya da dead oldu: yüklenen dosyayı sil (aynı dosyayı bekleyen başka iş yoksa)."""
+    stored_name = job["payload"].get("stored_name")
+    if not stored_name:
+        return
+    cur.execute("""
+        SELECT 1 FROM kb_jobs
+        WHERE kind = 'upload_pdf' AND id <> %s AND status IN ('queued', 'running')
+          AND payload->>'stored_name' = %s
+        LIMIT 1
+    """, (job["id"], stored_name))
+    if cur.fetchone():
+        return
+    try:
+        os.remove(os.path.join(UPLOAD_DIR, stored_name))
+    except FileNotFoundError:
+        pass
+
+
+def handle_create_training(cur, payload: Dict) -> Dict:
+    cur.execute("""
+        INSERT INTO training_content
+        (title, description, step_by_step, tags, status, created_at)
+        VALUES (%s, %s, %s, %s, 'active', NOW())
+        RETURNING id
+    """, (payload["title"], payload["description"], payload["steps"], payload["tags"]))
+    training_id = cur.fetchone()[0]
+
+    # training_embeddings.py ile aynı metin ve hash: o betik bu satırı yeniden embed etmez
+    cur.execute(f"""
+        SELECT text, {content_hash_sql('text')}
+        FROM (SELECT {EMBED_TEXT_SQL} AS text FROM training_content tc WHERE tc.id = %s) t
+    """, (training_id,))
+    text, content_hash = cur.fetchone()
+    embedding = get_model().encode(text).tolist()
+
+    cur.execute("""
+        INSERT INTO training_embeddings (training_id, embedding, content_hash)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (training_id) DO UPDATE
+        SET embedding = EXCLUDED.embedding, content_hash = EXCLUDED.content_hash, created_at = NOW()
+    """, (training_id, embedding, content_hash))
+    return {"training_id": training_id}
+
+
+HANDLERS: Dict[str, Callable[..., Dict]] = {
+    "upload_document": handle_upload_document,
+    "create_training": handle_create_training,
+    "upload_pdf": handle_upload_pdf,
+}
+
+# İş son durumuna (done / dead) geçince çalışır; dosya gibi DB dışı artıkları temizler
+CLEANUPS: Dict[str, Callable[..., None]] = {
+    "upload_pdf": cleanup_upload_pdf,
+}
+
+
+@contextmanager
+def heartbeat(job_id: int, worker: str, interval: float = HEARTBEAT_SECONDS):
+    """
+    İş sürerken locked_at'i ayrı bağlantıdan tazele; uzun PDF işleri
+    LOCK_TIMEOUT dolup başka worker'a geçmesin. Kısa işler bağlantı açmaz.
+    kb_jobs satırını güncelleyen (complete/fail) kod bunun dışında kalmalı,
+    yoksa heartbeat aynı satır kilidinde bekler.
+    """
+    stop = threading.Event()
+
+    def beat():
+        hb_conn = None
+        try:
+            while not stop.wait(interval):
+                if hb_conn is None:
+                    hb_conn = psycopg2.connect(**jobs.DB)
+                    hb_conn.autocommit = True
+                with hb_conn.cursor() as cur:
+                    if not jobs.heartbeat(cur, job_id, worker):
+                        print(f"⚠️  #{job_id} kilidi başka worker'a geçti")
+                        return
+        except psycopg2.Error as e:
+            print(f"⚠️  #{job_id} heartbeat yazılamadı: {e}")
+        finally:
+            if hb_conn is not None:
+                hb_conn.close()
+
+    t = threading.Thread(target=beat, name=f"heartbeat-{job_id}", daemon=True)
+    t.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        t.join()
+
+
+def run_one(conn, worker: str) -> bool:
+    """Bir iş al ve çalıştır; kuyrukta hazır iş yoksa False."""
+    with conn.cursor() as cur:
+        job = jobs.claim(cur, worker)
+    conn.commit()
+    if job is None:
+        return False
+
+    t0 = time.time()
+    status = "done"
+    try:
+        handler = HANDLERS.get(job["kind"])
+        if handler is None:
+            raise jobs.PermanentJobError(f"bilinmeyen iş türü: {job['kind']}")
+        with conn.cursor() as cur:
+            with heartbeat(job["id"], worker):
+                result = handler(cur, job["payload"])
+            jobs.complete(cur, job["id"], result)
+        conn.commit()
+        print(f"✅ #{job['id']} {job['kind']} ({time.time() - t0:.2f}s) {result}")
+    except Exception as e:
+        conn.rollback()
+        err = traceback.format_exc()
+        with conn.cursor() as cur:
+            status = jobs.fail(cur, job, err, permanent=isinstance(e, jobs.PermanentJobError))
+        conn.commit()
+        icon = "☠️ " if status == "dead" else "🔁"
+        print(f"{icon} #{job['id']} {job['kind']} deneme {job['attempts']}/{job['max_attempts']} "
+              f"→ {status}: {err.strip().splitlines()[-1]}")
+    if status in ("done", "dead") and job["kind"] in CLEANUPS:
+        try:
+            with conn.cursor() as cur:
+                CLEANUPS[job["kind"]](cur, job)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"⚠️  #{job['id']} temizlik yapılamadı: {e}")
+    return True
+
+
+def wait_for_jobs(listen_conn, timeout: float):
+    """NOTIFY gelene ya da timeout dolana kadar bekle."""
+    if select.select([listen_conn], [], [], timeout) != ([], [], []):
+        listen_conn.poll()
+        listen_conn.notifies.clear()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="kb_jobs worker")
+    ap.add_argument("--poll", type=float, default=float(os.getenv("JOB_POLL_SECONDS", "5")))
+    ap.add_argument("--once", action="store_true", help="kuyruk boşalınca çık")
+    args = ap.parse_args()
+
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    conn = psycopg2.connect(**jobs.DB)
+    listen_conn = psycopg2.connect(**jobs.DB)
+    listen_conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            jobs.ensure_schema(cur)
+        conn.commit()
+        with listen_conn.cursor() as cur:
+            cur.execute(f"LISTEN {jobs.CHANNEL}")
+        get_model()
+        print(f"👷 worker {worker} hazır (model={MODEL_NAME})")
+
+        while True:
+            while run_one(conn, worker):
+                pass
+            if args.once:
+                break
+            wait_for_jobs(listen_conn, args.poll)
+    except KeyboardInterrupt:
+        print("\n👋 worker durdu")
+    finally:
+        conn.close()
+        listen_conn.close()
+
+if __name__ == "__main__":
+    main()
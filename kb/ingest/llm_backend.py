@@ -0,0 +1,557 @@
+# kb/ingest/llm_backend.py
+"""
+LLM arka uç katmanı: birden çok Ollama / OpenAI uyumlu sunucu arasında
+dengeleme, keep-alive bağlantı havuzları, çağrı başına zaman aşımı ve
+sağlık durumuna göre devreden çıkarma.
+
+Uç noktalar LLM_BACKENDS ile virgülle verilir (tür:url[#model]):
+  LLM_BACKENDS=ollama:http://10.0.0.5:11434,ollama:http://10.0.0.6:11434
+  LLM_BACKENDS=openai:http://10.0.0.7:8080/v1#qwen2.5-1.5b-instruct
+Verilmezse OLLAMA_HOST (yoksa http://localhost:11434) tek Ollama olarak kullanılır.
+
+Seçim (LLM_BALANCE):
+  least_loaded  uçuştaki isteği en az olan (eşitlikte sırayla)
+  round_robin   sırayla
+Art arda LLM_EJECT_AFTER hata alan uç LLM_EJECT_SECONDS süre devreden çıkar;
+süre dolunca bir sağlık yoklaması (/api/tags, /models) başarılıysa geri
+döner. Bağlantı hatası ve 5xx'te istek bir sonraki uca denenir (LLM_RETRIES);
+zaman aşımı tekrar denenmez (üretim uzun sürüyor demektir). Tüm uçlar dışarıda
+ise en erken geri dönecek olan yine denenir.
+
+Bağlantılar uç başına en çok LLM_POOL_SIZE adet, LLM_KEEPALIVE_EXPIRY sn
+boşta kalana kadar yeniden kullanılır. Cevaplar Ollama biçimindedir
+({"message": {"role", "content"}, "prompt_eval_count", "eval_count", ...});
+OpenAI uyumlu sunucuların cevapları bu biçime çevrilir.
+
+Ollama isteklerine LLM_KEEP_ALIVE (varsayılan 30m) gönderilir: model
+bellekte kalır, slot'lardaki KV önbelleği (ortak prompt öneki) korunur.
+Çağrıda keep_alive verilirse o kullanılır.
+
+Kullanım:
+  import llm_backend
+  response = llm_backend.chat([{"role": "user", "content": prompt}], options={"temperature": 0.3})
+  for part in llm_backend.stream(messages):
+      print(part["message"]["content"], end="")
+
+  python kb/ingest/llm_backend.py --probe
+  python kb/ingest/llm_backend.py "Fiyat revize nedir?"
+"""
+import os
+import json
+import time
+import queue
+import socket
+import argparse
+import threading
+import http.client
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+MODEL = os.getenv("LLM_MODEL", "llama3.2:1b")
+TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))                  # çağrı başına, sn
+CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "3"))
+POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "8"))                  # uç başına bağlantı
+KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30"))
+BALANCE = os.getenv("LLM_BALANCE", "least_loaded")                # least_loaded | round_robin
+EJECT_AFTER = int(os.getenv("LLM_EJECT_AFTER", "3"))
+EJECT_SECONDS = float(os.getenv("LLM_EJECT_SECONDS", "30"))
+RETRIES = int(os.getenv("LLM_RETRIES", "1"))
+HEALTH_TIMEOUT = float(os.getenv("LLM_HEALTH_TIMEOUT", "2"))
+KEEP_ALIVE = os.getenv("LLM_KEEP_ALIVE", "30m")                   # Ollama süre biçimi; "" = gönderme
+
+# socket.timeout 3.10'dan önce TimeoutError değil, OSError alt sınıfı
+_TIMEOUT_ERRORS = (socket.timeout, TimeoutError)
+
+
+class LLMError(RuntimeError):
+    """retriable: başka bir uçta denemek anlamlı mı (bağlantı hatası, 5xx)."""
+
+    def __init__(self, message: str, retriable: bool = False, status: Optional[int] = None):
+        super().__init__(message)
+        self.retriable = retriable
+        self.status = status
+
+
+class LLMTimeout(LLMError):
+    pass
+
+
+class _Stale(Exception):
+    """Havuzdan alınan keep-alive bağlantısı sunucu tarafında kapanmış."""
+
+
+# =========================
+# Keep-alive HTTP havuzu
+# =========================
+class HTTPPool:
+    """Tek host'a kalıcı bağlantılar; en çok size adet, boşta kalan expiry sn sonra kapanır."""
+
+    def __init__(self, url: str, size: int = POOL_SIZE, connect_timeout: float = CONNECT_TIMEOUT,
+                 keepalive_expiry: float = KEEPALIVE_EXPIRY):
+        parts = urlsplit(url)
+        self.https = parts.scheme == "https"
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.https else 80)
+        self.base_path = parts.path.rstrip("/")
+        self.connect_timeout = connect_timeout
+        self.keepalive_expiry = keepalive_expiry
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = queue.LifoQueue()            # (bağlantı, son kullanım)
+
+    def _new(self) -> http.client.HTTPConnection:
+        cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        conn = cls(self.host, self.port, timeout=self.connect_timeout)
+        try:
+            conn.connect()
+        except OSError as e:
+            conn.close()
+            raise LLMError(f"{self.host}:{self.port} bağlanılamadı: {e}", retriable=True) from e
+        return conn
+
+    def _idle_conn(self) -> Optional[http.client.HTTPConnection]:
+        while True:
+            try:
+                conn, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return None
+            if conn.sock is not None and time.monotonic() - last_used < self.keepalive_expiry:
+                return conn
+            conn.close()
+
+    @contextmanager
+    def connection(self, timeout: float):
+        """(bağlantı, yeniden kullanıldı mı); blok hatasız biterse havuza döner."""
+        if not self._slots.acquire(timeout=timeout):
+            raise LLMTimeout(f"{self.host}:{self.port} bağlantı havuzu dolu", retriable=True)
+        conn, ok = None, False
+        try:
+            conn = self._idle_conn()
+            reused = conn is not None
+            if conn is None:
+                conn = self._new()
+            conn.sock.settimeout(timeout)
+            yield conn, reused
+            ok = True
+        finally:
+            if conn is not None:
+                if ok and conn.sock is not None:
+                    self._idle.put((conn, time.monotonic()))
+                else:
+                    conn.close()
+            self._slots.release()
+
+    @contextmanager
+    def request(self, method: str, path: str, body: Optional[dict] = None, timeout: float = TIMEOUT,
+                headers: Optional[Dict] = None):
+        """HTTPResponse verir; blok içinde tamamen okunmalı. Bayat keep-alive bağlantısında bir kez yeniler."""
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        hdrs = {"Content-Type": "application/json", **(headers or {})}
+        for attempt in (0, 1):
+            try:
+                with self.connection(timeout) as (conn, reused):
+                    try:
+                        conn.request(method, self.base_path + path, data, hdrs)
+                        resp = conn.getresponse()
+                    except _TIMEOUT_ERRORS as e:
+                        raise LLMTimeout(f"{self.host}:{self.port} {timeout:g}s içinde cevap vermedi") from e
+                    except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError) as e:
+                        if reused and attempt == 0:
+                            raise _Stale() from e
+                        raise LLMError(f"{self.host}:{self.port} bağlantı koptu: {e}", retriable=True) from e
+                    except (OSError, http.client.HTTPException) as e:
+                        raise LLMError(f"{self.host}:{self.port} istek hatası: {e}", retriable=True) from e
+                    if resp.status >= 400:
+                        detail = resp.read()[:500].decode("utf-8", errors="replace")
+                        raise LLMError(f"{self.host}:{self.port} HTTP {resp.status}: {detail}",
+                                       retriable=resp.status >= 500 or resp.status == 429, status=resp.status)
+                    try:
+                        yield resp
+                    except _TIMEOUT_ERRORS as e:
+                        raise LLMTimeout(f"{self.host}:{self.port} {timeout:g}s içinde cevap vermedi") from e
+                    except (OSError, http.client.HTTPException) as e:
+                        raise LLMError(f"{self.host}:{self.port} cevap okunamadı: {e}") from e
+                    if not resp.isclosed():
+                        conn.close()            # gövde yarım kaldı: bağlantı yeniden kullanılamaz
+                    return
+            except _Stale:
+                continue                        # sunucu boştaki bağlantıyı kapatmış; yenisiyle bir kez daha
+
+    def close(self):
+        while True:
+            conn = self._idle_conn()
+            if conn is None:
+                return
+            conn.close()
+
+
+def _parse(data) -> Dict:
+    try:
+        return json.loads(data)
+    except ValueError as e:
+        raise LLMError(f"geçersiz JSON cevabı: {e}", retriable=True) from e
+
+
+# =========================
+# Arka uçlar
+# =========================
+class OllamaBackend:
+    kind = "ollama"
+
+    def __init__(self, url: str, model: Optional[str] = None, pool_size: int = POOL_SIZE):
+        self.url = url.rstrip("/")
+        self.model = model
+        self.http = HTTPPool(self.url, pool_size)
+
+    def _body(self, messages, model, options, keep_alive, stream):
+        body = {"model": self.model or model, "messages": messages, "stream": stream}
+        if options:
+            body["options"] = options
+        if keep_alive is not None:
+            body["keep_alive"] = keep_alive
+        return body
+
+    def chat(self, messages: List[Dict], model: str, options: Optional[Dict] = None,
+             timeout: float = TIMEOUT, keep_alive=None) -> Dict:
+        with self.http.request("POST", "/api/chat", self._body(messages, model, options, keep_alive, False),
+                               timeout) as resp:
+            return _parse(resp.read())
+
+    def stream(self, messages: List[Dict], model: str, options: Optional[Dict] = None,
+               timeout: float = TIMEOUT, keep_alive=None) -> Iterator[Dict]:
+        deadline = time.monotonic() + timeout
+        with self.http.request("POST", "/api/chat", self._body(messages, model, options, keep_alive, True),
+                               timeout) as resp:
+            for line in resp:
+                if not line.strip():
+                    continue
+                part = _parse(line)
+                if "error" in part:
+                    raise LLMError(f"{self.url}: {part['error']}")
+                yield part
+                if part.get("done"):
+                    break
+                if time.monotonic() > deadline:
+                    raise LLMTimeout(f"{self.url}: üretim {timeout:g}s'yi aştı")
+            resp.read()
+
+    def health(self, timeout: float = HEALTH_TIMEOUT) -> bool:
+        try:
+            with self.http.request("GET", "/api/tags", timeout=timeout) as resp:
+                resp.read()
+            return True
+        except LLMError:
+            return False
+
+    def close(self):
+        self.http.close()
+
+
+class OpenAIBackend:
+    """OpenAI uyumlu /chat/completions (llama.cpp server, vLLM, LM Studio...)."""
+    kind = "openai"
+
+    def __init__(self, url: str, model: Optional[str] = None, pool_size: int = POOL_SIZE):
+        self.url = url.rstrip("/")
+        self.model = model
+        self.http = HTTPPool(self.url, pool_size)
+        key = os.getenv("OPENAI_API_KEY")
+        self.headers = {"Authorization": f"Bearer {key}"} if key else {}
+
+    def _body(self, messages, model, options, stream):
+        options = options or {}
+        body = {"model": self.model or model, "messages": messages, "stream": stream}
+        if "temperature" in options:
+            body["temperature"] = options["temperature"]
+        if options.get("num_predict", -1) > 0:
+            body["max_tokens"] = options["num_predict"]
+        if stream:
+            body["stream_options"] = {"include_usage": True}
+        return body
+
+    @staticmethod
+    def _done(model, content, usage, reason) -> Dict:
+        usage = usage or {}
+        return {"model": model, "message": {"role": "assistant", "content": content}, "done": True,
+                "done_reason": "length" if reason == "length" else "stop",
+                "prompt_eval_count": usage.get("prompt_tokens"), "eval_count": usage.get("completion_tokens")}
+
+    def chat(self, messages: List[Dict], model: str, options: Optional[Dict] = None,
+             timeout: float = TIMEOUT, keep_alive=None) -> Dict:
+        with self.http.request("POST", "/chat/completions", self._body(messages, model, options, False),
+                               timeout, self.headers) as resp:
+            out = _parse(resp.read())
+        choice = (out.get("choices") or [{}])[0]
+        return self._done(out.get("model"), (choice.get("message") or {}).get("content") or "",
+                          out.get("usage"), choice.get("finish_reason"))
+
+    def stream(self, messages: List[Dict], model: str, options: Optional[Dict] = None,
+               timeout: float = TIMEOUT, keep_alive=None) -> Iterator[Dict]:
+        deadline = time.monotonic() + timeout
+        name, usage, reason = self.model or model, None, None
+        with self.http.request("POST", "/chat/completions", self._body(messages, model, options, True),
+                               timeout, self.headers) as resp:
+            for line in resp:
+                line = line.strip()
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    break
+                chunk = _parse(data)
+                usage = chunk.get("usage") or usage
+                for choice in chunk.get("choices") or []:
+                    reason = choice.get("finish_reason") or reason
+                    piece = (choice.get("delta") or {}).get("content")
+                    if piece:
+                        yield {"model": name, "message": {"role": "assistant", "content": piece}, "done": False}
+                if time.monotonic() > deadline:
+                    raise LLMTimeout(f"{self.url}: üretim {timeout:g}s'yi aştı")
+            resp.read()
+        yield self._done(name, "", usage, reason)
+
+    def health(self, timeout: float = HEALTH_TIMEOUT) -> bool:
+        try:
+            with self.http.request("GET", "/models", timeout=timeout, headers=self.headers) as resp:
+                resp.read()
+            return True
+        except LLMError:
+            return False
+
+    def close(self):
+        self.http.close()
+
+
+BACKENDS = {"ollama": OllamaBackend, "openai": OpenAIBackend}
+
+
+def parse_backends(spec: str, pool_size: int = POOL_SIZE) -> List:
+    """"ollama:http://a:11434,openai:http://b:8080/v1#model" -> arka uç listesi."""
+    backends = []
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        kind, _, url = item.partition(":")
+        if kind not in BACKENDS or not url:
+            raise ValueError(f"LLM_BACKENDS öğesi anlaşılamadı: {item!r} (tür:url[#model])")
+        url, _, model = url.partition("#")
+        if "://" not in url:
+            url = "http://" + url
+        backends.append(BACKENDS[kind](url, model or None, pool_size))
+    return backends
+
+
+def default_spec() -> str:
+    host = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+    return os.getenv("LLM_BACKENDS") or f"ollama:{host}"
+
+
+# =========================
+# Dengeleyici
+# =========================
+class Endpoint:
+    """Arka uç + sayaçlar (dengeleyicinin kilidi altında güncellenir)."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.inflight = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive = 0
+        self.ejected_until = 0.0
+        self.probing = False
+        self.latency_ms = None              # üstel ortalama
+
+    def stats(self) -> Dict:
+        now = time.monotonic()
+        return dict(url=self.backend.url, kind=self.backend.kind, inflight=self.inflight,
+                    requests=self.requests, failures=self.failures,
+                    ejected_for_s=round(max(0.0, self.ejected_until - now), 1),
+                    latency_ms=round(self.latency_ms, 1) if self.latency_ms is not None else None)
+
+
+class LLMPool:
+    def __init__(self, backends: List, balance: str = BALANCE, eject_after: int = EJECT_AFTER,
+                 eject_seconds: float = EJECT_SECONDS, retries: int = RETRIES, model: str = MODEL,
+                 timeout: float = TIMEOUT, keep_alive=KEEP_ALIVE or None):
+        if not backends:
+            raise ValueError("en az bir LLM arka ucu gerekli")
+        if balance not in ("least_loaded", "round_robin"):
+            raise ValueError(f"bilinmeyen LLM_BALANCE: {balance}")
+        self.endpoints = [Endpoint(b) for b in backends]
+        self.balance = balance
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self.retries = retries
+        self.model = model
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self._lock = threading.Lock()
+        self._next = 0
+
+    # ---------- seçim ----------
+    def _probe(self, ep: Endpoint) -> bool:
+        """Devre dışı süresi dolan uç: sağlık yoklaması (kilit dışında)."""
+        healthy = ep.backend.health()
+        with self._lock:
+            ep.probing = False
+            if healthy:
+                ep.consecutive = 0
+                ep.ejected_until = 0.0
+            else:
+                ep.ejected_until = time.monotonic() + self.eject_seconds
+        return healthy
+
+    def _pick(self, exclude) -> Endpoint:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                live = [ep for ep in self.endpoints if ep not in exclude and ep.ejected_until <= now]
+                due = [ep for ep in live if ep.consecutive >= self.eject_after and not ep.probing]
+                if due:
+                    probe = due[0]
+                    probe.probing = True
+                else:
+                    probe = None
+                    live = [ep for ep in live if ep.consecutive < self.eject_after]
+                    if not live:
+                        # hepsi dışarıda: en erken dönecek olan denenir
+                        rest = [ep for ep in self.endpoints if ep not in exclude] or self.endpoints
+                        live = [min(rest, key=lambda ep: ep.ejected_until)]
+                    n = len(self.endpoints)
+                    order = {id(ep): (i - self._next) % n for i, ep in enumerate(self.endpoints)}
+                    if self.balance == "least_loaded":
+                        ep = min(live, key=lambda ep: (ep.inflight, order[id(ep)]))
+                    else:
+                        ep = min(live, key=lambda ep: order[id(ep)])
+                    self._next = (self.endpoints.index(ep) + 1) % n
+                    ep.inflight += 1
+                    ep.requests += 1
+                    return ep
+            self._probe(probe)
+
+    def _done(self, ep: Endpoint, error: Optional[LLMError], elapsed: float):
+        with self._lock:
+            ep.inflight -= 1
+            if error is None or (error.status is not None and error.status < 500 and error.status != 429):
+                # 4xx istek hatasıdır, ucun sağlığıyla ilgisi yok
+                ep.consecutive = 0
+                if error is None:
+                    ms = elapsed * 1000
+                    ep.latency_ms = ms if ep.latency_ms is None else 0.8 * ep.latency_ms + 0.2 * ms
+                return
+            ep.failures += 1
+            ep.consecutive += 1
+            if ep.consecutive >= self.eject_after:
+                ep.ejected_until = time.monotonic() + self.eject_seconds
+
+    # ---------- çağrılar ----------
+    def chat(self, messages: List[Dict], model: Optional[str] = None, options: Optional[Dict] = None,
+             timeout: Optional[float] = None, keep_alive=None) -> Dict:
+        """Ollama biçiminde tek cevap; "backend" alanı cevabı veren ucu gösterir."""
+        tried = []
+        while True:
+            ep = self._pick(tried)
+            t0 = time.monotonic()
+            try:
+                out = ep.backend.chat(messages, model or self.model, options, timeout or self.timeout,
+                                     self.keep_alive if keep_alive is None else keep_alive)
+            except LLMError as e:
+                self._done(ep, e, time.monotonic() - t0)
+                tried.append(ep)
+                if not e.retriable or len(tried) > self.retries or len(tried) >= len(self.endpoints):
+                    raise
+                continue
+            except BaseException:
+                self._done(ep, LLMError("beklenmeyen hata"), time.monotonic() - t0)
+                raise
+            self._done(ep, None, time.monotonic() - t0)
+            out["backend"] = ep.backend.url
+            return out
+
+    def stream(self, messages: List[Dict], model: Optional[str] = None, options: Optional[Dict] = None,
+               timeout: Optional[float] = None, keep_alive=None) -> Iterator[Dict]:
+        """Parça parça cevap; ilk parçadan önce oluşan hatada bir sonraki uç denenir."""
+        tried = []
+        while True:
+            ep = self._pick(tried)
+            t0 = time.monotonic()
+            started = False
+            try:
+                for part in ep.backend.stream(messages, model or self.model, options,
+                                              timeout or self.timeout,
+                                              self.keep_alive if keep_alive is None else keep_alive):
+                    started = True
+                    if part.get("done"):
+                        part["backend"] = ep.backend.url
+                    yield part
+            except LLMError as e:
+                self._done(ep, e, time.monotonic() - t0)
+                tried.append(ep)
+                if started or not e.retriable or len(tried) > self.retries or len(tried) >= len(self.endpoints):
+                    raise
+                continue
+            except GeneratorExit:
+                # tüketici erken bıraktı: bağlantı kapanır, uç hatalı sayılmaz
+                self._done(ep, None, time.monotonic() - t0)
+                raise
+            except BaseException:
+                self._done(ep, LLMError("beklenmeyen hata"), time.monotonic() - t0)
+                raise
+            self._done(ep, None, time.monotonic() - t0)
+            return
+
+    def stats(self) -> List[Dict]:
+        with self._lock:
+            return [ep.stats() for ep in self.endpoints]
+
+    def probe(self) -> List[Tuple[str, bool]]:
+        return [(ep.backend.url, ep.backend.health()) for ep in self.endpoints]
+
+    def close(self):
+        for ep in self.endpoints:
+            ep.backend.close()
+
+
+_pool: Optional[LLMPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> LLMPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = LLMPool(parse_backends(default_spec()))
+        return _pool
+
+
+def chat(messages: List[Dict], **kw) -> Dict:
+    return get_pool().chat(messages, **kw)
+
+
+def stream(messages: List[Dict], **kw) -> Iterator[Dict]:
+    return get_pool().stream(messages, **kw)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="LLM arka uçlarını yokla / tek soru sor")
+    ap.add_argument("prompt", nargs="?")
+    ap.add_argument("--probe", action="store_true", help="tüm uçların sağlık durumu")
+    ap.add_argument("--stream", action="store_true")
+    args = ap.parse_args()
+
+    pool = get_pool()
+    if args.probe or not args.prompt:
+        for url, ok in pool.probe():
+            print(f"{'✅' if ok else '❌'} {url}")
+        return
+    messages = [{"role": "user", "content": args.prompt}]
+    t0 = time.perf_counter()
+    if args.stream:
+        for part in pool.stream(messages):
+            print(part["message"]["content"], end="", flush=True)
+        print()
+    else:
+        print(pool.chat(messages)["message"]["content"])
+    print(f"ℹ️  {time.perf_counter() - t0:.2f}s  {pool.stats()}")
+
+if __name__ == "__main__":
+    main()
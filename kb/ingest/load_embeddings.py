@@ -1,11 +1,26 @@
+import os
 import json
+import argparse
+from itertools import islice
+from typing import Dict, Iterator, List, Tuple
+
 import psycopg2
-from psycopg2.extras import execute_values
 from sentence_transformers import SentenceTransformer
 from pathlib import Path
 
+from pg_copy import copy_upsert
+from encoder import encoder_for, EncoderPool
+
 # Türkçe destekli model (384 boyutlu)
-model = SentenceTransformer('intfloat/multilingual-e5-small')
+MODEL_NAME = 'intfloat/multilingual-e5-small'
+model = None
+
+def get_model():
+    # --embed-procs ile spawn edilen süreçler bu modülü yeniden import eder; model tembel yüklenir
+    global model
+    if model is None:
+        model = SentenceTransformer(MODEL_NAME)
+    return model
 
 DB_CONFIG = {
     "host": "localhost",
@@ -14,19 +29,65 @@ DB_CONFIG = {
     "password": "troy1234"
 }
 
-def load_embeddings(jsonl_file: str, batch_size: int = 32):
-    """Lokal model ile embedding oluştur ve DB'ye yükle."""
+RAG_COLUMNS = ("chunk_id", "file_name", "section_title", "content", "page_start",
+               "page_end", "chunk_index", "approx_tokens", "embedding")
+RAG_TYPES = ("text", "text", "text", "text", "int4", "int4", "text", "int4", "vector")
+
+def iter_chunks(jsonl_file: str, offset: int = 0) -> Iterator[Tuple[Dict, int]]:
+    """JSONL'i satır satır oku; (chunk, satır sonu byte offset'i) üret."""
+    with open(jsonl_file, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            offset += len(line)
+            if line.strip():
+                yield json.loads(line), offset
+
+def iter_batches(items: Iterator, batch_size: int) -> Iterator[List]:
+    while True:
+        batch = list(islice(items, batch_size))
+        if not batch:
+            return
+        yield batch
+
+def file_signature(jsonl_file: str) -> Dict:
+    st = os.stat(jsonl_file)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+def read_checkpoint(path: Path, signature: Dict) -> Dict:
+    fresh = {"offset": 0, "chunk_id": None, "loaded": 0, "file": signature}
+    if not path.exists():
+        return fresh
+    state = json.loads(path.read_text(encoding='utf-8'))
+    # JSONL yeniden üretildiyse eski offset başka bir satırın ortasına düşer
+    if state.get("file") != signature:
+        print(f"⚠️  {path.name} başka bir dosya sürümüne ait (boyut/mtime değişmiş); baştan başlanıyor")
+        return fresh
+    return state
+
+def write_checkpoint(path: Path, state: Dict):
+    # yarım yazılmış checkpoint kalmasın diye önce geçici dosyaya
+    tmp = path.with_suffix(path.suffix + '.tmp')
+    tmp.write_text(json.dumps(state), encoding='utf-8')
+    os.replace(tmp, path)
+
+def load_embeddings(jsonl_file: str, batch_size: int = 256, resume: bool = False, embed_procs: int = 1):
+    """
+    Lokal model ile embedding oluştur ve DB'ye yükle (akış halinde, batch başına commit).
+    embed_procs > 1: batch'ler N encoder sürecine dağıtılır; sıra korunur,
+    bir batch yazılırken sonrakiler encode edilir.
+    """
     
     if not Path(jsonl_file).exists():
         print(f"Dosya bulunamadı: {jsonl_file}")
         return
     
-    chunks = []
-    with open(jsonl_file, 'r', encoding='utf-8') as f:
-        for line in f:
-            chunks.append(json.loads(line))
-    
-    print(f"Toplam {len(chunks)} chunk işlenecek...")
+    ckpt_path = Path(jsonl_file + '.ckpt')
+    signature = file_signature(jsonl_file)
+    state = (read_checkpoint(ckpt_path, signature) if resume
+             else {"offset": 0, "chunk_id": None, "loaded": 0, "file": signature})
+    total_bytes = signature["size"]
+    if state["offset"]:
+        print(f"Kaldığı yerden devam: offset={state['offset']}, son chunk_id={state['chunk_id']}")
     
     conn = psycopg2.connect(**DB_CONFIG)
     cursor = conn.cursor()
@@ -36,60 +97,81 @@ def load_embeddings(jsonl_file: str, batch_size: int = 32):
     conn.commit()
     
     success_count = 0
+    failed_count = 0
     
-    for i in range(0, len(chunks), batch_size):
-        batch = chunks[i:i+batch_size]
-        texts = [chunk['content'] for chunk in batch]
+    encoder = EncoderPool(MODEL_NAME, embed_procs) if embed_procs > 1 else encoder_for(get_model())
+    try:
+        batches = iter_batches(iter_chunks(jsonl_file, state["offset"]), batch_size)
+        for items, result in encoder.imap(batches, lambda items: [chunk['content'] for chunk, _ in items]):
+            batch = [chunk for chunk, _ in items]
+            end_offset = items[-1][1]
         
-        try:
-            print(f"Embedding oluşturuluyor: {i+1}-{i+len(batch)}/{len(chunks)}")
-            
-            # Lokal model ile embedding
-            embeddings = model.encode(texts, show_progress_bar=False)
+            try:
+                # Lokal model ile embedding
+                embeddings = result()
             
-            data = []
-            for j, chunk in enumerate(batch):
-                data.append((
-                    chunk['chunk_id'],
-                    chunk['file_name'],
-                    chunk.get('section_title'),
-                    chunk['content'],
-                    chunk.get('page_start'),
-                    chunk.get('page_end'),
-                    chunk.get('chunk_index'),
-                    chunk.get('approx_tokens'),
-                    embeddings[j].tolist()
-                ))
+                data = (
+                    (
+                        chunk['chunk_id'],
+                        chunk['file_name'],
+                        chunk.get('section_title'),
+                        chunk['content'],
+                        chunk.get('page_start'),
+                        chunk.get('page_end'),
+                        chunk.get('chunk_index'),
+                        chunk.get('approx_tokens'),
+                        embeddings[j]
+                    )
+                    for j, chunk in enumerate(batch)
+                )
             
-            execute_values(
-                cursor,
-                """
-                INSERT INTO rag_documents 
-                (chunk_id, file_name, section_title, content, page_start, 
-                 page_end, chunk_index, approx_tokens, embedding)
-                VALUES %s
-                ON CONFLICT (chunk_id) DO UPDATE SET
-                    embedding = EXCLUDED.embedding,
-                    updated_at = NOW()
-                """,
-                data
-            )
+                # Binary COPY -> geçici tablo -> ON CONFLICT upsert
+                copy_upsert(
+                    cursor,
+                    "rag_documents",
+                    RAG_COLUMNS,
+                    RAG_TYPES,
+                    data,
+                    conflict="chunk_id",
+                    update_sql="embedding = EXCLUDED.embedding, updated_at = NOW()",
+                )
             
-            conn.commit()
-            success_count += len(batch)
-            print(f"✓ {success_count}/{len(chunks)} chunk yüklendi")
+                conn.commit()
+                success_count += len(batch)
+                # İlk hatalı batch'ten sonra checkpoint ilerlemez: --resume o batch'ten
+                # devam eder, sonrakiler upsert ile yeniden yazılır
+                if not failed_count:
+                    state = {"offset": end_offset, "chunk_id": batch[-1]['chunk_id'],
+                             "loaded": state["loaded"] + len(batch), "file": signature}
+                    write_checkpoint(ckpt_path, state)
+                print(f"✓ {success_count} chunk yüklendi ({end_offset * 100 // max(total_bytes, 1)}%)")
             
-        except Exception as e:
-            print(f"✗ Hata (batch {i}): {e}")
-            conn.rollback()
-            continue
+            except Exception as e:
+                print(f"✗ Hata (chunk {batch[0]['chunk_id']}..{batch[-1]['chunk_id']}): {e}")
+                conn.rollback()
+                failed_count += len(batch)
+                continue
+    finally:
+        # hata / Ctrl-C'de de encoder süreçleri ve bağlantı kapansın
+        if embed_procs > 1:
+            encoder.close()
+        cursor.close()
+        conn.close()
     
-    cursor.close()
-    conn.close()
-    
-    print(f"\n✓ İşlem tamamlandı! {success_count}/{len(chunks)} chunk başarıyla yüklendi")
+    print(f"\n✓ İşlem tamamlandı! {success_count} chunk yüklendi, {failed_count} hatalı")
+    if failed_count:
+        print(f"⚠️  checkpoint ilk hatalı batch'ten önce kaldı (offset={state['offset']}); "
+              f"--resume ile hatalılar yeniden denenir")
 
-if __name__ == "__main__":
+def main():
     project_root = Path(__file__).parent.parent.parent
-    jsonl_file = project_root / "temiz_rag_chunks.jsonl"
-    load_embeddings(str(jsonl_file))
\ No newline at end of file
+    ap = argparse.ArgumentParser(description="JSONL chunk'larını embed edip rag_documents'a yükler.")
+    ap.add_argument('--file', default=str(project_root / "temiz_rag_chunks.jsonl"))
+    ap.add_argument('--batch-size', type=int, default=256)
+    ap.add_argument('--resume', action='store_true', help="son checkpoint'ten (<file>.ckpt) devam et")
+    ap.add_argument('--embed-procs', type=int, default=1, help="encoder süreç sayısı (her biri cpu/N thread)")
+    args = ap.parse_args()
+    load_embeddings(args.file, batch_size=args.batch_size, resume=args.resume, embed_procs=args.embed_procs)
+
+if __name__ == "__main__":
+    main()
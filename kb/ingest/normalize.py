@@ -0,0 +1,320 @@
+# kb/ingest/normalize.py
+"""
+Tek geçişli metin normalizasyonu.
+
+Temizleyiciler sayfa başına 4-6 ayrı re.sub çalıştırıyordu; bazı desenler
+(tek harf + boşluk dizilerinde çok adımlı lookahead, DOTALL altında .*?,
+boş satır dizilerinde ^\\s*) uzun/bozuk sayfalarda karesel süreye çıkıyordu.
+Burada her profilin kuralları tek bir derlenmiş alternasyonda birleşir,
+metin soldan sağa bir kez taranır ve eşleşen parçanın türüne göre çıktı
+üretilir. Kurallar arasındaki sıra etkileri (bir kuralın sildiği yerde
+boşlukların birleşmesi vb.) parça sınırlarında korunur; çıktılar eski
+fonksiyonlarla birebir aynıdır (kb/bench/check_normalize.py).
+
+Profiller:
+  plain_text(t)   process_pdfs_hf.clean_text     (tek satır, bozuk karakter, harf aralığı)
+  page_lines(t)   ingest_hf.norm_spaces          (satır yapısı korunur)
+  preprocess(t)   preprocess_pdf.clean_text
+  pdf_page(t)     clean_pdf_data.clean_page_text (header/footer, sayfa no, görsel ref, imza)
+  strip_toc(t)    clean_pdf_data.remove_toc_block
+"""
+import re
+from typing import Dict, List, Tuple, Union
+
+_WORD = re.compile(r"\w")
+
+
+def _is_word(ch: str) -> bool:
+    return bool(ch) and _WORD.match(ch) is not None
+
+
+def _alternation(rules: Dict[str, Union[str, Tuple[str, str]]]):
+    """
+    Kuralları (?P<ad>...) gruplarıyla tek desende birleştir; m.lastgroup hangi
+    kuralın eşleştiğini söyler. Tüm kurallar (ilk karakter sınıfı, devamı)
+    olarak verilirse desen tek bir karakter sınıfıyla başlar: sre adayları bu
+    sınıfla C içinde tarar (grup alternasyonuyla başlayan desende bu ön süzgeç
+    yoktur, motor her konumda tüm dalları dener). Dal sırası korunur; ilk
+    karakter sınıfları birleştirildiği için "-" kaçışlı (r"\\-") yazılır.
+    """
+    if all(isinstance(r, tuple) for r in rules.values()):
+        leads = "".join(lead for lead, _ in rules.values())
+        body = "|".join(f"(?<=[{lead}])(?P<{name}>{rest})" for name, (lead, rest) in rules.items())
+        return re.compile(f"[{leads}](?:{body})")
+    return re.compile("|".join(f"(?P<{name}>{pattern})" for name, pattern in rules.items()))
+
+
+# =========================
+# plain_text: process_pdfs_hf.clean_text
+# =========================
+# \s+ -> ' ' sonrası hâlâ kalan kontrol karakterleri (\x0b, \x0c, \x1c-\x1f, \x85 zaten boşluk)
+_CTL = r"\x00-\x08\x0e-\x1b\x7f-\x84\x86-\x9f"
+# "k e l i m e" birleştirme: boşluktan sonra tek harf, boşluk, tek harf, boşluk, tek harf.
+# Eski (?=\w(?:\s\w){2,}) lookahead'inin {2,} kısmı sonucu değiştirmez, sadece süreyi
+# uzatır; sabit uzunluklu karşılığı kontrol karakterlerini atlayarak ham metinde bakar.
+_SPACED = re.compile(rf"[{_CTL}]*\w[{_CTL}]*\s+[{_CTL}]*\w[{_CTL}]*\s+[{_CTL}]*\w")
+_CTL_CHARS = frozenset(chr(c) for c in [*range(0x00, 0x09), *range(0x0e, 0x1c),
+                                        *range(0x7f, 0x85), *range(0x86, 0xa0)])
+# Tek boşluklar yalnızca harf aralığı kuralı uygulanabiliyorsa ele alınır
+_PLAIN = _alternation({
+    "ws": (r"\s", rf"\s+|(?<=[^\S ])|(?={_SPACED.pattern})"),   # \s{2,} | [^\S ] | ' '(?=...)
+    "ctl": (_CTL, rf"[{_CTL}]*"),
+    "dash": (r"\-", rf"(?:[{_CTL}]*-)+"),
+})
+
+
+def _plain_token(m) -> str:
+    kind = m.lastgroup
+    if kind == "ctl":
+        return ""
+    if kind == "dash":
+        return " "
+    s, i = m.string, m.start() - 1
+    while i >= 0 and s[i] in _CTL_CHARS:
+        i -= 1
+    if i >= 0 and _is_word(s[i]) and _SPACED.match(s, m.end()):
+        return ""
+    return " "
+
+
+def plain_text(text: str) -> str:
+    """Boşlukları tekle, bozuk karakterleri at, aralıklı harfleri birleştir, --- -> ' '."""
+    if not text:
+        return ""
+    return _PLAIN.sub(_plain_token, text).strip()
+
+
+# =========================
+# page_lines: ingest_hf.norm_spaces
+# =========================
+_LINES_REPL = {"hy": "", "nl": "\n", "nl_lead": "\n", "blank": " ", "tab": " "}
+_LINES = _alternation({
+    "hy": (r"\-", r"\n(?=\w)"),              # satır sonu tire: "yan-\nlış" -> "yanlış"
+    "nl": (r" \t", r"[ \t]*\n[ \t]*"),     # satır sonu boşlukları
+    "nl_lead": (r"\n", r"[ \t]+"),         # satır başı boşlukları
+    "blank": (" ", r"[ \t]+"),
+    "tab": (r"\t", r"[ \t]*"),
+})
+
+
+def page_lines(text: str) -> str:
+    """Satır sonu tireleri birleştir, satır içi boşlukları tekle, satır kenarlarını kırp."""
+    return _LINES.sub(lambda m: _LINES_REPL[m.lastgroup], text).strip()
+
+
+# =========================
+# preprocess: preprocess_pdf.clean_text
+# =========================
+# Silinen "-\n" (tek satır sonu) ve \r, iki yanındaki boşlukları birleştirir
+_GAP = r"(?:\r|-\r*\n(?!\r*\n))"
+_PRE = _alternation({
+    "blanks": (r" \t", rf"{_GAP}*[ \t](?:[ \t]|{_GAP})*"),
+    "blank": (r" \t", rf"{_GAP}+"),
+    "hy": (r"\-", r"\r*\n(?:\r*\n)*"),
+    "nl": (r"\n", r"(?:\r*\n){2,}"),
+    "cr": (r"\r", r"\r*"),
+})
+
+
+def _pre_token(m) -> str:
+    kind = m.lastgroup
+    if kind == "blanks":
+        return " "
+    if kind == "blank":
+        return m.group()[0]
+    if kind == "hy":
+        # \n{3,} -> \n\n sonrası "-\n" silinir: tek satır sonu tamamen, fazlası tek \n kalır
+        return "\n" if m.group().count("\n") >= 2 else ""
+    if kind == "nl":
+        return "\n\n"
+    return ""
+
+
+def preprocess(text: str) -> str:
+    """\\r sil, 3+ boş satırı ikiye indir, satır sonu tirelerini birleştir, çoklu boşluğu tekle."""
+    return _PRE.sub(_pre_token, text).strip()
+
+
+# =========================
+# pdf_page: clean_pdf_data.clean_page_text
+# =========================
+# (A) Header/Footer: "KULLANICI KILAVUZU ... DAHİLİ" blokları
+_HEADER_START = re.compile(r"KULLANICI KILAVUZU|TALİMAT", re.IGNORECASE)
+_HEADER_END = re.compile(r"DAHİLİ|GENEL", re.IGNORECASE)
+
+# Tek başına satırdaki "sayfa 5", "5/26" ya da 1-3 haneli sayı (önceki/sonraki boş satırlarla).
+# İyelikli niceleyici (\s*+) yok: re 3.11 öncesinde desteklemiyor. \s ile rakam/harf ayrık
+# olduğundan geri izleme eşleşmeyi değiştirmez.
+_PAGE_NO = r"(?:(?i:sayfa)\s*\d+|\d+\s*/\s*\d+|\d{1,3})(?:\s*\Z|\s*(?=\n))"
+_PAGE_NO_LINE = re.compile(_PAGE_NO)
+_VISUAL_REF = r"\b(?i:Görsel|Tablo|Şekil)[- ]?\d+\b"
+_SIGNOFF = r"(?i:Hazırlayan|Kontrol Eden|Onaylayan|OPERASYON MÜDÜRLÜĞÜ|FİYAT VE İNDİRİM PLANLAMA MÜDÜRÜ).*"
+_VISUAL_OR_SIGNOFF = re.compile(f"{_VISUAL_REF}|{_SIGNOFF}")
+
+_PAGE_FIRST = re.compile(rf"\s*{_PAGE_NO}")      # metnin başındaki sayfa no satırı
+# Görsel/imza kuralları ilk harfleri ön süzgece girecek şekilde yazılır; (?i) altında
+# K'ya Kelvin işareti (U+212A) da denk gelir.
+_PAGE = _alternation({
+    "pno": (r"\n", rf"\s*{_PAGE_NO}"),
+    "hy": (r"\-", r"(?<=\w-)\n(?=\w)"),
+    "visual": ("GgTtŞş", r"(?<!\w[GgTtŞş])(?:(?<=[Gg])(?i:örsel)|(?<=[Tt])(?i:ablo)|(?<=[Şş])(?i:ekil))[- ]?\d+\b"),
+    "signoff": ("HhKk\u212aOoFf", r"(?:(?<=[Hh])(?i:azırlayan)|(?<=[Kk\u212a])(?i:ontrol Eden)"
+                                 r"|(?<=[Oo])(?i:naylayan|PERASYON MÜDÜRLÜĞÜ)"
+                                 r"|(?<=[Ff])(?i:İYAT VE İNDİRİM PLANLAMA MÜDÜRÜ)).*"),
+    "nl": (r"\n", r"\s+"),
+    "blank": (" ", r"[ \t]+"),
+    "tab": (r"\t", r"[ \t]*"),
+})
+
+_BLANKS = re.compile(r"[ \t]+")
+_NEWLINES = re.compile(r"\n{3,}")
+
+
+def _norm_ws(s: str) -> str:
+    return _NEWLINES.sub("\n\n", _BLANKS.sub(" ", s))
+
+
+class _Emitter:
+    """Parçaları biriktirir; parça sınırlarında birleşen boşluk/satır dizilerini normalize eder."""
+
+    def __init__(self):
+        self.out: List[str] = []
+        self.tail = ""          # son parçanın sonundaki [ \t\n] dizisi (sonraki parçayla birleşebilir)
+
+    def emit(self, piece: str):
+        if not piece:
+            return
+        body = piece.lstrip(" \t\n")
+        if not body:
+            self.tail += piece
+            return
+        lead = piece[:len(piece) - len(body)]
+        trimmed = body.rstrip(" \t\n")
+        if self.tail or lead:
+            self.out.append(_norm_ws(self.tail + lead))
+        self.out.append(trimmed)
+        self.tail = body[len(trimmed):]
+
+    def last_char(self) -> str:
+        if self.tail:
+            return self.tail[-1]
+        return self.out[-1][-1] if self.out and self.out[-1] else ""
+
+    def ends_with_hyphen(self) -> bool:
+        """Çıktı "<harf>-" ile mi bitiyor (boşluksuz)."""
+        if self.tail:
+            return False
+        end = "".join(self.out[-2:])[-2:]
+        return len(end) == 2 and end[1] == "-" and _is_word(end[0])
+
+    def drop_last(self):
+        self.out[-1] = self.out[-1][:-1]
+
+    def text(self) -> str:
+        return "".join(self.out) + _norm_ws(self.tail)
+
+
+def _remove_headers(text: str) -> str:
+    """Her başlangıç kelimesini ardından gelen ilk bitiş kelimesine kadar ' ' yap (tek tarama)."""
+    pieces, pos = [], 0
+    while True:
+        start = _HEADER_START.search(text, pos)
+        if not start:
+            break
+        end = _HEADER_END.search(text, start.end())
+        if not end:
+            break           # sonrasında bitiş kelimesi yok; sonraki başlangıçlar da eşleşemez
+        pieces.append(text[pos:start.start()])
+        pieces.append(" ")
+        pos = end.end()
+    if not pieces:
+        return text
+    pieces.append(text[pos:])
+    return "".join(pieces)
+
+
+def _joinable(text: str, i: int) -> bool:
+    """Tire birleştirmede sağdaki harf: daha önceki kurallarla silinecek bir satırın başı olmamalı."""
+    return (i < len(text) and _is_word(text[i])
+            and not _PAGE_NO_LINE.match(text, i) and not _VISUAL_OR_SIGNOFF.match(text, i))
+
+
+def pdf_page(text: str) -> str:
+    """
+    PDF sayfa gürültüsünü temizle ve boşlukları sadeleştir. Header blokları
+    birden çok satıra yayılabildiği için önce ayrı bir token taramasıyla
+    ' ' yapılır; kalan kurallar tek geçişte uygulanır.
+    """
+    if not text:
+        return ""
+    text = _remove_headers(text)
+    em = _Emitter()
+    pos, page_no_end, join_end = 0, -1, -1
+    first = _PAGE_FIRST.match(text)
+    if first:
+        pos = page_no_end = first.end()
+    while True:
+        m = _PAGE.search(text, pos)
+        if not m:
+            break
+        s, kind = m.start(), m.lastgroup
+        em.emit(text[pos:s])
+        pos = m.end()
+        if kind == "pno":
+            # Önceki sayfa no eşleşmesi tam bu \n'den önce bittiyse satır başı \n'in kendisi
+            if not (page_no_end == s and s > 0 and text[s - 1] == "\n"):
+                em.emit("\n")
+            page_no_end = pos
+        elif kind == "hy":
+            if _is_word(em.last_char()) and join_end != s and _joinable(text, s + 2):
+                join_end = s + 3             # sağdaki harf de eşleşmeye dahildi
+                pos = s + 2
+            else:
+                em.emit("-")
+                pos = s + 1
+        elif kind == "visual":
+            em.emit(" ")
+        elif kind == "signoff":
+            # "kelime-Hazırlayan ...\nx": imza silinince oluşan "-\n" de birleşir
+            if (text.startswith("\n", pos) and em.ends_with_hyphen() and join_end != s - 1
+                    and _joinable(text, pos + 1)):
+                em.drop_last()
+                join_end = pos + 2
+                pos += 1
+        else:                               # nl, blank, tab
+            em.emit(_norm_ws(m.group()))
+    em.emit(text[pos:])
+    return em.text().strip()
+
+
+# =========================
+# strip_toc: clean_pdf_data.remove_toc_block
+# =========================
+_TOC_START = re.compile(r"(?i)\bİÇİNDEKİLER\b")
+_TOC_RUN = re.compile(r"\n\s*")
+_TOC_NUMBER = re.compile(r"\d+(?:\.\d+)*\s+")
+
+
+def strip_toc(full_text: str, head_chars: int = 8000) -> str:
+    """
+    Belge başındaki İÇİNDEKİLER bloğunu sil: başlıktan sonraki ilk
+    "\\n<boşluk>1.2 " satır başına ya da ilk boş satıra kadar.
+    Boşluk dizileri bir kez taranır (eski .*? deseni her \\n'de diziyi baştan tarıyordu).
+    """
+    head = full_text[:head_chars]
+    start = _TOC_START.search(head)
+    if not start:
+        return full_text
+    for run in _TOC_RUN.finditer(head, start.end()):
+        num = _TOC_NUMBER.match(head, run.end())
+        if num:
+            end = num.end()
+        else:
+            double = head.find("\n\n", run.start(), run.end())
+            if double < 0:
+                continue
+            end = double + 2
+            while end < len(head) and head[end] == "\n":
+                end += 1
+        return full_text[:start.start()] + full_text[end:]
+    return full_text
@@ -0,0 +1,404 @@
+# kb/ingest/pdf_text.py
+"""
+Ortak PDF sayfa metni çıkarımı + kalıcı SQLite cache.
+
+Anahtar: (dosya sha256, extractor modu [+ocr], sayfa no). Aynı dosya tekrar
+işlendiğinde (chunk denemeleri, yeniden ingest) pypdf hiç açılmaz; yalnızca
+cache'te olmayan sayfalar çıkarılır. Sayfa başına çıkarım süresi de saklanır.
+
+Modlar:
+  plain            page.extract_text()
+  layout           page.extract_text(extraction_mode="layout")
+  layout_fallback  layout, boş dönerse plain
+  adaptive         birkaç örnek sayfada iki mod ölçülür; layout yalnızca
+                   sütun/tablo yapısı varsa ve makul sürede çalışıyorsa seçilir
+                   (karar da cache'lenir)
+
+page_timeout > 0 ise sayfalar ayrı bir process'te çıkarılır; süreyi aşan
+sayfada process öldürülüp sonraki sayfadan yeniden başlatılır, sayfa boş
+kalır (ocr=True ise gömülü görselleri OCR'a gönderilir). Süre aşan sayfalar
+ve çıkarımda hata veren sayfalar cache'lenmez, bir sonraki çalıştırmada
+yeniden denenir.
+
+Kullanım:
+  from pdf_text import extract_pages
+  pages = extract_pages("kb/data/docs/x.pdf")           # ['sayfa1 metni', ...]
+
+  python kb/ingest/pdf_text.py stats
+  python kb/ingest/pdf_text.py warm kb/data/docs --mode adaptive --page-timeout 10
+  python kb/ingest/pdf_text.py clear
+"""
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import argparse
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import multiprocessing as mp
+
+import pypdf
+from pypdf import PdfReader
+
+CACHE_PATH = os.getenv("PDF_TEXT_CACHE", str(Path(__file__).resolve().parent.parent / "data" / "pdf_text_cache.sqlite"))
+MODES = ("plain", "layout", "layout_fallback", "adaptive")
+PAGE_TIMEOUT = float(os.getenv("PDF_PAGE_TIMEOUT", "0"))          # saniye; 0 = sınırsız, process yok
+OCR_TIMEOUT = float(os.getenv("PDF_OCR_TIMEOUT", "60"))
+LAYOUT_SAMPLE = int(os.getenv("PDF_LAYOUT_SAMPLE", "3"))             # adaptive: örnek sayfa sayısı
+LAYOUT_MAX_RATIO = float(os.getenv("PDF_LAYOUT_MAX_RATIO", "4"))     # layout süresi / plain süresi üst sınırı
+LAYOUT_MIN_STRUCTURE = float(os.getenv("PDF_LAYOUT_MIN_STRUCTURE", "0.15"))  # sütun boşluklu satır oranı
+
+_COLUMN_GAP = re.compile(r"\S {3,}\S")
+
+_conn: Optional[sqlite3.Connection] = None
+_conn_pid: Optional[int] = None
+
+
+class ExtractStats:
+    def __init__(self):
+        self.files = self.hits = self.misses = self.timeouts = self.ocr_pages = 0
+        self.seconds = 0.0
+        self.slowest: List[Tuple[float, str, int]] = []
+        self.modes: Dict[str, int] = {}
+
+    def add_page(self, path: str, page: int, seconds: float):
+        self.misses += 1
+        self.seconds += seconds
+        self.slowest = sorted(self.slowest + [(seconds, os.path.basename(path), page)], reverse=True)[:5]
+
+    def report(self):
+        if not self.files:
+            return
+        total = self.hits + self.misses
+        per_page = self.seconds / self.misses * 1000 if self.misses else 0.0
+        print(f"📄 pdf_text: dosya={self.files}, sayfa={total}, cache hit={self.hits} "
+              f"({self.hits / total * 100 if total else 0:.0f}%), çıkarım={self.seconds:.1f}s "
+              f"({per_page:.0f}ms/sayfa), süre aşımı={self.timeouts}, ocr={self.ocr_pages}")
+        if self.modes:
+            print("   adaptive seçimleri: " + ", ".join(f"{m}={n}" for m, n in sorted(self.modes.items())))
+        for secs, name, page in self.slowest:
+            print(f"   yavaş: {name} s.{page}: {secs * 1000:.0f}ms")
+
+
+STATS = ExtractStats()
+
+
+def _db() -> sqlite3.Connection:
+    """Süreç başına tek bağlantı (fork sonrası yeniden açılır)."""
+    global _conn, _conn_pid
+    if _conn is None or _conn_pid != os.getpid():
+        os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+        _conn = sqlite3.connect(CACHE_PATH, timeout=30)
+        _conn_pid = os.getpid()
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+              sha256  TEXT NOT NULL,
+              mode    TEXT NOT NULL,
+              page    INTEGER NOT NULL,
+              text    TEXT NOT NULL,
+              seconds REAL NOT NULL,
+              PRIMARY KEY (sha256, mode, page)
+            )""")
+        _conn.execute("""
+            CREATE TABLE IF NOT EXISTS documents (
+              sha256  TEXT NOT NULL,
+              mode    TEXT NOT NULL,
+              n_pages INTEGER NOT NULL,
+              PRIMARY KEY (sha256, mode)
+            )""")
+        _conn.execute("""
+            CREATE TABLE IF NOT EXISTS decisions (
+              sha256  TEXT NOT NULL,
+              mode    TEXT NOT NULL,
+              chosen  TEXT NOT NULL,
+              PRIMARY KEY (sha256, mode)
+            )""")
+    return _conn
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def cache_mode(mode: str, ocr: bool = False) -> str:
+    # pypdf sürümü değişince çıktı da değişebilir; anahtara dahil.
+    # OCR'lı çıkarım ayrı anahtarda: OCR'sız çalıştırmalara OCR metni dönmez
+    return f"{mode}{'+ocr' if ocr else ''}@pypdf-{pypdf.__version__}"
+
+
+def extract_page(page, mode: str) -> str:
+    if mode == "plain":
+        return page.extract_text() or ""
+    txt = page.extract_text(extraction_mode="layout") or ""
+    if mode == "layout_fallback" and not txt.strip():
+        txt = page.extract_text() or ""
+    return txt
+
+
+def _ocr_page(page) -> str:
+    """Sayfadaki gömülü görselleri OCR'la (taranmış/çıkarılamayan sayfalar için)."""
+    from emails_ocr import preprocess, usable_image, OCR_LANG, OCR_CONFIG
+    import io
+    import pytesseract
+    from PIL import Image
+    out = []
+    for im in page.images:
+        if usable_image(im.data):
+            img = preprocess(Image.open(io.BytesIO(im.data)))
+            out.append(pytesseract.image_to_string(img, lang=OCR_LANG, config=OCR_CONFIG).strip())
+    return "\n\n".join(t for t in out if t)
+
+
+class _InProcess:
+    """Süre sınırı yok: sayfalar bu process'te çıkarılır."""
+
+    def __init__(self, path: str):
+        self.reader = PdfReader(path)
+        self.n_pages = len(self.reader.pages)
+
+    def extract(self, i: int, mode: str) -> Tuple[Optional[str], float]:
+        t0 = time.perf_counter()
+        page = self.reader.pages[i - 1]
+        txt = _ocr_page(page) if mode == "ocr" else extract_page(page, mode)
+        return txt, time.perf_counter() - t0
+
+    def close(self):
+        pass
+
+
+def _worker_loop(path: str, conn):
+    reader = PdfReader(path)
+    conn.send(len(reader.pages))
+    while True:
+        msg = conn.recv()
+        if msg is None:
+            return
+        i, mode = msg
+        try:
+            page = reader.pages[i - 1]
+            conn.send((True, _ocr_page(page) if mode == "ocr" else extract_page(page, mode)))
+        except Exception as e:
+            conn.send((False, str(e)))
+
+
+class _PageWorker:
+    """Sayfaları ayrı process'te çıkar; süre aşımında process öldürülür, gerekince yeniden açılır."""
+
+    def __init__(self, path: str, timeout: float):
+        self.path, self.timeout = path, timeout
+        self.proc = self.conn = None
+        self.n_pages = self._start()
+
+    def _start(self) -> int:
+        ctx = mp.get_context("fork" if "fork" in mp.get_all_start_methods() else "spawn")
+        self.conn, child = ctx.Pipe()
+        self.proc = ctx.Process(target=_worker_loop, args=(self.path, child), daemon=True)
+        self.proc.start()
+        child.close()
+        # dosyanın açılması da takılabilir; sayfa süresinden daha cömert bekle
+        if not self.conn.poll(max(30.0, self.timeout * 3)):
+            self.kill()
+            raise TimeoutError(f"PDF açılamadı (süre aşımı): {self.path}")
+        return self.conn.recv()
+
+    def extract(self, i: int, mode: str) -> Tuple[Optional[str], float]:
+        """(metin, süre); süre aşımında (None, süre). Çıkarım hatası boş metin döner."""
+        if self.proc is None:
+            self._start()
+        t0 = time.perf_counter()
+        self.conn.send((i, mode))
+        if self.conn.poll(OCR_TIMEOUT if mode == "ocr" else self.timeout):
+            ok, txt = self.conn.recv()
+            if not ok:
+                raise RuntimeError(txt)
+            return txt, time.perf_counter() - t0
+        self.kill()
+        return None, time.perf_counter() - t0
+
+    def kill(self):
+        if self.proc is not None:
+            self.proc.kill()
+            self.proc.join()
+            self.conn.close()
+            self.proc = self.conn = None
+
+    def close(self):
+        if self.proc is not None:
+            self.conn.send(None)
+            self.proc.join(5)
+            self.kill()
+
+
+def _sample_pages(n_pages: int, k: int) -> List[int]:
+    if n_pages <= k:
+        return list(range(1, n_pages + 1))
+    return sorted({1 + round(j * (n_pages - 1) / (k - 1)) for j in range(k)}) if k > 1 else [1]
+
+
+def choose_mode(ex, sample: int = LAYOUT_SAMPLE) -> Tuple[str, Dict[int, Tuple[str, float]]]:
+    """
+    Örnek sayfalarda plain ve layout'u ölç. Layout yalnızca sütun/tablo yapısı
+    gösteriyorsa (geniş boşluklu satır oranı) ve plain'e göre makul sürede
+    çalışıyorsa seçilir. Örnek sayfaların seçilen moddaki çıktısı da döner.
+    """
+    plain: Dict[int, Tuple[str, float]] = {}
+    layout: Dict[int, Tuple[str, float]] = {}
+    for i in _sample_pages(ex.n_pages, sample):
+        try:
+            p, tp = ex.extract(i, "plain")
+            l, tl = ex.extract(i, "layout") if p is not None else (None, 0.0)
+        except Exception:
+            continue
+        if p is not None:
+            plain[i] = (p, tp)
+        if l is None:
+            # layout süre aşımına düştü: bu doküman için layout denenmez
+            return "plain", plain
+        layout[i] = (l, tl)
+    if not layout:
+        return "plain", plain
+
+    lines = [ln for t, _ in layout.values() for ln in t.splitlines() if ln.strip()]
+    structure = sum(1 for ln in lines if _COLUMN_GAP.search(ln.strip())) / len(lines) if lines else 0.0
+    t_plain = sum(t for _, t in plain.values())
+    t_layout = sum(t for _, t in layout.values())
+    if structure >= LAYOUT_MIN_STRUCTURE and t_layout <= LAYOUT_MAX_RATIO * t_plain + 0.05 * len(layout):
+        chosen = {i: ((l if l.strip() else plain.get(i, ("", 0.0))[0]), t) for i, (l, t) in layout.items()}
+        return "layout_fallback", chosen
+    return "plain", plain
+
+
+def extract_pages(path: str, mode: str = "plain", use_cache: bool = True,
+                  page_timeout: float = PAGE_TIMEOUT, ocr: bool = False) -> List[str]:
+    """Sayfa metinleri (indeks = sayfa_no - 1). Okunamayan/süresi aşan sayfa boş metin döner."""
+    if mode not in MODES:
+        raise ValueError(f"bilinmeyen mod: {mode}")
+    STATS.files += 1
+    key = file_sha256(path)
+    db = _db() if use_cache else None
+
+    if mode == "adaptive" and db is not None:
+        row = db.execute("SELECT chosen FROM decisions WHERE sha256=? AND mode=?",
+                         (key, cache_mode(mode))).fetchone()
+        if row:
+            mode = row[0]
+            STATS.modes[mode] = STATS.modes.get(mode, 0) + 1
+
+    cached: Dict[int, str] = {}
+    inherited = set()
+    if db is not None and mode != "adaptive":
+        cmode = cache_mode(mode, ocr)
+        row = db.execute("SELECT n_pages FROM documents WHERE sha256=? AND mode=?", (key, cmode)).fetchone()
+        cached = dict(db.execute("SELECT page, text FROM pages WHERE sha256=? AND mode=?", (key, cmode)))
+        if row and len(cached) >= row[0]:
+            STATS.hits += row[0]
+            return [cached.get(i, "") for i in range(1, row[0] + 1)]
+        if ocr:
+            # OCR'sız çıkarımın dolu sayfaları aynen geçerli; boş sayfalar yeniden çıkarılıp OCR'a gider
+            base = {i: t for i, t in db.execute("SELECT page, text FROM pages WHERE sha256=? AND mode=?",
+                                                 (key, cache_mode(mode))) if t.strip()}
+            inherited = set(base) - set(cached)
+            cached = {**base, **cached}
+
+    ex = _PageWorker(path, page_timeout) if page_timeout > 0 else _InProcess(path)
+    try:
+        sampled: Dict[int, Tuple[str, float]] = {}
+        if mode == "adaptive":
+            mode, sampled = choose_mode(ex)
+            STATS.modes[mode] = STATS.modes.get(mode, 0) + 1
+            if db is not None:
+                with db:
+                    db.execute("INSERT OR REPLACE INTO decisions VALUES (?, ?, ?)",
+                               (key, cache_mode("adaptive"), mode))
+        cmode = cache_mode(mode, ocr)
+
+        texts, fresh = [], []
+        for i in range(1, ex.n_pages + 1):
+            if i in cached:
+                STATS.hits += 1
+                texts.append(cached[i])
+                if i in inherited:
+                    fresh.append((key, cmode, i, cached[i], 0.0))
+                continue
+            # Hata ya da süre aşımıyla boş kalan sayfa cache'lenmez, sonraki çalıştırmada yeniden denenir
+            failed = False
+            if i in sampled:
+                txt, secs = sampled[i]
+            else:
+                try:
+                    txt, secs = ex.extract(i, mode)
+                except Exception as e:
+                    print(f"  ⚠️  {os.path.basename(path)} s.{i} okuma hatası: {e}")
+                    txt, secs, failed = "", 0.0, True
+            STATS.add_page(path, i, secs)
+            if txt is None:
+                STATS.timeouts += 1
+                print(f"  ⏱️  {os.path.basename(path)} s.{i}: {secs:.1f}s süre aşımı, atlandı")
+                txt, failed = "", True
+            if ocr and not txt.strip():
+                try:
+                    o, osecs = ex.extract(i, "ocr")
+                except Exception as e:
+                    print(f"  ⚠️  {os.path.basename(path)} s.{i} OCR hatası: {e}")
+                    o, osecs = None, 0.0
+                if o is None:
+                    failed = True       # OCR hatası / süre aşımı: sonraki çalıştırmada yeniden denensin
+                elif o:
+                    STATS.ocr_pages += 1
+                    txt, secs, failed = o, secs + osecs, False
+            texts.append(txt)
+            if not failed:
+                fresh.append((key, cmode, i, txt, secs))
+    finally:
+        ex.close()
+
+    if db is not None:
+        with db:
+            db.executemany("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)", fresh)
+            if len(fresh) + len(cached) - len(inherited) == len(texts):
+                db.execute("INSERT OR REPLACE INTO documents VALUES (?, ?, ?)", (key, cmode, len(texts)))
+    return texts
+
+
+def report():
+    STATS.report()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="PDF sayfa metni cache'i")
+    ap.add_argument("command", choices=["stats", "warm", "clear"])
+    ap.add_argument("pdf_dir", nargs="?", default="kb/data/docs")
+    ap.add_argument("--mode", choices=MODES, default="plain")
+    ap.add_argument("--page-timeout", type=float, default=PAGE_TIMEOUT)
+    args = ap.parse_args()
+
+    if args.command == "clear":
+        if os.path.exists(CACHE_PATH):
+            db = _db()
+            with db:
+                db.execute("DELETE FROM pages")
+                db.execute("DELETE FROM documents")
+            db.execute("VACUUM")
+        print(f"🗑️  cache temizlendi: {CACHE_PATH}")
+    elif args.command == "warm":
+        for pdf in sorted(Path(args.pdf_dir).glob("*.pdf")):
+            extract_pages(str(pdf), args.mode, page_timeout=args.page_timeout)
+        report()
+    else:
+        db = _db()
+        for cmode, docs, pages, secs in db.execute("""
+            SELECT p.mode, COUNT(DISTINCT p.sha256), COUNT(*), SUM(p.seconds)
+            FROM pages p GROUP BY p.mode ORDER BY p.mode"""):
+            print(f"{cmode}: dosya={docs}, sayfa={pages}, "
+                  f"ilk çıkarım={secs:.1f}s ({secs / pages * 1000:.0f}ms/sayfa)")
+        print(f"cache: {CACHE_PATH} ({os.path.getsize(CACHE_PATH) / 1e6:.1f}MB)")
+
+if __name__ == "__main__":
+    main()
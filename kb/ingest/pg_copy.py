@@ -0,0 +1,154 @@
+# kb/ingest/pg_copy.py
+"""
+COPY ... FROM STDIN (FORMAT binary) ile toplu yazım yardımcıları.
+
+Vektörler metne çevrilmeden, pgvector'ün binary `vector` formatında
+(int16 dim, int16 unused, float4[] big-endian) doğrudan NumPy buffer'ından yazılır.
+Satırlar bir generator üzerinden akıtılır; tüm COPY verisi bellekte tutulmaz.
+"""
+import io
+import json
+import struct
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+PGCOPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+PGCOPY_TRAILER = struct.pack("!h", -1)
+_NULL = struct.pack("!i", -1)
+
+
+def _enc_int8(v) -> bytes:
+    return struct.pack("!iq", 8, int(v))
+
+def _enc_int4(v) -> bytes:
+    return struct.pack("!ii", 4, int(v))
+
+def _enc_text(v) -> bytes:
+    b = str(v).encode("utf-8")
+    return struct.pack("!i", len(b)) + b
+
+def _enc_jsonb(v) -> bytes:
+    b = json.dumps(v, ensure_ascii=False).encode("utf-8")
+    return struct.pack("!ib", len(b) + 1, 1) + b       # jsonb binary: sürüm baytı (1) + metin
+
+def _enc_vector(v) -> bytes:
+    a = np.asarray(v, dtype=">f4").reshape(-1)
+    return struct.pack("!ihh", 4 + 4 * a.shape[0], a.shape[0], 0) + a.tobytes()
+
+ENCODERS: Dict[str, Callable] = {
+    "int8": _enc_int8,
+    "int4": _enc_int4,
+    "text": _enc_text,
+    "jsonb": _enc_jsonb,
+    "vector": _enc_vector,
+}
+
+
+def encode_rows(types: Sequence[str], rows: Iterable[Sequence]) -> Iterator[bytes]:
+    """Satırları PGCOPY binary akışına çevir (header + tuple'lar + trailer)."""
+    encs = [ENCODERS[t] for t in types]
+    nfields = struct.pack("!h", len(encs))
+    yield PGCOPY_HEADER
+    for row in rows:
+        parts = [nfields]
+        for enc, val in zip(encs, row):
+            parts.append(_NULL if val is None else enc(val))
+        yield b"".join(parts)
+    yield PGCOPY_TRAILER
+
+
+class _IterStream(io.RawIOBase):
+    """bytes parçalarından oluşan iterator'ı copy_expert için dosya gibi okut."""
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = chunks
+        self._buf = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buf:
+            try:
+                self._buf = next(self._chunks)
+            except StopIteration:
+                return 0
+        n = min(len(b), len(self._buf))
+        b[:n] = self._buf[:n]
+        self._buf = self._buf[n:]
+        return n
+
+
+def copy_rows(cur, table: str, columns: Sequence[str], types: Sequence[str],
+              rows: Iterable[Sequence], buffer_size: int = 1 << 20) -> int:
+    """rows'u `COPY table (columns) FROM STDIN (FORMAT binary)` ile yaz, satır sayısını döndür."""
+    count = 0
+
+    def counted():
+        nonlocal count
+        for r in rows:
+            count += 1
+            yield r
+
+    stream = io.BufferedReader(_IterStream(encode_rows(types, counted())), buffer_size)
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT binary)"
+    cur.copy_expert(sql, stream, size=buffer_size)
+    return count
+
+
+def reserve_ids(cur, table: str, n: int, column: str = "id") -> List[int]:
+    """Tablonun serial dizisinden n adet id ayır (COPY ile açık id yazmak için)."""
+    if n <= 0:
+        return []
+    cur.execute(
+        "SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)",
+        (table, column, n),
+    )
+    return [r[0] for r in cur.fetchall()]
+
+
+def copy_embeddings(cur, section_ids: Sequence[int], vectors, model_name: str,
+                    table: str = "document_embeddings") -> int:
+    """(section_id, embedding, model_name) satırlarını binary COPY ile yaz."""
+    vecs = np.asarray(vectors, dtype=">f4")
+    rows = ((sid, vecs[i], model_name) for i, sid in enumerate(section_ids))
+    return copy_rows(cur, table, ("section_id", "embedding", "model_name"),
+                     ("int8", "vector", "text"), rows)
+
+
+def copy_sections(cur, columns: Sequence[str], types: Sequence[str],
+                  rows: Sequence[Sequence], table: str = "document_sections") -> List[int]:
+    """
+    Bölümleri tek COPY ile yaz; id'ler önceden ayrıldığı için dönen liste
+    rows ile aynı sıradadır.
+    """
+    ids = reserve_ids(cur, table, len(rows))
+    copy_rows(cur, table, ("id", *columns), ("int8", *types),
+              ((sid, *r) for sid, r in zip(ids, rows)))
+    return ids
+
+
+def copy_upsert(cur, table: str, columns: Sequence[str], types: Sequence[str],
+                rows: Iterable[Sequence], conflict: str, update_sql: str,
+                stage: Optional[str] = None) -> int:
+    """
+    COPY ON CONFLICT desteklemediği için: geçici tabloya binary COPY,
+    ardından tek `INSERT ... SELECT ... ON CONFLICT` ile hedefe aktar.
+    """
+    stage = stage or f"_stage_{table}"
+    cols = ", ".join(columns)
+    # Yalnız kopyalanan kolonlar, default'suz: id'nin nextval default'u her
+    # satırda sequence tüketmesin (NOT NULL kısıtları da gelmez)
+    cur.execute(f"""
+        CREATE TEMP TABLE IF NOT EXISTS {stage} ON COMMIT DELETE ROWS
+        AS SELECT {cols} FROM {table} WITH NO DATA
+    """)
+    cur.execute(f"TRUNCATE {stage}")
+    copy_rows(cur, stage, columns, types, rows)
+    cur.execute(f"""
+        INSERT INTO {table} ({cols})
+        SELECT {cols} FROM {stage}
+        ON CONFLICT ({conflict}) DO UPDATE SET {update_sql}
+    """)
+    return cur.rowcount
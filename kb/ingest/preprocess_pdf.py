@@ -1,80 +1,78 @@
 # kb/ingest/preprocess_pdf.py
-from pypdf import PdfReader
+from bisect import bisect_right
+
 import regex as re
 
+from pdf_text import extract_pages as extract_page_texts
+from normalize import preprocess
+
+# Madde işaretleri (grup 1) ayrıca yakalanır; iter_sections bunları üst bölüme katar
 SECTION_RE = re.compile(
-    r"^(?:\d+(?:\.\d+)*\)|\d+(?:\.\d+)*\s+|[A-ZÇĞİÖŞÜ][A-ZÇĞİÖŞÜ\s]{5,}|•|-)\s+",
+    r"^(?:\d+(?:\.\d+)*\)|\d+(?:\.\d+)*\s+|[A-ZÇĞİÖŞÜ][A-ZÇĞİÖŞÜ\s]{5,}|(•|-))\s+",
     re.MULTILINE
 )
 
 def clean_text(t: str) -> str:
-    t = t.replace('\r', '')
-    t = re.sub(r'\n{3,}', '\n\n', t)
-    t = re.sub(r'-\n', '', t)
-    t = re.sub(r'[ \t]{2,}', ' ', t)
-    return t.strip()
+    return preprocess(t)
 
 def extract_pages(pdf_path: str):
-    reader = PdfReader(pdf_path)
-    pages = []
-    for i, p in enumerate(reader.pages, start=1):
-        try:
-            txt = p.extract_text() or ""
-        except Exception:
-            txt = ""
-        pages.append((i, clean_text(txt)))
-    return pages
+    return [(i, clean_text(txt)) for i, txt in enumerate(extract_page_texts(pdf_path), start=1)]
 
-def split_sections(pages):
-    """
-    Sayfa metinlerini birleştir, SECTION_RE ile bölümlere ayır, her bölümün
-    başlangıç ve bitiş sayfa numarasını koru.
-    """
-    offsets = [] 
-    buf = []
+def join_pages(pages):
+    """Sayfaları "\n\n" ile birleştir; (metin, sayfa başlangıç offset'leri, sayfa no'ları)."""
+    buf, starts, nums = [], [], []
     pos = 0
     for num, txt in pages:
-        start = pos
+        starts.append(pos)
+        nums.append(num)
         buf.append(txt + "\n\n")
         pos += len(txt) + 2
-        offsets.append((start, pos, num))
-    full = "".join(buf)
+    return "".join(buf), starts, nums
+
+def span_to_pages(s, e, starts, nums):
+    """[s, e) aralığının kapsadığı ilk ve son sayfa (bisect, O(log sayfa))."""
+    if not nums or e <= s:
+        return (None, None)
+    first = bisect_right(starts, s) - 1
+    last = bisect_right(starts, e - 1) - 1
+    return (nums[max(first, 0)], nums[max(last, 0)])
+
+def iter_sections(pages, merge_bullets: bool = True):
+    """
+    Sayfa metinlerini birleştir, SECTION_RE ile bölümlere ayır ve her bölümü
+    başlangıç/bitiş sayfasıyla üret. Tek geçiş: eşleşmeler sırayla işlenir,
+    sayfa eşlemesi bisect ile yapılır.
+    merge_bullets: madde işaretleri (•, -) yeni bölüm açmaz, üstteki
+    bölüme eklenir (uzun kılavuzlarda binlerce küçük bölüm oluşmasın).
+    """
+    full, starts, nums = join_pages(pages)
+
+    def section(s, e):
+        text = full[s:e].strip()
+        if not text:
+            return None
+        p1, p2 = span_to_pages(s, e, starts, nums)
+        return {"text": text, "page_start": p1, "page_end": p2}
 
-    sections = []
     last_idx = 0
     for m in SECTION_RE.finditer(full):
+        if merge_bullets and m.group(1) is not None:
+            continue
         start = m.start()
         if start > last_idx:
-            sections.append((last_idx, start))
+            sec = section(last_idx, start)
+            if sec:
+                yield sec
         last_idx = start
 
     if last_idx < len(full):
-        sections.append((last_idx, len(full)))
+        sec = section(last_idx, len(full))
+        if sec:
+            yield sec
 
-    def span_to_pages(s, e):
-        ps = []
-        for (a, b, pg) in offsets:
-            if b <= s:
-                continue
-            if a >= e:
-                break
-            ps.append(pg)
-        if not ps:
-            return (None, None)
-        return (min(ps), max(ps))
-
-    enriched = []
-    for (s, e) in sections:
-        text = full[s:e].strip()
-        if not text:
-            continue
-        p1, p2 = span_to_pages(s, e)
-        enriched.append({
-            "text": text,
-            "page_start": p1,
-            "page_end": p2,
-        })
-    return enriched
+def split_sections(pages, merge_bullets: bool = True):
+    """iter_sections'ın liste hali."""
+    return list(iter_sections(pages, merge_bullets))
 
 def chunkify_section(text: str, max_tokens: int = 1000, overlap: int = 150):
     """
@@ -98,9 +96,8 @@ def detect_section_title(chunk_text: str):
 
 def parse_pdf_advanced(pdf_path: str, lang: str = "tr", max_tokens=1000, overlap=150):
     pages = extract_pages(pdf_path)
-    sections = split_sections(pages)
     results = []
-    for sec in sections:
+    for sec in iter_sections(pages):
         sec_text = sec["text"]
         p1, p2 = sec["page_start"], sec["page_end"]
         chunks = chunkify_section(sec_text, max_tokens=max_tokens, overlap=overlap)
@@ -6,18 +6,26 @@ import argparse
 from typing import List, Dict, Any, Tuple
 
 import psycopg2
-from psycopg2.extras import execute_values
-from pypdf import PdfReader
+import numpy as np
 from sentence_transformers import SentenceTransformer
 
+from pg_copy import copy_sections, copy_embeddings
+from index_manager import bulk_load
+from encoder import encoder_for, EncoderPool
+from normalize import plain_text
+import pdf_text
+from pdf_text import extract_pages
+
 
 EMBED_MODEL = os.getenv("HF_EMBED_MODEL", "intfloat/multilingual-e5-large")
 CHUNK_CHARS = int(os.getenv("CHUNK_CHARS", "1200"))
 CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "150"))
-BATCH_SIZE = int(os.getenv("BATCH_SIZE", "64"))
 LANGUAGE = os.getenv("DOC_LANGUAGE", "tr")
 MIN_CHUNK_CHARS = int(os.getenv("MIN_CHUNK_CHARS", "50"))  # Minimum chunk boyutu
 MIN_WORD_COUNT = int(os.getenv("MIN_WORD_COUNT", "5"))  # Minimum kelime sayısı
+EXTRACT_MODE = os.getenv("PDF_EXTRACT_MODE", "adaptive")  # adaptive | layout_fallback | plain
+PAGE_TIMEOUT = float(os.getenv("PDF_PAGE_TIMEOUT", "10"))  # sayfa başına saniye (0 = sınırsız)
+OCR_FALLBACK = os.getenv("PDF_OCR_FALLBACK", "0") == "1"   # boş/süre aşan sayfaları OCR'la
 
 
 def db_connect():
@@ -76,17 +84,7 @@ def ensure_extensions_and_schema(cur):
       END IF;
     END$$;
     """)
-    cur.execute("""
-    DO $$
-    BEGIN
-      IF NOT EXISTS (
-        SELECT 1 FROM pg_indexes WHERE indexname='idx_document_embeddings_vec'
-      ) THEN
-        CREATE INDEX idx_document_embeddings_vec
-        ON document_embeddings USING ivfflat (embedding vector_l2_ops) WITH (lists = 100);
-      END IF;
-    END$$;
-    """)
+    # vektör index'i yükleme sonrası index_manager ile kurulur
 
 def ensure_document(cur, title: str, file_name: str, file_path: str,
                     doc_type: str, department: str, language: str = LANGUAGE) -> Tuple[int, bool]:
@@ -102,59 +100,27 @@ def ensure_document(cur, title: str, file_name: str, file_path: str,
     return cur.fetchone()[0], True
 
 def insert_sections(cur, document_id: int, sections: List[Dict[str, Any]]) -> List[int]:
+    # Tek COPY; id'ler sections ile aynı sırada döner
     rows = [(document_id,
              s.get("title"),
              s["text"],
              s.get("page_number"),
              s.get("word_count"))
             for s in sections]
-    ids = []
-    for r in rows:
-        cur.execute("""
-          INSERT INTO document_sections (document_id, section_title, content, page_number, word_count)
-          VALUES (%s,%s,%s,%s,%s)
-          RETURNING id
-        """, r)
-        ids.append(cur.fetchone()[0])
-    return ids
-
-def to_vec_literal(vec: List[float]) -> str:
-    return "[" + ",".join(f"{x:.6f}" for x in vec) + "]"
-
-def insert_embeddings_batch(cur, section_ids: List[int], vectors: List[List[float]], model_name: str):
-    values = [(sid, to_vec_literal(vec), model_name) for sid, vec in zip(section_ids, vectors)]
-    execute_values(cur,
-        """
-        INSERT INTO document_embeddings (section_id, embedding, model_name)
-        VALUES %s
-        """,
-        values,
-        template="(%s, %s::vector, %s)"
+    return copy_sections(
+        cur,
+        ("document_id", "section_title", "content", "page_number", "word_count"),
+        ("int8", "text", "text", "int4", "int4"),
+        rows,
     )
 
+def insert_embeddings_batch(cur, section_ids: List[int], vectors: np.ndarray, model_name: str):
+    copy_embeddings(cur, section_ids, vectors, model_name)
+
 
 def clean_text(text: str) -> str:
-    """Metni temizle ve normalize et"""
-    if not text:
-        return ""
-    
-    # Fazla boşlukları tek boşluğa indir
-    text = re.sub(r'\s+', ' ', text)
-    
-    # Bozuk karakterleri temizle
-    text = re.sub(r'[\x00-\x08\x0b-\x0c\x0e-\x1f\x7f-\x9f]', '', text)
-    
-    # Bölünmüş kelimeleri birleştirmeye çalış (ör: "kel ime" -> "kelime")
-    # Tek harf + boşluk + tek harf durumlarını birleştir
-    text = re.sub(r'(?<=\w)\s(?=\w(?:\s\w){2,})', '', text)
-    
-    # Çoklu tire/çizgileri temizle
-    text = re.sub(r'-{2,}', ' ', text)
-    
-    # Başta ve sonda boşlukları temizle
-    text = text.strip()
-    
-    return text
+    """Metni temizle ve normalize et (tek satır; bkz. normalize.plain_text)"""
+    return plain_text(text)
 
 
 def is_valid_chunk(text: str) -> bool:
@@ -183,19 +149,11 @@ _SENT_SPLIT = re.compile(r'(?<=[.!?…])\s+')
 
 def read_pdf_texts(pdf_path: str) -> List[Tuple[int, str]]:
     """PDF'den sayfa sayfa metin çıkar ve temizle"""
-    reader = PdfReader(pdf_path)
     items = []
     
-    for i, page in enumerate(reader.pages, start=1):
-        try:
-            # Alternatif extraction metodlarını dene
-            txt = page.extract_text(extraction_mode="layout") or ""
-            if not txt.strip():
-                txt = page.extract_text() or ""
-        except Exception as e:
-            print(f"  ⚠️  Sayfa {i} okuma hatası: {e}")
-            txt = ""
-        
+    # adaptive: layout yalnızca tablo/sütun yapısı olan dokümanlarda; süresi aşan sayfa boş kalır
+    pages = extract_pages(pdf_path, mode=EXTRACT_MODE, page_timeout=PAGE_TIMEOUT, ocr=OCR_FALLBACK)
+    for i, txt in enumerate(pages, start=1):
         txt = clean_text(txt)
         if txt:  # Sadece içerik varsa ekle
             items.append((i, txt))
@@ -266,6 +224,7 @@ def parse_pdf_advanced(pdf_path: str) -> List[Dict[str, Any]]:
 
 
 _model_cache: SentenceTransformer = None
+_pool: EncoderPool = None
 
 def get_model() -> SentenceTransformer:
     global _model_cache
@@ -273,10 +232,9 @@ def get_model() -> SentenceTransformer:
         _model_cache = SentenceTransformer(EMBED_MODEL)
     return _model_cache
 
-def embed_texts(texts: List[str]) -> List[List[float]]:
-    model = get_model()
-    vecs = model.encode(texts, normalize_embeddings=False, batch_size=32, convert_to_numpy=True)
-    return [v.tolist() for v in vecs]
+def embed_texts(texts: List[str]) -> np.ndarray:
+    encoder = _pool or encoder_for(get_model())
+    return encoder.encode(texts, normalize_embeddings=False)
 
 
 def process_pdf(path: str, doc_type: str, department: str) -> Tuple[int, int, int, bool]:
@@ -292,24 +250,19 @@ def process_pdf(path: str, doc_type: str, department: str) -> Tuple[int, int, in
         print(f"  ⚠️  Boş/parse edilemedi: {os.path.basename(path)}")
         return (0, 0, 0, False)
 
+    # Önce tüm embedding'ler; DB'ye bölüm + embedding tek transaction'da yazılır
+    texts = [s["text"] for s in sections]
+    vecs = embed_texts(texts)
+
     conn = db_connect()
     cur = conn.cursor()
     try:
         ensure_extensions_and_schema(cur)
         doc_id, is_new = ensure_document(cur, title, os.path.basename(path), path, doc_type, department, LANGUAGE)
-        conn.commit()
-
         sec_ids = insert_sections(cur, doc_id, sections)
+        insert_embeddings_batch(cur, sec_ids, vecs, EMBED_MODEL)
         conn.commit()
-
-        total = 0
-        for i in range(0, len(sec_ids), BATCH_SIZE):
-            batch_ids = sec_ids[i:i+BATCH_SIZE]
-            batch_txts = [sections[j]["text"] for j in range(i, min(i+BATCH_SIZE, len(sections)))]
-            vecs = embed_texts(batch_txts)
-            insert_embeddings_batch(cur, batch_ids, vecs, EMBED_MODEL)
-            conn.commit()
-            total += len(batch_ids)
+        total = len(sec_ids)
 
         filtered = original_count - len(sections)
         status = 'new' if is_new else 'exists'
@@ -323,28 +276,48 @@ def process_pdf(path: str, doc_type: str, department: str) -> Tuple[int, int, in
 
 
 def main():
+    global EXTRACT_MODE, PAGE_TIMEOUT, OCR_FALLBACK, _pool
     ap = argparse.ArgumentParser(description="Geliştirilmiş PDF ingest (metin temizleme + validasyon)")
     ap.add_argument("--dir", required=True, help="PDF klasörü")
     ap.add_argument("--doc-type", default="kullanici_kilavuzu")
     ap.add_argument("--department", default="FIP")
+    ap.add_argument("--defer-index", action="store_true",
+                    help="yükleme boyunca vektör index'ini bırak, sonunda yeniden kur")
+    ap.add_argument("--extract-mode", choices=["adaptive", "layout_fallback", "plain"], default=EXTRACT_MODE)
+    ap.add_argument("--page-timeout", type=float, default=PAGE_TIMEOUT,
+                    help="sayfa başına çıkarım süresi sınırı (sn, 0 = sınırsız)")
+    ap.add_argument("--ocr", action="store_true", default=OCR_FALLBACK,
+                    help="boş/süre aşan sayfaların gömülü görsellerini OCR'la")
+    ap.add_argument("--embed-procs", type=int, default=1, help="encoder süreç sayısı (her biri cpu/N thread)")
     args = ap.parse_args()
 
+    EXTRACT_MODE, PAGE_TIMEOUT, OCR_FALLBACK = args.extract_mode, args.page_timeout, args.ocr
+
     pdfs = [f for f in os.listdir(args.dir) if f.lower().endswith(".pdf")]
     if not pdfs:
         print("⚠️  Klasörde PDF bulunamadı.")
         return
 
     print(f"\n📂 {len(pdfs)} PDF işlenecek...\n")
+    if args.embed_procs > 1:
+        _pool = EncoderPool(EMBED_MODEL, args.embed_procs)
     
     total_docs = 0
     total_secs = 0
     total_filtered = 0
     
-    for f in pdfs:
-        d, s, filt, _ = process_pdf(os.path.join(args.dir, f), args.doc_type, args.department)
-        total_docs += d
-        total_secs += s
-        total_filtered += filt
+    try:
+        with bulk_load("document_embeddings", defer=args.defer_index, ops="vector_l2_ops"):
+            for f in pdfs:
+                d, s, filt, _ = process_pdf(os.path.join(args.dir, f), args.doc_type, args.department)
+                total_docs += d
+                total_secs += s
+                total_filtered += filt
+    finally:
+        # hata / Ctrl-C'de de encoder süreçleri kapansın
+        if _pool is not None:
+            _pool.close()
+            _pool = None
 
     print(f"\n{'='*60}")
     print(f"📊 ÖZET:")
@@ -353,6 +326,7 @@ def main():
     print(f"   Filtrelenen (geçersiz): {total_filtered}")
     print(f"   Model: {EMBED_MODEL} (1024-dim)")
     print(f"{'='*60}\n")
+    pdf_text.report()
 
 
 if __name__ == "__main__":
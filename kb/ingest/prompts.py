@@ -0,0 +1,79 @@
+# kb/ingest/prompts.py
+"""
+chat_unified için LLM mesajları ve LLM'siz şablon cevaplar.
+
+Ollama, slot'ta kalan önceki prompt ile ortak öneki KV önbellekten kullanır
+(yalnızca farklı kalan kısım değerlendirilir). Bu yüzden değişmeyen her şey
+başta ve tek bir system mesajında durur; bağlam ve soru sonraki user
+mesajındadır:
+
+  system  SYSTEM_PROMPT: rol + kurallar, isteklerden bağımsız, bayt bayt aynı
+  user    [Kaynak 1 ...] ... + soru
+
+SYSTEM_PROMPT'a tarih, istek kimliği gibi değişen bir şey eklemeyin; önek
+her istekte kırılır. Model ve seçenekler (num_ctx vb.) de sabit kalmalı,
+değişirse Ollama modeli yeniden yükler ve önbellek boşalır.
+kb/bench/check_prompt_prefix.py öneğin sabit kaldığını doğrular.
+"""
+from typing import Dict, List
+
+SYSTEM_PROMPT = """Sen Troy ekranının iç süreçleri hakkında yardımcı bir asistansın.
+
+Kullanıcı mesajındaki kaynak bilgilerini kullanarak kullanıcının sorusunu cevapla.
+
+Kurallar:
+- SADECE verilen bilgileri kullan
+- Bilmediğin şeyleri uydurma
+- Cevabında hangi kaynağı kullandığını belirt (Kaynak 1, Kaynak 2, vb.)
+- Eğer "Eğitim İçeriği" kaynağından adım adım bilgi varsa, bunları sıralı şekilde yaz
+- Türkçe ve net bir dille cevapla
+- Eğer bilgi yoksa, bunu açıkça söyle"""
+
+
+# Tüm çağrılarda aynı seçenekler: farklı num_ctx vb. modeli yeniden yükletir
+LLM_OPTIONS = {
+    'temperature': 0.3,
+    'num_predict': 512
+}
+
+
+def format_context(contexts: List[Dict]) -> str:
+    """Context'leri prompt için formatla"""
+    context_text = ""
+
+    for i, ctx in enumerate(contexts, 1):
+        if ctx['type'] == 'document':
+            context_text += f"\n[Kaynak {i}: Döküman - {ctx['title']}, Sayfa {ctx.get('page', 'N/A')}]\n"
+            context_text += f"{ctx['content'][:800]}\n"
+
+        elif ctx['type'] == 'training':
+            context_text += f"\n[Kaynak {i}: Eğitim İçeriği - {ctx['title']}]\n"
+            context_text += f"{ctx['content'][:800]}\n"
+
+            if ctx.get('steps'):
+                context_text += "Adımlar:\n"
+                for j, step in enumerate(ctx['steps'][:5], 1):
+                    context_text += f"  {j}. {step}\n"
+
+    return context_text
+
+
+def build_messages(user_question: str, contexts: List[Dict]) -> List[Dict]:
+    """Sabit system mesajı + bağlam/soru user mesajı"""
+    return [
+        {'role': 'system', 'content': SYSTEM_PROMPT},
+        {'role': 'user', 'content': f"Kaynaklar:\n{format_context(contexts)}\nKullanıcının sorusu: {user_question}"},
+    ]
+
+
+def extractive_answer(ctx: Dict) -> str:
+    """Eğitim içeriğinden şablon cevap: başlık, açıklama, sıralı adımlar"""
+    lines = [f"{ctx['title']}", ""]
+    if ctx.get('content'):
+        lines += [ctx['content'].strip(), ""]
+    if ctx.get('steps'):
+        lines.append("Adımlar:")
+        lines += [f"{i}. {step}" for i, step in enumerate(ctx['steps'], 1)]
+        lines.append("")
+    lines += [f"(Kaynak 1: Eğitim İçeriği - {ctx['title']})"]
+    return "\n".join(lines)
@@ -0,0 +1,139 @@
+# kb/ingest/singleflight.py
+"""
+Aynı anahtarlı eşzamanlı işleri tek çalıştırmada birleştirme (single-flight).
+
+İlk gelen (lider) işi çalıştırır; iş sürerken aynı anahtarla gelenler
+(takipçiler) yeni iş başlatmaz, liderin sonucunu (ya da hatasını) alır. İş
+bitince anahtar bırakılır: bu bir önbellek değildir, yalnızca uçuştaki işler
+paylaşılır.
+
+Akış modunda üretim ayrı bir thread'de çalışır ve parçalar tamponlanır; her
+tüketici (lider dahil) parçaları baştan, aynı sırayla alır. Geç katılan
+takipçi önce tampondakileri, sonra canlı parçaları okur. Bir tüketicinin
+bağlantısı koparsa üretim diğerleri için sürer.
+
+Kullanım:
+  flight = SingleFlight()
+  response, shared = flight.do(key, lambda: llm_backend.chat(messages))
+  parts, shared = flight.stream(key, lambda: llm_backend.stream(messages))
+  for part in parts: ...
+"""
+import threading
+from typing import Callable, Dict, Hashable, Iterable, Iterator, Tuple
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _Broadcast:
+    """Tek üretici, çok tüketici; tüm parçalar tamponda kalır (cevap boyu küçük)."""
+
+    def __init__(self):
+        self.parts = []
+        self.finished = False
+        self.error = None
+        self.cond = threading.Condition()
+
+    def pump(self, start: Callable[[], Iterable]):
+        try:
+            for part in start():
+                with self.cond:
+                    self.parts.append(part)
+                    self.cond.notify_all()
+        except BaseException as e:
+            self.error = e
+        finally:
+            with self.cond:
+                self.finished = True
+                self.cond.notify_all()
+
+    def __iter__(self) -> Iterator:
+        i = 0
+        while True:
+            with self.cond:
+                while i >= len(self.parts) and not self.finished:
+                    self.cond.wait()
+                if i < len(self.parts):
+                    part = self.parts[i]
+                elif self.error is not None:
+                    raise self.error
+                else:
+                    return
+            i += 1
+            yield part
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._streams: Dict[Hashable, _Broadcast] = {}
+        self._stats = dict(leaders=0, coalesced=0, stream_leaders=0, stream_coalesced=0, max_followers=0)
+        self._followers: Dict[Hashable, int] = {}
+
+    def _follow(self, key) -> None:
+        n = self._followers.get(key, 0) + 1
+        self._followers[key] = n
+        self._stats["max_followers"] = max(self._stats["max_followers"], n)
+
+    def do(self, key: Hashable, fn: Callable) -> Tuple[object, bool]:
+        """(sonuç, paylaşıldı mı); liderin hatası takipçilerde de yükselir."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._stats["leaders"] += 1
+            else:
+                self._stats["coalesced"] += 1
+                self._follow(key)
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                self._followers.pop(key, None)
+            call.done.set()
+        return call.result, False
+
+    def stream(self, key: Hashable, start: Callable[[], Iterable]) -> Tuple[Iterator, bool]:
+        """(parça iteratörü, paylaşıldı mı); start() parça üreten iterable döndürür."""
+        with self._lock:
+            cast = self._streams.get(key)
+            if cast is not None:
+                self._stats["stream_coalesced"] += 1
+                self._follow(("stream", key))
+                return iter(cast), True
+            cast = self._streams[key] = _Broadcast()
+            self._stats["stream_leaders"] += 1
+
+        def run():
+            try:
+                cast.pump(start)
+            finally:
+                with self._lock:
+                    del self._streams[key]
+                    self._followers.pop(("stream", key), None)
+
+        threading.Thread(target=run, daemon=True, name="singleflight-stream").start()
+        return iter(cast), False
+
+    def stats(self) -> Dict:
+        with self._lock:
+            out = dict(self._stats, inflight=len(self._calls), inflight_streams=len(self._streams))
+        total = out["leaders"] + out["coalesced"] + out["stream_leaders"] + out["stream_coalesced"]
+        out["coalesced_rate"] = round((out["coalesced"] + out["stream_coalesced"]) / total, 4) if total else 0.0
+        return out
@@ -1,9 +1,20 @@
 import psycopg2
 from sentence_transformers import SentenceTransformer
-from typing import List
+from typing import List, Optional
+import os
 import time
 
-model = SentenceTransformer('intfloat/multilingual-e5-small')
+from pg_copy import copy_upsert
+from encoder import encoder_for
+
+model = None
+
+def get_model():
+    # kb_worker EMBED_TEXT_SQL için import eder; model ilk encode'da yüklenir
+    global model
+    if model is None:
+        model = SentenceTransformer('intfloat/multilingual-e5-small')
+    return model
 
 DB_CONFIG = {
     "host": "localhost",
@@ -12,6 +23,8 @@ DB_CONFIG = {
     "password": "troy1234"
 }
 
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", "256"))
+
 def create_training_embeddings_table():
     """Training content için embedding tablosu oluştur"""
     conn = psycopg2.connect(**DB_CONFIG)
@@ -23,6 +36,7 @@ def create_training_embeddings_table():
             id SERIAL PRIMARY KEY,
             training_id INTEGER REFERENCES training_content(id) ON DELETE CASCADE,
             embedding vector(384),
+            content_hash CHAR(64),
             created_at TIMESTAMP DEFAULT NOW(),
             UNIQUE(training_id)
         );
@@ -41,68 +55,89 @@ def create_training_embeddings_table():
     conn.close()
     print("✅ training_embeddings tablosu hazır")
 
-def generate_embeddings_for_training():
-    """Training content'ler için embedding oluştur"""
-    conn = psycopg2.connect(**DB_CONFIG)
+# Embed edilen metin: başlık + açıklama + ilk 5 adım (hash da bu metinden)
+EMBED_TEXT_SQL = """
+    concat_ws(' ', VARIADIC ARRAY[tc.title, NULLIF(tc.description, '')]
+                            || COALESCE(tc.step_by_step[1:5], ARRAY[]::text[]))
+"""
+
+def content_hash_sql(text_sql: str) -> str:
+    """training_embeddings.content_hash ifadesi (kb_worker da aynısını yazar)"""
+    return f"encode(sha256(convert_to({text_sql}, 'UTF8')), 'hex')"
+
+def ensure_hash_column(cursor):
+    cursor.execute("ALTER TABLE training_embeddings ADD COLUMN IF NOT EXISTS content_hash CHAR(64);")
+
+def generate_embeddings_for_training(ids: Optional[List[int]] = None, conn=None):
+    """
+    Metni değişmiş ya da hiç embed edilmemiş training content'leri embed et.
+    Satırlar metin uzunluğuna göre sıralanıp BATCH_SIZE'lık gruplarla işlenir
+    (grup içinde encoder token bütçeli batch'ler kurar), her grup tek binary
+    COPY + upsert ile yazılır.
+    ids verilirse yalnızca bu satırlar kontrol edilir.
+    """
+    own_conn = conn is None
+    if own_conn:
+        conn = psycopg2.connect(**DB_CONFIG)
     cursor = conn.cursor()
-    
-    # Henüz embedding'i olmayan training content'leri al
-    cursor.execute("""
-        SELECT tc.id, tc.title, tc.description, tc.step_by_step
-        FROM training_content tc
-        LEFT JOIN training_embeddings te ON tc.id = te.training_id
-        WHERE te.id IS NULL AND tc.status = 'active'
-        ORDER BY tc.id
-    """)
+    ensure_hash_column(cursor)
+    
+    # Hash'i eşleşmeyen (yeni, güncellenmiş ya da eski sürümden kalma) satırlar
+    cursor.execute(f"""
+        SELECT id, text, {content_hash_sql('text')}
+        FROM (
+            SELECT tc.id, {EMBED_TEXT_SQL} AS text
+            FROM training_content tc
+            WHERE tc.status = 'active'
+              AND (%(ids)s::bigint[] IS NULL OR tc.id = ANY(%(ids)s::bigint[]))
+        ) t
+        LEFT JOIN training_embeddings te ON te.training_id = t.id
+        WHERE te.content_hash IS DISTINCT FROM {content_hash_sql('t.text')}
+    """, {"ids": list(ids) if ids is not None else None})
     
     rows = cursor.fetchall()
     total = len(rows)
     
     if total == 0:
-        print("✅ Tüm training content'ler zaten embed edilmiş")
+        print("✅ Tüm training content'ler güncel")
         cursor.close()
-        conn.close()
+        if own_conn:
+            conn.commit()
+            conn.close()
         return
     
     print(f"📊 {total} training content için embedding oluşturuluyor...")
     
+    # Uzunluğa göre sırala: aynı batch'teki metinler benzer boyda, padding az
+    rows.sort(key=lambda r: len(r[1]))
+    
     processed = 0
-    for row in rows:
-        training_id, title, description, steps = row
-        
-        # Metni birleştir
-        text_parts = [title]
-        if description:
-            text_parts.append(description)
-        if steps:
-            text_parts.extend(steps[:5])  # İlk 5 adımı al
-        
-        combined_text = " ".join(text_parts)
-        
-        # Embedding oluştur
+    t0 = time.time()
+    for i in range(0, total, BATCH_SIZE):
+        batch = rows[i:i + BATCH_SIZE]
         try:
-            embedding = model.encode(combined_text).tolist()
-            
-            # Veritabanına kaydet
-            cursor.execute("""
-                INSERT INTO training_embeddings (training_id, embedding)
-                VALUES (%s, %s)
-                ON CONFLICT (training_id) DO UPDATE 
-                SET embedding = EXCLUDED.embedding
-            """, (training_id, embedding))
-            
-            processed += 1
-            if processed % 10 == 0:
-                conn.commit()
-                print(f"⏳ İşlenen: {processed}/{total}")
-                
+            vecs = encoder_for(get_model()).encode([r[1] for r in batch])
+            copy_upsert(
+                cursor,
+                "training_embeddings",
+                ("training_id", "embedding", "content_hash"),
+                ("int4", "vector", "text"),
+                ((r[0], vecs[j], r[2]) for j, r in enumerate(batch)),
+                conflict="training_id",
+                update_sql="embedding = EXCLUDED.embedding, content_hash = EXCLUDED.content_hash, "
+                           "created_at = NOW()",
+            )
+            conn.commit()
+            processed += len(batch)
+            print(f"⏳ İşlenen: {processed}/{total} ({processed / (time.time() - t0):.1f} satır/s)")
         except Exception as e:
-            print(f"❌ Training ID {training_id} hata: {e}")
+            conn.rollback()
+            print(f"❌ Batch {batch[0][0]}..{batch[-1][0]} hata: {e}")
             continue
     
-    conn.commit()
     cursor.close()
-    conn.close()
+    if own_conn:
+        conn.close()
     print(f"✅ {processed}/{total} training content embed edildi")
 
 def verify_embeddings():
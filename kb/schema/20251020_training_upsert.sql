@@ -0,0 +1,12 @@
+-- emails_txt toplu upsert: (email_campaign_id, title) tekil olmalı
+-- Çalıştırma: psql -U troy -d kb -f kb/schema/20251020_training_upsert.sql
+
+-- Önceki sürümlerden kalan mükerrer kayıtları temizle (en eski id kalır)
+DELETE FROM training_content t
+USING training_content d
+WHERE t.email_campaign_id = d.email_campaign_id
+  AND t.title = d.title
+  AND t.id > d.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_training_campaign_title
+  ON training_content (email_campaign_id, title);
@@ -0,0 +1,25 @@
+-- Admin yüklemeleri için kalıcı iş kuyruğu (kb/ingest/jobs.py, kb_worker.py)
+-- Çalıştırma: psql -U troy -d kb -f kb/schema/20251021_kb_jobs.sql
+
+CREATE TABLE IF NOT EXISTS kb_jobs (
+  id           BIGSERIAL PRIMARY KEY,
+  kind         VARCHAR(50) NOT NULL,
+  payload      JSONB NOT NULL DEFAULT '{}'::jsonb,
+  status       VARCHAR(20) NOT NULL DEFAULT 'queued'
+               CHECK (status IN ('queued', 'running', 'done', 'dead')),
+  attempts     INT NOT NULL DEFAULT 0,
+  max_attempts INT NOT NULL DEFAULT 5,
+  run_after    TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  locked_by    TEXT,
+  locked_at    TIMESTAMPTZ,
+  last_error   TEXT,
+  result       JSONB,
+  created_at   TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  updated_at   TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Hazır işler (claim sorgusu) ve kilidi dolmuş işler için kısmi index'ler
+CREATE INDEX IF NOT EXISTS idx_kb_jobs_ready
+  ON kb_jobs (run_after, id) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS idx_kb_jobs_running
+  ON kb_jobs (locked_at) WHERE status = 'running';
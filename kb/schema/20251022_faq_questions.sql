@@ -0,0 +1,37 @@
+-- Sentetik soru index'i (kb/ingest/faq_index.py üretir, chat_unified.chat önce buna bakar)
+-- Çalıştırma: psql -U troy -d kb -f kb/schema/20251022_faq_questions.sql
+
+CREATE EXTENSION IF NOT EXISTS vector;
+
+-- Her satır bir kaynağa (rag_documents chunk'ı ya da training_content) bağlı;
+-- kaynak silinince soruları da silinir. Kaynak metni değişince source_hash
+-- tutmaz ve faq_index.py o kaynağın sorularını yeniden üretir. O zamana kadar
+-- chat_unified source_md5'i kaynağın güncel satırıyla karşılaştırıp eski
+-- cevabı (ve pasif eğitim içeriklerini) eler.
+CREATE TABLE IF NOT EXISTS faq_questions (
+  id           BIGSERIAL PRIMARY KEY,
+  source_type  VARCHAR(20) NOT NULL CHECK (source_type IN ('document', 'training')),
+  chunk_id     VARCHAR(50) REFERENCES rag_documents(chunk_id) ON DELETE CASCADE,
+  training_id  BIGINT REFERENCES training_content(id) ON DELETE CASCADE,
+  source_hash  CHAR(64) NOT NULL,
+  source_md5   CHAR(32),                          -- faq_index.DOCUMENT_MD5_SQL / TRAINING_MD5_SQL
+  question     TEXT NOT NULL,
+  answer       TEXT NOT NULL,
+  sources      JSONB NOT NULL DEFAULT '[]'::jsonb,
+  generator    VARCHAR(50) NOT NULL,              -- "questions=template,answers=llm" gibi
+  embedding    vector(384) NOT NULL,              -- multilingual-e5-small, soru metni
+  created_at   TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  CHECK ((chunk_id IS NULL) <> (training_id IS NULL))
+);
+
+-- Önceki sürümle oluşturulmuş tablolar için
+ALTER TABLE faq_questions ADD COLUMN IF NOT EXISTS source_md5 CHAR(32);
+
+-- Soru benzerliği için HNSW index (cosine distance)
+CREATE INDEX IF NOT EXISTS faq_questions_embedding_idx ON faq_questions
+USING hnsw (embedding vector_cosine_ops)
+WITH (m = 16, ef_construction = 64);
+
+-- Kaynak bazında silme / hash karşılaştırması
+CREATE INDEX IF NOT EXISTS idx_faq_questions_chunk ON faq_questions (chunk_id) WHERE chunk_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_faq_questions_training ON faq_questions (training_id) WHERE training_id IS NOT NULL;
@@ -0,0 +1,8 @@
+# tests/conftest.py
+# kb/ingest ve kb/bench betikleri paket değil; testler onları betiklerin kendisi gibi import eder
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+for sub in ("kb/ingest", "kb/bench"):
+    sys.path.insert(0, str(ROOT / sub))
@@ -0,0 +1,32 @@
+# tests/test_normalize.py
+"""
+normalize.py profilleri eski temizleyicilerle birebir aynı çıktıyı vermeli.
+
+Altın örnek tests/data/normalize_golden.json'da kayıtlı (eski fonksiyonların
+çıktılarıyla, kb/bench/check_normalize.py --write-golden üretir). Fuzz kısmı
+check_normalize'ın sabit tohumlu küçük bir alt kümesi; büyük çalıştırma için
+python kb/bench/check_normalize.py.
+"""
+import json
+import random
+
+import pytest
+
+from check_normalize import GOLDEN_FILE, PROFILES, fuzz_texts
+
+GOLDEN = json.loads(GOLDEN_FILE.read_text(encoding="utf-8"))
+
+
+@pytest.mark.parametrize("profile", sorted(PROFILES))
+def test_golden_sample(profile):
+    new = PROFILES[profile][1]
+    for case in GOLDEN:
+        assert new(case["input"]) == case["expected"][profile], case["input"]
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_fuzz_matches_legacy(seed):
+    rng = random.Random(seed)
+    for text in fuzz_texts(rng, 2000):
+        for name, (old, new) in PROFILES.items():
+            assert new(text) == old(text), (name, text)
@@ -0,0 +1,29 @@
+# tests/test_prompt_prefix.py
+"""
+prompts.build_messages çıktısının sohbet şablonuyla işlenmiş hâli her istekte
+aynı system bloğuyla başlamalı (Ollama önek önbelleği). Kontroller
+kb/bench/check_prompt_prefix.py'den; burada uç durumlar + sabit tohumlu örneklem.
+"""
+import pytest
+
+from prompts import SYSTEM_PROMPT, build_messages
+from fake_ollama import render_chat
+from bench_prompt_cache import sample_requests
+from check_prompt_prefix import EDGE_CASES, check_cases, system_block
+
+
+@pytest.mark.parametrize("question,contexts", EDGE_CASES)
+def test_rendered_prompt_starts_with_system_block(question, contexts):
+    messages = build_messages(question, contexts)
+    assert messages[0] == {"role": "system", "content": SYSTEM_PROMPT}
+    rendered = render_chat(messages).encode("utf-8")
+    block = system_block()
+    assert rendered.startswith(block)
+    # soru ve bağlam yalnızca önekten sonra gelir
+    assert question.strip().encode("utf-8") in rendered[len(block):]
+
+
+def test_prefix_identical_across_requests():
+    failures, stats = check_cases(EDGE_CASES + sample_requests(100, seed=0))
+    assert failures == []
+    assert stats["new_prefix"] >= stats["system_block"] > stats["old_prefix"]
@@ -0,0 +1,36 @@
+# tests/test_section_alignment.py
+"""
+copy_sections + copy_embeddings toplu yazımında her embedding kendi bölümüne
+bağlanmalı (kb/bench/check_section_alignment.py). PostgreSQL'e bağlanılamazsa
+ya da pgvector kurulu değilse atlanır; bağlantı DB_HOST/DB_PORT/DB_NAME/
+DB_USER/DB_PASSWORD ile ayarlanır.
+"""
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+pytest.importorskip("numpy")
+
+from check_section_alignment import DB, check_alignment  # noqa: E402
+
+
+@pytest.fixture
+def connections():
+    try:
+        conn = psycopg2.connect(connect_timeout=3, **DB)
+        other = psycopg2.connect(connect_timeout=3, **DB)
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"PostgreSQL yok: {e}")
+    with conn.cursor() as cur:
+        cur.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'vector'")
+        has_vector = cur.fetchone() is not None
+    if not has_vector:
+        conn.close(); other.close()
+        pytest.skip("pgvector kurulu değil")
+    yield conn, other
+    conn.close(); other.close()
+
+
+def test_sections_and_embeddings_stay_aligned(connections):
+    n, expected, bad = check_alignment(*connections, chunks=2000, docs=3)
+    assert n == expected
+    assert bad == 0